@@ -0,0 +1,69 @@
+"""Offline benchmarks for parsing, rendering, packing and the drivers, run from the repository root:
+
+    python -m benchmarks [-k FILTER] [--seconds 1] [--save results.json] [--compare baseline.json]
+
+Calendars and weather come from benchmarks/fixtures and the drivers talk to the simulated board,
+so no network, panel or Pi is needed. Every case runs in a fresh process to report its own peak RSS.
+"""
+import sys
+import json
+import argparse
+import multiprocessing
+from benchmarks import cases
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Offline benchmarks for the dashboard.")
+    parser.add_argument("-k", dest="filters", action="append", default=[], help="only run cases containing this text, may be repeated")
+    parser.add_argument("--seconds", type=float, default=1.0, help="time spent measuring each case")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="show the change against results saved earlier")
+    parser.add_argument("--max-slowdown", type=float, help="exit with 1 if any case lost more than this percent of its ops/s against --compare")
+    args = parser.parse_args()
+
+    names = [name for name in cases.names() if not args.filters or any(text in name for text in args.filters)]
+    if args.list:
+        print("\n".join(names))
+        return 0
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = {}
+    slower = []
+    failed = []
+    print(f"{'case':<32} {'ops/s':>10} {'mean ms':>10} {'peak RSS MB':>12} {'change':>8}")
+    # A fresh interpreter per case, so no case inherits another's caches or memory
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        with context.Pool(1) as pool:
+            try:
+                result = pool.apply(cases.run, (name, args.seconds))
+            except ImportError as e:
+                # A case whose driver needs a module missing here is left out, not failed
+                print(f"{name:<32} skipped: {e}", flush=True)
+                continue
+            except Exception as e:
+                print(f"{name:<32} failed: {type(e).__name__}: {e}", flush=True)
+                failed.append(name)
+                continue
+        results[name] = result
+
+        change = ""
+        if name in baseline:
+            percent = (result["ops_per_sec"] / baseline[name]["ops_per_sec"] - 1) * 100
+            change = f"{percent:+.1f}%"
+            if args.max_slowdown is not None and -percent > args.max_slowdown:
+                slower.append(name)
+        print(f"{name:<32} {result['ops_per_sec']:>10.2f} {result['mean_ms']:>10.2f} {result['peak_rss_mb']:>12.1f} {change:>8}", flush=True)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if slower:
+        print(f"Slower than allowed: {', '.join(slower)}")
+    return 1 if slower or failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import os
+import sys
+import glob
+import time
+import random
+import logging
+import inspect
+import resource
+from typing import Callable, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DRIVERS = sorted(os.path.basename(path)[:-3] for path in glob.glob(os.path.join(ROOT, "waveshare_epd", "epd*.py")) if not path.endswith(("epdconfig.py", "epdbuffer.py")))
+
+def names() -> List[str]:
+    from benchmarks.fixtures import CALENDARS
+    calendar_cases = [f"{stage}/{calendar}" for calendar in CALENDARS for stage in ("ics.parse", "calendar.index", "calendar.get_events", "render", "render.full")]
+    driver_cases = [f"{stage}/{driver}" for driver in DRIVERS for stage in ("getbuffer", "display")]
+    return calendar_cases + driver_cases
+
+def run(name: str, seconds: float) -> dict:
+    """Runs one case, meant to be called in a fresh process so its peak RSS is its own."""
+    stage, target = name.split("/")
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    from benchmarks import fixtures
+    os.environ["TIMEZONE"] = fixtures.TIMEZONE
+    os.environ["EPD_BACKEND"] = "simulated"
+    os.environ["EPD_SIMULATED_PANEL"] = target if target in DRIVERS else "epd7in5_V2"
+    os.environ["EPD_SIMULATED_TIME_SCALE"] = "0"
+    logging.disable(logging.INFO)
+
+    op = SETUPS[stage](target)
+    runs, elapsed = _measure(op, seconds)
+    return {
+        "ops_per_sec": runs / elapsed,
+        "mean_ms": elapsed / runs * 1000,
+        "runs": runs,
+        # Kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def _measure(op: Callable, seconds: float):
+    # The first call warms caches, like the event index or fonts, and is left out
+    op()
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        op()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return (runs, elapsed)
+
+def _parsed_calendar(name: str):
+    from benchmarks import fixtures
+    from calendars import read_calendar, PAST_MARGIN
+    return read_calendar(fixtures.calendar(name).splitlines(), fixtures.NOW.date() - PAST_MARGIN)
+
+def _local_now():
+    from pytz import timezone
+    from benchmarks import fixtures
+    return timezone(fixtures.TIMEZONE).localize(fixtures.NOW)
+
+def setup_ics_parse(name: str) -> Callable:
+    from benchmarks import fixtures
+    from calendars import read_calendar, PAST_MARGIN
+    data = fixtures.calendar(name)
+    since = fixtures.NOW.date() - PAST_MARGIN
+    return lambda: read_calendar(data.splitlines(), since)
+
+def setup_calendar_index(name: str) -> Callable:
+    from calendars import EventIndex, INDEX_WINDOW
+    cal = _parsed_calendar(name)
+    now = _local_now()
+    start = now.replace(hour=0, minute=0)
+    return lambda: EventIndex(cal, now.tzinfo, start, start + INDEX_WINDOW)
+
+def setup_get_events(name: str) -> Callable:
+    from benchmarks import fixtures
+    from calendars import get_events
+    cal = _parsed_calendar(name)
+    return lambda: get_events(cal, fixtures.NOW.date())
+
+def setup_render(name: str) -> Callable:
+    from benchmarks import fixtures
+    from display import Snapshot, render
+    now = _local_now()
+    snapshot = Snapshot(fixtures.weather(), _parsed_calendar(name), now)
+    return lambda: render(snapshot, now)
+
+def setup_render_full(name: str) -> Callable:
+    # Without the widgets and tiles kept from the last render, so everything is measured and painted
+    import display
+    from compositor import Compositor
+    op = setup_render(name)
+
+    def full():
+        display._layout = None
+        display._compositor = Compositor()
+        op()
+    return full
+
+def _driver(name: str):
+    import importlib
+    module = importlib.import_module(f"waveshare_epd.{name}")
+    epd = module.EPD()
+    # Scattered text-like content, so packing can't take any all-white shortcut
+    from PIL import Image
+    rng = random.Random(name)
+    img = Image.new('1', (epd.width, epd.height), 255)
+    pixels = img.load()
+    for _ in range(epd.width * epd.height // 20):
+        pixels[rng.randrange(epd.width), rng.randrange(epd.height)] = 0
+    return (epd, img)
+
+def setup_getbuffer(name: str) -> Callable:
+    epd, img = _driver(name)
+    return lambda: epd.getbuffer(img)
+
+def setup_display(name: str) -> Callable:
+    from waveshare_epd import epdconfig
+    epd, img = _driver(name)
+    init = _method(epd, "init", "Init")
+    if inspect.signature(init).parameters:
+        # Older drivers take the full refresh LUT or mode
+        arg = getattr(epd, "lut_full_update", getattr(epd, "FULL_UPDATE", 0))
+        init_full = lambda: init(arg)
+    else:
+        init_full = init
+    display = _method(epd, "display", "Display", "display_1Gray")
+    sleep = _method(epd, "sleep", "Sleep")
+    # Black/red and black/yellow panels take a second plane
+    bufs = [epd.getbuffer(img)] * len(inspect.signature(display).parameters)
+
+    def op():
+        init_full()
+        display(*bufs)
+        sleep()
+        epdconfig.implementation.reset_log()
+    return op
+
+def _method(epd, *names: str) -> Callable:
+    # The drivers don't agree on capitalisation
+    return next(getattr(epd, name) for name in names if hasattr(epd, name))
+
+SETUPS = {
+    "ics.parse": setup_ics_parse,
+    "calendar.index": setup_calendar_index,
+    "calendar.get_events": setup_get_events,
+    "render": setup_render,
+    "render.full": setup_render_full,
+    "getbuffer": setup_getbuffer,
+    "display": setup_display,
+}
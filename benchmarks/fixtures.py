@@ -0,0 +1,102 @@
+import os
+import json
+import random
+import datetime
+from typing import List
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+TIMEZONE = "US/Eastern"
+# Every fixture is built around this moment, a Monday morning matching the weather fixture
+NOW = datetime.datetime(2024, 3, 11, 10, 0)
+
+# Name: (one off events, recurring events), spread over a year either side of NOW
+CALENDARS = {
+    "10": (8, 2),
+    "1k": (900, 100),
+    "10k": (9000, 1000),
+    "rrule": (200, 800),
+}
+
+def weather() -> dict:
+    with open(os.path.join(FIXTURES_DIR, "weather.json")) as f:
+        return json.load(f)
+
+def calendar(name: str) -> bytes:
+    """An ICS feed, generated from a fixed seed so every run parses the same bytes."""
+    one_off, recurring = CALENDARS[name]
+    rng = random.Random(name)
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//RPi-EInk-Dashboard//benchmark//EN", f"X-WR-CALNAME:Benchmark {name}"]
+    for i in range(one_off):
+        lines.extend(_one_off(rng, i))
+    for i in range(recurring):
+        lines.extend(_recurring(rng, i))
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(_fold(line) for line in lines) + "\r\n").encode()
+
+def _fold(line: str) -> str:
+    # Content lines are wrapped at 75 characters, continuations start with a space
+    return line[:75] + "".join("\r\n " + line[i:i + 74] for i in range(75, len(line), 74))
+
+def _one_off(rng: random.Random, i: int) -> List[str]:
+    start = NOW + datetime.timedelta(days=rng.randint(-365, 365), hours=rng.randint(-3, 8), minutes=rng.choice((0, 15, 30, 45)))
+    lines = ["BEGIN:VEVENT", f"UID:event-{i}@benchmark", f"SUMMARY:{_summary(rng, i)}"]
+    if rng.random() < 0.1:
+        lines.append(f"DTSTART;VALUE=DATE:{start:%Y%m%d}")
+        lines.append(f"DTEND;VALUE=DATE:{start + datetime.timedelta(days=rng.randint(1, 3)):%Y%m%d}")
+    else:
+        end = start + datetime.timedelta(minutes=rng.choice((15, 30, 60, 90, 120)))
+        lines.append(f"DTSTART;TZID=America/New_York:{start:%Y%m%dT%H%M%S}")
+        lines.append(f"DTEND;TZID=America/New_York:{end:%Y%m%dT%H%M%S}")
+    if rng.random() < 0.3:
+        lines.append(f"LOCATION:Room {rng.randint(100, 999)}")
+    lines.append(f"DESCRIPTION:{_description(rng)}")
+    lines.append("END:VEVENT")
+    return lines
+
+def _recurring(rng: random.Random, i: int) -> List[str]:
+    start = NOW.replace(hour=rng.randint(8, 17), minute=rng.choice((0, 30))) - datetime.timedelta(days=rng.randint(0, 400))
+    end = start + datetime.timedelta(minutes=rng.choice((15, 30, 60)))
+    uid = f"series-{i}@benchmark"
+    rule = rng.choice((
+        "FREQ=DAILY;BYDAY=MO,TU,WE,TH,FR",
+        "FREQ=WEEKLY",
+        "FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,TH",
+        "FREQ=MONTHLY;BYDAY=1MO",
+        "FREQ=MONTHLY;BYMONTHDAY=15",
+        "FREQ=DAILY;COUNT=200",
+    ))
+    if "COUNT" not in rule and rng.random() < 0.5:
+        until = start + datetime.timedelta(days=rng.randint(30, 800))
+        rule += f";UNTIL={until:%Y%m%dT%H%M%S}Z"
+    lines = [
+        "BEGIN:VEVENT", f"UID:{uid}", f"SUMMARY:{_summary(rng, i)}",
+        f"DTSTART;TZID=America/New_York:{start:%Y%m%dT%H%M%S}",
+        f"DTEND;TZID=America/New_York:{end:%Y%m%dT%H%M%S}",
+        f"RRULE:{rule}",
+    ]
+    skipped = [start + datetime.timedelta(weeks=rng.randint(1, 60)) for _ in range(rng.randint(0, 4))]
+    if skipped:
+        lines.append("EXDATE;TZID=America/New_York:" + ",".join(f"{date:%Y%m%dT%H%M%S}" for date in skipped))
+    lines.append("END:VEVENT")
+
+    # A few occurrences are moved or cancelled, like real shared calendars do
+    for week in rng.sample(range(1, 60), rng.randint(0, 3)):
+        original = start + datetime.timedelta(weeks=week)
+        moved = original + datetime.timedelta(hours=rng.choice((-2, 1, 3)))
+        lines.extend([
+            "BEGIN:VEVENT", f"UID:{uid}", f"SUMMARY:{_summary(rng, i)} (moved)",
+            f"RECURRENCE-ID;TZID=America/New_York:{original:%Y%m%dT%H%M%S}",
+            f"DTSTART;TZID=America/New_York:{moved:%Y%m%dT%H%M%S}",
+            f"DTEND;TZID=America/New_York:{moved + (end - start):%Y%m%dT%H%M%S}",
+        ])
+        if rng.random() < 0.3:
+            lines.append("STATUS:CANCELLED")
+        lines.append("END:VEVENT")
+    return lines
+
+def _summary(rng: random.Random, i: int) -> str:
+    return f"{rng.choice(('Standup', 'Design review', 'Lunch with the team', 'Dentist', 'Planning', '1:1', 'Quarterly business review with customers'))} {i}"
+
+def _description(rng: random.Random) -> str:
+    return " ".join(rng.choice(("agenda", "notes", "follow up", "dial in", "https://example.com/meeting/join")) for _ in range(rng.randint(3, 30)))
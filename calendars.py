@@ -1,84 +1,462 @@
 import os
-from pytz import timezone, UTC
-import requests
+import pickle
+import logging
+from pytz import timezone
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from fetch import FetchError, get as fetch
+from metrics import span, timed
+from requests import RequestException
+from bisect import bisect_left, bisect_right
 from icalendar import Calendar, Event
+from icalendar.prop import vDuration, vRecur
 import datetime
 import dateutil.rrule as rrule
-from typing import List
+from urllib.parse import urlsplit
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+CALENDAR_CACHE_FILE = os.path.join(CACHE_DIR, "calendars.pickle")
+# Seconds a calendar server may take to connect and to send the next chunk
+CALENDAR_TIMEOUT = (10, 30)
+
+# Parsed calendars by URL with the validators they were served with, persisted to CALENDAR_CACHE_FILE
+_cached_calendars = None
+# Merged calendar, kept while every source returns the same parsed calendar
+_merged_sources = None
+_merged_calendar = None
+
+# Events that ended this long before the fetch are dropped while the feed is read, which leaves
+# room for the offset between the feed's own time zone and ours
+PAST_MARGIN = datetime.timedelta(days=2)
+# Bytes read from the response at a time while it is parsed
+READ_CHUNK_SIZE = 16384
+
+# Every event is tagged with the name of the calendar it was read from
+SOURCE_PROPERTY = 'X-DASHBOARD-SOURCE'
+
+# Recurring events are expanded this far ahead, the index slides forward once a query passes its end
+INDEX_WINDOW = datetime.timedelta(days=14)
+_event_index = None
+
 class SavedEvent:
-    is_all_day = False
-    event_name = None
-    dt_start = None
-    dt_end = None
-    
-    def __init__(self, is_all_day: bool, event_name: Event, dt_start: datetime.datetime, dt_end: datetime.datetime):
-        self.is_all_day = is_all_day
-        self.event_name = event_name
-        self.dt_start = dt_start
-        self.dt_end = dt_end
-    
+    """One occurrence of a calendar event, identified by its UID, RECURRENCE-ID and start."""
+    __slots__ = ("uid", "recurrence_id", "is_all_day", "event_name", "dt_start", "dt_end", "location", "source", "status")
+
+    def __init__(self, uid: Optional[str], recurrence_id: Optional[datetime.datetime], is_all_day: bool, event_name: str, dt_start: datetime.datetime, dt_end: datetime.datetime,
+                 location: Optional[str] = None, source: Optional[str] = None, status: Optional[str] = None):
+        for name, value in zip(self.__slots__, (uid, recurrence_id, is_all_day, event_name, dt_start, dt_end, location, source, status)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"SavedEvent is immutable, can't set {name}")
+
+    def __reduce__(self):
+        return (SavedEvent, tuple(getattr(self, name) for name in self.__slots__))
+
+    @property
+    def key(self) -> tuple:
+        # Events without a UID fall back to their name, so two of them starting together stay apart
+        return (self.uid or self.event_name, self.recurrence_id, self.dt_start)
+
     def __eq__(self, other):
-        return self.event_name == other.event_name
+        return isinstance(other, SavedEvent) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"SavedEvent({self.event_name!r}, {self.dt_start} - {self.dt_end})"
 
 def get_events(cal: Calendar, date: datetime.date) -> List[SavedEvent]:
+    return get_events_by_day(cal, date, 1)[date]
+
+def get_events_by_day(cal: Calendar, start_date: datetime.date, days: int) -> Dict[datetime.date, List[SavedEvent]]:
+    """Returns the events starting on each of the days from start_date, looked up in the event index."""
+    global tz
+    tz = timezone(os.getenv('TIMEZONE'))
+
+    midnights = [tz.localize(datetime.datetime.combine(start_date + datetime.timedelta(i), datetime.time())) for i in range(days + 1)]
+    index = get_event_index(cal, tz, midnights[0], midnights[-1])
+
+    days_events = {}
+    for day_start, day_end in zip(midnights, midnights[1:]):
+        day_events = []
+        seen = set()
+        for event in index.starting(day_start, day_end):
+            if event not in seen:
+                seen.add(event)
+                day_events.append(event)
+        days_events[day_start.date()] = day_events
+    return days_events
+
+def get_next_boundary(cal: Calendar, after: datetime.datetime) -> Optional[datetime.datetime]:
+    """Returns the first time after the given one that an event starts or ends, looked up in the event index."""
     global tz
     tz = timezone(os.getenv('TIMEZONE'))
 
-    all_events = cal.walk('VEVENT')
-    return _extract_events(all_events, date)
+    # The same window as get_events_by_day, so both share one index
+    day_start = tz.localize(datetime.datetime.combine(after.date(), datetime.time()))
+    return get_event_index(cal, tz, day_start, day_start + datetime.timedelta(2)).next_boundary(after)
 
-def get_calendar() -> str:
-    req = requests.get(os.getenv("ICS_CALENDARS"))
-    if req.status_code != 200:
-        print("Error")
-        exit(0)
-    return Calendar.from_ical(req.text)
+def get_event_index(cal: Calendar, tz: datetime.tzinfo, start: datetime.datetime, end: datetime.datetime) -> "EventIndex":
+    """Returns an index covering [start, end), rebuilt only for a new calendar or once the window slides."""
+    global _event_index
+    if _event_index is None or _event_index.calendar is not cal or _event_index.tz is not tz or not _event_index.covers(start, end):
+        with span("calendar.index"):
+            _event_index = EventIndex(cal, tz, start, max(end, start + INDEX_WINDOW))
+    return _event_index
 
-def _extract_events(events: List[Event], date: datetime.date) -> List[SavedEvent]:
-    days_events = []
+@timed("calendar")
+def get_calendar() -> Calendar:
+    """Returns the calendars in ICS_CALENDARS merged into one, fetched concurrently."""
+    global _cached_calendars
+    urls = [url.strip() for url in os.getenv("ICS_CALENDARS", "").split(",") if url.strip()]
+    if _cached_calendars is None:
+        _cached_calendars = _load_cached_calendar() or {}
 
-    for event in events:
-        event_start = None
-        event_end = None
-        is_all_day = False
+    # With no calendars configured there is nothing to fetch and no events are shown
+    with ThreadPoolExecutor(max_workers=max(1, len(urls))) as pool:
+        fetched = list(pool.map(_fetch_calendar, urls))
+    if any(changed for _, changed in fetched):
+        _save_cached_calendar(_cached_calendars)
+    return _merge_calendars([calendar for calendar, _ in fetched])
+
+@timed("calendar.fetch")
+def _fetch_calendar(url: str) -> Tuple[Calendar, bool]:
+    """Returns the parsed calendar at url and whether it was downloaded again."""
+    cached = _cached_calendars.get(url)
+
+    # Only download and parse the feed again if the server says it changed
+    headers = {}
+    if cached and cached["etag"]:
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached["last_modified"]:
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    # Past events never come back, so they are left out even of a copy kept for days of 304s
+    since = datetime.datetime.now(timezone(os.getenv('TIMEZONE'))).date() - PAST_MARGIN
+    try:
+        with fetch(url, headers=headers, timeout=CALENDAR_TIMEOUT, stream=True) as req:
+            if req.status_code == 304 and cached:
+                logger.info("Calendar not modified, reusing the parsed copy.")
+                return (cached["calendar"], False)
+            if req.status_code != 200:
+                raise FetchError(url, f"unexpected HTTP {req.status_code}", req.status_code)
+            try:
+                calendar = read_calendar(req.iter_lines(chunk_size=READ_CHUNK_SIZE), since, source=_source_name(url))
+            except RequestException as e:
+                raise FetchError(url, f"{type(e).__name__}: {e}") from e
+    except FetchError as e:
+        if not cached:
+            raise
+        logger.warning(f"Calendar fetch failed, reusing the parsed copy: {e}")
+        return (cached["calendar"], False)
+
+    _cached_calendars[url] = {
+        "etag": req.headers.get("ETag"),
+        "last_modified": req.headers.get("Last-Modified"),
+        "calendar": calendar,
+    }
+    return (calendar, True)
+
+def read_calendar(lines: Iterable[bytes], since: datetime.date, source: Optional[str] = None) -> Calendar:
+    """Parses an ICS feed line by line, leaving out the events that ended before since.
+
+    Only the events that are kept are parsed, the rest are dropped after a look at their raw dates.
+    Kept events are tagged with the calendar's X-WR-CALNAME, or source if it has none.
+    """
+    kept = []
+    skipped = 0
+    for block in _iter_blocks(_unfold(lines)):
+        if block[0].upper() == "BEGIN:VEVENT" and not _may_occur_since(block, since):
+            skipped += 1
+            continue
+        kept.extend(block)
+    logger.info(f"Skipped {skipped} past events while reading the calendar.")
+    with span("calendar.parse"):
+        calendar = Calendar.from_ical("\r\n".join(kept))
+
+    source = calendar.get('x-wr-calname', source)
+    if source is not None:
+        for event in calendar.walk('VEVENT'):
+            event.add(SOURCE_PROPERTY, str(source))
+    return calendar
+
+def _source_name(url: str) -> str:
+    # Private calendar URLs embed their access token, only the host is safe to show
+    return urlsplit(url).hostname or url
+
+def _unfold(lines: Iterable[bytes]) -> Iterator[str]:
+    # Continuation lines start with a space or tab. They are joined before decoding since a fold
+    # may split a multibyte character
+    line = None
+    for raw in lines:
+        # iter_lines yields an empty line when a CRLF is split across two chunks
+        if not raw:
+            continue
+        if raw[:1] in (b" ", b"\t") and line is not None:
+            line += raw[1:]
+            continue
+        if line:
+            yield line.decode("utf-8", errors="replace")
+        line = raw
+    if line:
+        yield line.decode("utf-8", errors="replace")
+
+def _iter_blocks(lines: Iterator[str]) -> Iterator[List[str]]:
+    # Each VEVENT comes out as one block, every other line of the calendar on its own
+    block = None
+    for line in lines:
+        if block is None:
+            if line.upper() == "BEGIN:VEVENT":
+                block = [line]
+            else:
+                yield [line]
+            continue
+        block.append(line)
+        if line.upper() == "END:VEVENT":
+            yield block
+            block = None
+
+def _may_occur_since(block: List[str], since: datetime.date) -> bool:
+    """False only if the raw VEVENT certainly ended before since, anything it can't tell is kept."""
+    props = {}
+    depth = 0
+    for line in block[1:-1]:
+        name, value = _split_property(line)
+        # Alarms have a DURATION of their own
+        if name == "BEGIN":
+            depth += 1
+        elif name == "END":
+            depth -= 1
+        elif depth == 0:
+            props.setdefault(name, value)
 
-        if event.has_key('rrule'):
-            recurrence = rrule.rrulestr(event['rrule'].to_ical().decode(), dtstart=event['dtstart'].dt.astimezone(tz))
-            recurring_event_today = recurrence.after(UTC.localize(datetime.datetime.combine(date, datetime.datetime.min.time())))
+    try:
+        start = _raw_date(props["DTSTART"])
+        if "DTEND" in props:
+            length = _raw_date(props["DTEND"]) - start
+        elif "DURATION" in props:
+            length = vDuration.from_ical(props["DURATION"])
+        else:
+            length = datetime.timedelta(0)
 
-            if recurring_event_today and recurring_event_today.date() == date:
-                event_start = tz.localize(recurring_event_today.replace(tzinfo=None))
-                event_end = tz.localize((event_start + (event['dtend'].dt - event['dtstart'].dt)).replace(tzinfo=None))
+        last = start
+        if "RDATE" in props:
+            return True
+        if "RRULE" in props:
+            until = [part[6:] for part in props["RRULE"].upper().split(";") if part.startswith("UNTIL=")]
+            if not until:
+                return True
+            last = max(last, _raw_date(until[0]))
+        # An override that moved an occurrence into the past still has to hide the original one
+        if "RECURRENCE-ID" in props:
+            last = max(last, _raw_date(props["RECURRENCE-ID"]))
+        return last + max(length, datetime.timedelta(0)) >= since
+    except (KeyError, ValueError):
+        return True
+
+def _split_property(line: str) -> Tuple[str, str]:
+    # The value starts at the first colon outside a quoted parameter, like TZID="(UTC-05:00) Eastern"
+    colon = line.find(":")
+    if '"' in line[:colon]:
+        quoted = False
+        for colon, char in enumerate(line):
+            if char == '"':
+                quoted = not quoted
+            elif char == ":" and not quoted:
+                break
+        else:
+            colon = -1
+    if colon == -1:
+        return (line.upper(), "")
+    return (line[:colon].split(";", 1)[0].upper(), line[colon + 1:])
+
+def _raw_date(value: str) -> datetime.date:
+    return datetime.datetime.strptime(value[:8], "%Y%m%d").date()
+
+def _merge_calendars(calendars: List[Calendar]) -> Calendar:
+    global _merged_sources, _merged_calendar
+    if len(calendars) == 1:
+        return calendars[0]
+    # Same object as long as no source changed, so the event index is kept
+    if _merged_sources is not None and len(_merged_sources) == len(calendars) and all(a is b for a, b in zip(_merged_sources, calendars)):
+        return _merged_calendar
+
+    # Shared calendars often carry the same events, the first copy of a UID wins
+    merged = Calendar()
+    seen = set()
+    for calendar in calendars:
+        for event in calendar.walk('VEVENT'):
+            uid = event.get('uid')
+            if uid is not None:
+                recurrence_id = event['recurrence-id'].to_ical() if event.has_key('recurrence-id') else None
+                if (str(uid), recurrence_id) in seen:
+                    continue
+                seen.add((str(uid), recurrence_id))
+            merged.add_component(event)
+
+    _merged_sources = calendars
+    _merged_calendar = merged
+    return merged
+
+def _load_cached_calendar() -> Optional[dict]:
+    try:
+        with open(CALENDAR_CACHE_FILE, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable calendar cache: {e}")
+        return None
+
+def _save_cached_calendar(cached: Dict[str, dict]):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Written next to the cache and renamed over it, so a crash never leaves half a file
+        tmp_file = CALENDAR_CACHE_FILE + ".tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump(cached, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, CALENDAR_CACHE_FILE)
+    except Exception as e:
+        logger.warning(f"Could not write the calendar cache: {e}")
+
+class EventIndex:
+    """Every occurrence starting or ending inside [window_start, window_end), sorted for bisection.
+
+    RRULE/RDATE/EXDATE are expanded and RECURRENCE-ID overrides replace the occurrence they move.
+    """
+    def __init__(self, cal: Calendar, tz: datetime.tzinfo, window_start: datetime.datetime, window_end: datetime.datetime):
+        self.calendar = cal
+        self.tz = tz
+        self.window_start = window_start
+        self.window_end = window_end
+
+        occurrences = _expand_events(cal.walk('VEVENT'), tz, window_start, window_end)
+        occurrences.sort(key=lambda x: x.dt_start)
+        self.events = occurrences
+        self.starts = [event.dt_start for event in occurrences]
+        self.boundaries = sorted({event.dt_start for event in occurrences} | {event.dt_end for event in occurrences})
+
+    def covers(self, start: datetime.datetime, end: datetime.datetime) -> bool:
+        return self.window_start <= start and end <= self.window_end
+
+    def starting(self, start: datetime.datetime, end: datetime.datetime) -> List[SavedEvent]:
+        """Events starting in [start, end), by start time."""
+        return self.events[bisect_left(self.starts, start):bisect_left(self.starts, end)]
+
+    def next_boundary(self, after: datetime.datetime) -> Optional[datetime.datetime]:
+        """The first event start or end strictly after the given time."""
+        i = bisect_right(self.boundaries, after)
+        return self.boundaries[i] if i < len(self.boundaries) else None
+
+def _expand_events(events: List[Event], tz: datetime.tzinfo, window_start: datetime.datetime, window_end: datetime.datetime) -> List[SavedEvent]:
+    masters = []
+    overrides = {}
+    for event in events:
+        if event.has_key('recurrence-id'):
+            recurrence_id = _to_aware(event['recurrence-id'].dt, tz)
+            overrides[(str(event.get('uid')), recurrence_id)] = event
         elif event.has_key('dtstart'):
-            start = event['dtstart'].dt
-            end = None
-            if event.has_key('dtend'):
-                end = event['dtend'].dt
-            
-            if not isinstance(start, datetime.datetime):
-                is_all_day = True
-
-            start_date = start if is_all_day else start.date()
-            if start_date == date:
-                event_start = start if is_all_day else start.astimezone(tz)
-                event_end = end if is_all_day or end == None else end.astimezone(tz)
-
-        if event_start:
-            if not isinstance(event_start, datetime.datetime):
-                event_start = tz.localize(datetime.datetime.combine(event_start, datetime.datetime.min.time()))
-            if not isinstance(event_end, datetime.datetime):
-                event_end = tz.localize(datetime.datetime.combine(event_end, datetime.time(23, 59, 59)))
-
-            event_to_save = SavedEvent(is_all_day, event['summary'], event_start, event_end)
-            if event_to_save not in days_events:
-                days_events.append(event_to_save)
-    
-    days_events.sort(key=lambda x: x.dt_start)
-    return days_events
+            masters.append(event)
+
+    occurrences = []
+    for event in masters:
+        uid = str(event.get('uid'))
+        recurring = event.has_key('rrule') or event.has_key('rdate')
+        for start in _event_starts(event, tz, window_start, window_end):
+            if (uid, start) not in overrides:
+                # An occurrence of a recurring event is identified by its original start, like its override would be
+                occurrences.append(_occurrence(event, tz, start, start if recurring else None))
+
+    # Moved occurrences show up where their override puts them, cancelled ones not at all
+    for (_, recurrence_id), event in overrides.items():
+        if str(event.get('status', '')).upper() != 'CANCELLED' and event.has_key('dtstart'):
+            occurrences.append(_occurrence(event, tz, _to_aware(event['dtstart'].dt, tz), recurrence_id))
+
+    return [event for event in occurrences if event.dt_start < window_end and event.dt_end > window_start]
+
+def _event_starts(event: Event, tz: datetime.tzinfo, window_start: datetime.datetime, window_end: datetime.datetime) -> List[datetime.datetime]:
+    dtstart = event['dtstart'].dt
+    if not event.has_key('rrule') and not event.has_key('rdate'):
+        return [_to_aware(dtstart, tz)]
+
+    # Rules are expanded on naive local times of the event's own zone so DST keeps the wall clock time
+    event_tz = getattr(dtstart, 'tzinfo', None) or tz
+    local_start = _to_naive(dtstart, event_tz)
+    rules = rrule.rruleset()
+    for rule in _as_list(event.get('rrule')):
+        rules.rrule(rrule.rrulestr(_naive_rule(rule, event_tz).to_ical().decode(), dtstart=local_start))
+    if not event.has_key('rrule'):
+        rules.rdate(local_start)
+    for rdate in _property_dates(event.get('rdate')):
+        rules.rdate(_to_naive(rdate, event_tz))
+    for exdate in _property_dates(event.get('exdate')):
+        rules.exdate(_to_naive(exdate, event_tz))
+
+    # Occurrences that started before the window may still be running in it
+    duration = _duration(event)
+    search_start = _to_naive(window_start - duration, event_tz)
+    search_end = _to_naive(window_end, event_tz)
+    return [_localize(start, event_tz) for start in rules.between(search_start, search_end, inc=True)]
+
+def _occurrence(event: Event, tz: datetime.tzinfo, start: datetime.datetime, recurrence_id: Optional[datetime.datetime]) -> SavedEvent:
+    is_all_day = not isinstance(event['dtstart'].dt, datetime.datetime)
+    event_start = start.astimezone(tz)
+    if is_all_day:
+        # Kept from the single event handling: all day events run until the end of their DTEND date
+        end_date = (start + _duration(event)).date() if event.has_key('dtend') or event.has_key('duration') else start.date()
+        event_end = tz.localize(datetime.datetime.combine(end_date, datetime.time(23, 59, 59)))
+    else:
+        event_end = (start + _duration(event)).astimezone(tz)
+    return SavedEvent(
+        _text(event, 'uid'), recurrence_id, is_all_day, _text(event, 'summary') or "", event_start, event_end,
+        location=_text(event, 'location'), source=_text(event, SOURCE_PROPERTY), status=_text(event, 'status'),
+    )
+
+def _text(event: Event, name: str) -> Optional[str]:
+    return str(event[name]) if event.has_key(name) else None
+
+def _duration(event: Event) -> datetime.timedelta:
+    if event.has_key('dtend'):
+        return event['dtend'].dt - event['dtstart'].dt
+    if event.has_key('duration'):
+        return event['duration'].dt
+    return datetime.timedelta(days=1) if not isinstance(event['dtstart'].dt, datetime.datetime) else datetime.timedelta(0)
+
+def _naive_rule(rule: vRecur, event_tz: datetime.tzinfo) -> vRecur:
+    # dateutil refuses a UTC UNTIL next to a naive DTSTART
+    if 'UNTIL' not in rule:
+        return rule
+    rule = vRecur(rule)
+    rule['UNTIL'] = [_to_naive(until, event_tz) for until in _as_list(rule['UNTIL'])]
+    return rule
+
+def _property_dates(prop) -> List[datetime.date]:
+    return [date.dt for dates in _as_list(prop) for date in dates.dts]
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def _localize(value: datetime.datetime, tzinfo: datetime.tzinfo) -> datetime.datetime:
+    return tzinfo.localize(value) if hasattr(tzinfo, 'localize') else value.replace(tzinfo=tzinfo)
+
+def _to_aware(value: datetime.date, tz: datetime.tzinfo) -> datetime.datetime:
+    if not isinstance(value, datetime.datetime):
+        return _localize(datetime.datetime.combine(value, datetime.time()), tz)
+    return value if value.tzinfo else _localize(value, tz)
+
+def _to_naive(value: datetime.date, event_tz: datetime.tzinfo) -> datetime.datetime:
+    if not isinstance(value, datetime.datetime):
+        return datetime.datetime.combine(value, datetime.time())
+    return value.astimezone(event_tz).replace(tzinfo=None) if value.tzinfo else value
 
 if __name__ == "__main__":
     todays_events = get_events(get_calendar(), datetime.date(2022, 3, 28))
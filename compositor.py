@@ -0,0 +1,104 @@
+import logging
+from PIL import Image, ImageChops
+from layout import Widget
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Box = Tuple[int, int, int, int]
+
+# Extra pixels around every tile, in case a glyph paints past the box its font reports
+TILE_MARGIN = 2
+
+class Tile:
+    """One widget painted on its own, with the mask of the pixels it painted."""
+    def __init__(self, widget: Widget):
+        self.key = widget.inputs
+        left, top, right, bottom = widget.bounds()
+        self.offset = (left - TILE_MARGIN, top - TILE_MARGIN)
+        size = (right - left + 2 * TILE_MARGIN, bottom - top + 2 * TILE_MARGIN)
+        xy = (-self.offset[0], -self.offset[1])
+        # Painted on black and on white, the pixels the widget touched are the ones that agree
+        on_black = Image.new("1", size, 0)
+        on_white = Image.new("1", size, 255)
+        widget.paint(on_black, xy)
+        widget.paint(on_white, xy)
+        self.ink = on_white
+        self.mask = ImageChops.invert(ImageChops.logical_xor(on_black, on_white))
+
+class Compositor:
+    """Keeps the last frame and a tile per widget, and only paints again where widgets changed.
+
+    A widget is painted into its tile when its inputs change. A frame is the last frame
+    with the boxes of widgets that changed, moved, appeared or went away pasted again from
+    the tiles, so the work follows the amount of change rather than what is on the screen.
+    """
+    def __init__(self):
+        self.canvas: Optional[Image.Image] = None
+        self._tiles: Dict[Widget, Tile] = {}
+        # Widget: (inputs, box on the canvas) for everything in the last frame
+        self._placed: Dict[Widget, Tuple[tuple, Box]] = {}
+
+    def compose(self, root: Widget) -> Image.Image:
+        """The frame for root, which has been updated and placed. The image returned is the caller's."""
+        if self.canvas is None or self.canvas.size != root.extent:
+            self.canvas = Image.new("1", root.extent, 255)
+            self._placed = {}
+
+        layers = list(root.layers())
+        placed = {}
+        for layer in layers:
+            tile = self._tiles.get(layer)
+            if tile is None or tile.key != layer.inputs:
+                tile = self._tiles[layer] = Tile(layer)
+            x = layer.origin[0] + tile.offset[0]
+            y = layer.origin[1] + tile.offset[1]
+            placed[layer] = (layer.inputs, (x, y, x + tile.ink.width, y + tile.ink.height))
+
+        dirty = []
+        for layer, (inputs, box) in placed.items():
+            last = self._placed.get(layer)
+            if last != (inputs, box):
+                dirty.append(box)
+                if last is not None:
+                    dirty.append(last[1])
+        dirty.extend(box for layer, (_, box) in self._placed.items() if layer not in placed)
+        self._placed = placed
+
+        for box in _merge(dirty):
+            self._repaint(box, layers)
+        logger.debug(f"Composed {len(layers)} widgets, {len(dirty)} boxes changed.")
+        return self.canvas.copy()
+
+    def _repaint(self, box: Box, layers: List[Widget]):
+        box = _intersection(box, (0, 0, *self.canvas.size))
+        if box is None:
+            return
+        self.canvas.paste(255, box)
+        for layer in layers:
+            tile = self._tiles[layer]
+            overlap = _intersection(box, self._placed[layer][1])
+            if overlap is None:
+                continue
+            x, y = self._placed[layer][1][:2]
+            crop = (overlap[0] - x, overlap[1] - y, overlap[2] - x, overlap[3] - y)
+            self.canvas.paste(tile.ink.crop(crop), overlap[:2], tile.mask.crop(crop))
+
+def _intersection(a: Box, b: Box) -> Optional[Box]:
+    box = (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+    return box if box[0] < box[2] and box[1] < box[3] else None
+
+def _merge(boxes: List[Box]) -> List[Box]:
+    # Overlapping boxes are painted once as their union, a row of changed widgets becomes one box
+    merged: List[Box] = []
+    for box in boxes:
+        while True:
+            for other in merged:
+                if _intersection(box, other):
+                    merged.remove(other)
+                    box = (min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3]))
+                    break
+            else:
+                break
+        merged.append(box)
+    return merged
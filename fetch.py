@@ -0,0 +1,92 @@
+import time
+import random
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Seconds to establish a connection and to wait for the next chunk of the response
+DEFAULT_TIMEOUT = (10, 30)
+# Attempts after the first one, for connection failures, 429 and 5xx
+RETRIES = 2
+# Seconds before the first retry, doubling after each one, with +-50% jitter
+RETRY_DELAY = 2
+# A Retry-After longer than this is left to the caller instead of being slept through
+RETRY_MAX_DELAY = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+
+class FetchError(Exception):
+    """A request that failed for good, after any retries."""
+    def __init__(self, url: str, message: str, status_code: Optional[int] = None, retry_after: float = 0.0):
+        self.url = url
+        self.status_code = status_code
+        self.retry_after = retry_after
+        # Query strings carry API keys, keep them out of logs, including urllib3's messages
+        query = urlsplit(url).query
+        if query:
+            message = message.replace(f"?{query}", "")
+        super().__init__(f"{_redact(url)}: {message}")
+
+def get_session() -> requests.Session:
+    """Returns the session every source shares, so connections and TLS sessions are kept alive between updates."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        # One pooled connection per concurrent fetch to the same host
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+        _session.headers["Accept-Encoding"] = "gzip, deflate"
+    return _session
+
+def get(url: str, headers: Optional[Dict[str, str]] = None, timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT, retries: int = RETRIES, stream: bool = False) -> requests.Response:
+    """GETs url through the shared session, retrying transient failures.
+
+    Responses below 400 are returned as they are, anything else raises FetchError.
+    With stream set the body is left unread and the caller has to close the response.
+    """
+    for attempt in range(retries + 1):
+        delay = RETRY_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+        try:
+            response = get_session().get(url, headers=headers, timeout=timeout, stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = FetchError(url, f"{type(e).__name__}: {e}")
+        except requests.RequestException as e:
+            raise FetchError(url, f"{type(e).__name__}: {e}") from e
+        else:
+            if response.status_code < 400:
+                return response
+            # Hands the connection back to the pool, a streamed body would hold on to it
+            response.close()
+            retry_after = _retry_after(response)
+            error = FetchError(url, f"HTTP {response.status_code} {response.reason}", response.status_code, retry_after)
+            if response.status_code not in RETRY_STATUSES or retry_after > RETRY_MAX_DELAY:
+                raise error
+            delay = max(delay, retry_after)
+
+        if attempt < retries:
+            logger.info(f"Retrying in {delay:.1f}s after {error}")
+            time.sleep(delay)
+    raise error
+
+def get_json(url: str, timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT, retries: int = RETRIES):
+    response = get(url, timeout=timeout, retries=retries)
+    try:
+        return response.json()
+    except ValueError as e:
+        raise FetchError(url, f"invalid JSON: {e}", response.status_code) from e
+
+def _retry_after(response: requests.Response) -> float:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return 0.0
+
+def _redact(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
@@ -1,19 +1,97 @@
 from PIL import ImageFont
+from bisect import bisect_right
 from enum import Enum
+from functools import lru_cache
+from itertools import accumulate
+from typing import Dict, List, Optional
+from weakref import WeakKeyDictionary
 
 class Style(Enum):
+    THIN = "thin"
+    EXTRA_LIGHT = "extralight"
+    LIGHT = "light"
     REGULAR = "regular"
+    MEDIUM = "medium"
+    SEMI_BOLD = "semibold"
     BOLD = "bold"
-    LIGHT = "light"
+    EXTRA_BOLD = "extrabold"
+    BLACK = "black"
+
+font_files = {
+    Style.THIN: "fonts/RobotoSlab-Thin.ttf",
+    Style.EXTRA_LIGHT: "fonts/RobotoSlab-ExtraLight.ttf",
+    Style.LIGHT: "fonts/RobotoSlab-Light.ttf",
+    Style.REGULAR: "fonts/RobotoSlab-Regular.ttf",
+    Style.MEDIUM: "fonts/RobotoSlab-Medium.ttf",
+    Style.SEMI_BOLD: "fonts/RobotoSlab-SemiBold.ttf",
+    Style.BOLD: "fonts/RobotoSlab-Bold.ttf",
+    Style.EXTRA_BOLD: "fonts/RobotoSlab-ExtraBold.ttf",
+    Style.BLACK: "fonts/RobotoSlab-Black.ttf",
+}
+
+# Every (style, size) pair loads its FreeType face once, the fonts are shared between callers
+@lru_cache(maxsize=128)
+def get_font(style: Style, size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(font_files[style], size)
+
+# Advance width of every character measured so far, per font
+_advances: "WeakKeyDictionary[ImageFont.FreeTypeFont, Dict[str, float]]" = WeakKeyDictionary()
+
+def _prefix_widths(text: str, font: ImageFont.FreeTypeFont) -> List[float]:
+    advances = _advances.setdefault(font, {})
+    for char in set(text) - advances.keys():
+        advances[char] = font.getlength(char)
+    return [0.0] + list(accumulate(advances[char] for char in text))
+
+def text_width(text: str, font: ImageFont.FreeTypeFont) -> float:
+    return _prefix_widths(text, font)[-1]
+
+def truncate_text(text: str, font: ImageFont.FreeTypeFont, max_width: float, ellipsis: str = "...") -> str:
+    """Returns text, or its longest prefix that fits in max_width with the ellipsis appended."""
+    widths = _prefix_widths(text, font)
+    if widths[-1] <= max_width:
+        return text
+    return _ellipsize(text, widths, font, max_width, ellipsis)
+
+def wrap_text(text: str, font: ImageFont.FreeTypeFont, max_width: float, max_lines: Optional[int] = None, ellipsis: str = "...") -> List[str]:
+    """Greedily wraps text on spaces into lines no wider than max_width.
+
+    Words wider than a line are split. Past max_lines the last line is cut with the ellipsis.
+    """
+    if max_lines is not None and max_lines < 1:
+        return []
+    space = text_width(" ", font)
+    lines: List[str] = []
+    line, line_width = "", 0.0
+    for word in text.split():
+        widths = _prefix_widths(word, font)
+        if line and line_width + space + widths[-1] <= max_width:
+            line, line_width = f"{line} {word}", line_width + space + widths[-1]
+            continue
+        if line:
+            lines.append(line)
+        while widths[-1] > max_width:
+            cut = max(1, bisect_right(widths, max_width) - 1)
+            lines.append(word[:cut])
+            word = word[cut:]
+            widths = _prefix_widths(word, font)
+        line, line_width = word, widths[-1]
+    if line:
+        lines.append(line)
+
+    if max_lines is not None and len(lines) > max_lines:
+        rest = " ".join(lines[max_lines - 1:])
+        lines = lines[:max_lines - 1] + [_ellipsize(rest, _prefix_widths(rest, font), font, max_width, ellipsis)]
+    return lines
 
-font_reg = ImageFont.truetype("fonts/RobotoSlab-Regular.ttf")
-font_bold = ImageFont.truetype("fonts/RobotoSlab-Bold.ttf")
-font_light = ImageFont.truetype("fonts/RobotoSlab-Light.ttf")
-
-def get_font(style: Style, size: int) -> ImageFont:
-    if style == Style.REGULAR:
-        return font_reg.font_variant(size = size)
-    elif style == Style.BOLD:
-        return font_bold.font_variant(size = size)
-    elif style == Style.LIGHT:
-        return font_light.font_variant(size = size)
+def _ellipsize(text: str, widths: List[float], font: ImageFont.FreeTypeFont, max_width: float, ellipsis: str) -> str:
+    # Prefix widths only grow, so the cut is found by bisecting them
+    cut = bisect_right(widths, max_width - text_width(ellipsis, font)) - 1
+    while cut > 0:
+        # Trailing spaces are dropped before the ellipsis, and kerning can make the exact
+        # width differ slightly from the summed advances
+        candidate = text[:cut].rstrip() + ellipsis
+        if font.getlength(candidate) <= max_width:
+            return candidate
+        cut -= 1
+    return ellipsis
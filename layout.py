@@ -0,0 +1,295 @@
+import json
+import logging
+from PIL import Image, ImageDraw
+from fonts import Style, get_font, truncate_text, wrap_text
+from weather_icons import get_icon, get_weather_icon_for_name, get_wind_arrow
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Layouts are JSON widget trees. Every widget takes:
+#   "at": [x, y]        fixed position inside its parent, outside the parent's flow
+#   "pad": [l, t, r, b] space around the widget inside the flow
+#   "show": "key"       only shown while the model value is truthy, "!key" while it is falsy
+# Any other string value written as "{key}" is replaced by that model value, text is formatted
+# with the whole model.
+
+RESAMPLE = {
+    "nearest": Image.NEAREST,
+    "bicubic": Image.BICUBIC,
+}
+
+def load_layout(path: str) -> "Widget":
+    with open(path) as f:
+        return build(json.load(f))
+
+def build(spec: dict) -> "Widget":
+    return WIDGETS[spec["type"]](spec)
+
+def _resolve(value, model: dict):
+    if isinstance(value, str) and value.startswith("{") and value.endswith("}") and value.count("{") == 1:
+        return model.get(value[1:-1])
+    return value
+
+class Widget:
+    """A node of the layout. Measuring and placing are cached until the bound inputs change."""
+    def __init__(self, spec: dict):
+        self.spec = spec
+        self.at = spec.get("at")
+        self.pad = spec.get("pad", [0, 0, 0, 0])
+        self.show = spec.get("show")
+        self.visible = False
+        self.inputs = None
+        self.extent = (0, 0)
+        self.origin = None
+        # Set whenever the last update or place changed what the widget draws or where
+        self.changed = True
+
+    def update(self, model: dict) -> bool:
+        """Binds the widget to model and measures it again if its inputs changed."""
+        visible = self._shown(model)
+        inputs = self.bind(model) if visible else None
+        self.changed = visible != self.visible or inputs != self.inputs
+        if self.changed:
+            self.visible = visible
+            self.inputs = inputs
+            self.extent = self.measure() if visible else (0, 0)
+        return self.changed
+
+    def place(self, x: int, y: int):
+        origin = (x + self.pad[0], y + self.pad[1])
+        if origin != self.origin:
+            self.origin = origin
+            self.changed = True
+
+    def outer(self) -> Tuple[int, int]:
+        if not self.visible:
+            return (0, 0)
+        return (self.extent[0] + self.pad[0] + self.pad[2], self.extent[1] + self.pad[1] + self.pad[3])
+
+    def bind(self, model: dict) -> tuple:
+        return ()
+
+    def measure(self) -> Tuple[int, int]:
+        return (0, 0)
+
+    def bounds(self) -> Tuple[int, int, int, int]:
+        """The box painted, relative to the origin."""
+        return (0, 0, *self.extent)
+
+    def layers(self) -> Iterator["Widget"]:
+        """The widgets that paint, in the order they are painted."""
+        yield self
+
+    def paint(self, image: Image.Image, xy: Tuple[int, int]):
+        pass
+
+    def draw(self, image: Image.Image):
+        for layer in self.layers():
+            layer.paint(image, layer.origin)
+
+    def _shown(self, model: dict) -> bool:
+        if self.show is None:
+            return True
+        if self.show.startswith("!"):
+            return not model.get(self.show[1:])
+        return bool(model.get(self.show))
+
+class Text(Widget):
+    """Text cut to "max_width" with an ellipsis, or wrapped onto up to "max_lines" lines of it."""
+    def __init__(self, spec: dict):
+        super().__init__(spec)
+        style, size = spec.get("font", ["bold", 30])
+        self.font = get_font(Style[style.upper()], size)
+        self.anchor = spec.get("anchor", "la")
+        self.max_lines = spec.get("max_lines")
+        ascent, descent = self.font.getmetrics()
+        self.line_height = spec.get("line_height", ascent + descent)
+        self.lines: List[str] = []
+
+    def bind(self, model: dict) -> tuple:
+        return (self.spec["text"].format_map(model), _resolve(self.spec.get("fill", 0), model), _resolve(self.spec.get("max_width"), model))
+
+    def measure(self) -> Tuple[int, int]:
+        text, _, max_width = self.inputs
+        if self.max_lines and max_width:
+            self.lines = wrap_text(text, self.font, max_width, self.max_lines)
+        else:
+            self.lines = [truncate_text(text, self.font, max_width) if max_width else text]
+        # Flow containers stack text by its extent from the anchor point
+        _, _, right, bottom = self.bounds()
+        return (max(0, right), max(0, bottom))
+
+    def bounds(self) -> Tuple[int, int, int, int]:
+        boxes = [self.font.getbbox(line, anchor=self.anchor) for line in self.lines] or [(0, 0, 0, 0)]
+        # Every line after the first sits line_height below the one before it
+        return (
+            min(box[0] for box in boxes),
+            boxes[0][1],
+            max(box[2] for box in boxes),
+            boxes[-1][3] + (len(boxes) - 1) * self.line_height,
+        )
+
+    def paint(self, image: Image.Image, xy: Tuple[int, int]):
+        draw = ImageDraw.Draw(image)
+        for i, line in enumerate(self.lines):
+            draw.text((xy[0], xy[1] + i * self.line_height), line, fill=self.inputs[1], font=self.font, anchor=self.anchor)
+
+class Icon(Widget):
+    """A weather icon, given by "name" or by a path in "src"."""
+    def bind(self, model: dict) -> tuple:
+        src = _resolve(self.spec.get("src"), model) or get_weather_icon_for_name(self.spec["name"])
+        return (src, self.spec["size"], self.spec.get("resample", "nearest"), self.spec.get("flip", False))
+
+    def measure(self) -> Tuple[int, int]:
+        src, size, resample, flip = self.inputs
+        self.icon, self.mask = get_icon(src, size, RESAMPLE[resample], flip)
+        return self.icon.size
+
+    def paint(self, image: Image.Image, xy: Tuple[int, int]):
+        image.paste(self.icon, xy, self.mask)
+
+class Arrow(Widget):
+    """The wind arrow, rotated to the degrees in "value"."""
+    def bind(self, model: dict) -> tuple:
+        return (_resolve(self.spec["value"], model), self.spec["size"])
+
+    def measure(self) -> Tuple[int, int]:
+        self.icon, self.mask = get_wind_arrow(*self.inputs)
+        return self.icon.size
+
+    def paint(self, image: Image.Image, xy: Tuple[int, int]):
+        image.paste(self.icon, xy, self.mask)
+
+class Container(Widget):
+    def __init__(self, spec: dict, children: Optional[List[Widget]] = None):
+        super().__init__(spec)
+        self.children = children if children is not None else [build(child) for child in spec.get("children", [])]
+        self._dirty = True
+
+    def update(self, model: dict) -> bool:
+        visible = self._shown(model)
+        children_changed = self.update_children(model) if visible else False
+        inputs = self.bind(model) if visible else None
+        self.changed = visible != self.visible or inputs != self.inputs or children_changed
+        if self.changed:
+            self.visible = visible
+            self.inputs = inputs
+            self.extent = self.measure() if visible else (0, 0)
+            self._dirty = True
+        return self.changed
+
+    def update_children(self, model: dict) -> bool:
+        changed = False
+        for child in self.children:
+            changed = child.update(model) or changed
+        return changed
+
+    def place(self, x: int, y: int):
+        super().place(x, y)
+        # Children only move when something inside, or the container itself, did
+        if self.changed or self._dirty:
+            for child, (child_x, child_y) in zip(self.visible_children(), self.arrange()):
+                child.place(self.origin[0] + child_x, self.origin[1] + child_y)
+            self._dirty = False
+
+    def visible_children(self) -> List[Widget]:
+        return [child for child in self.children if child.visible]
+
+    def arrange(self) -> List[Tuple[int, int]]:
+        """Offsets of the visible children from the container's origin."""
+        return [tuple(child.at or (0, 0)) for child in self.visible_children()]
+
+    def layers(self) -> Iterator[Widget]:
+        for child in self.visible_children():
+            yield from child.layers()
+
+class Box(Container):
+    """A rectangle of fixed "size", optionally outlined or filled, children placed with "at"."""
+    def bind(self, model: dict) -> tuple:
+        return (_resolve(self.spec.get("fill"), model),)
+
+    def measure(self) -> Tuple[int, int]:
+        return tuple(self.spec["size"])
+
+    def bounds(self) -> Tuple[int, int, int, int]:
+        # The rectangle includes its right and bottom edges
+        return (0, 0, self.extent[0] + 1, self.extent[1] + 1)
+
+    def layers(self) -> Iterator[Widget]:
+        if self.inputs[0] is not None or self.spec.get("outline", 0):
+            yield self
+        yield from super().layers()
+
+    def paint(self, image: Image.Image, xy: Tuple[int, int]):
+        x, y = xy
+        ImageDraw.Draw(image).rounded_rectangle((x, y, x + self.extent[0], y + self.extent[1]), radius=self.spec.get("radius", 0), fill=self.inputs[0], outline=0, width=self.spec.get("outline", 0))
+
+class Flow(Container):
+    """Stacks the children without "at" along one axis, "gap" apart, aligned by "align" on the other."""
+    AXIS = 0
+
+    def _flowing(self) -> List[Widget]:
+        return [child for child in self.visible_children() if child.at is None]
+
+    def measure(self) -> Tuple[int, int]:
+        sizes = [child.outer() for child in self._flowing()]
+        if not sizes:
+            return (0, 0)
+        along = sum(size[self.AXIS] for size in sizes) + self.spec.get("gap", 0) * (len(sizes) - 1)
+        across = max(size[1 - self.AXIS] for size in sizes)
+        return (along, across) if self.AXIS == 0 else (across, along)
+
+    def arrange(self) -> List[Tuple[int, int]]:
+        gap = self.spec.get("gap", 0)
+        align = self.spec.get("align", "start")
+        across = self.extent[1 - self.AXIS]
+        offsets = []
+        position = 0
+        for child in self.visible_children():
+            if child.at is not None:
+                offsets.append(tuple(child.at))
+                continue
+            size = child.outer()
+            cross = {"start": 0, "center": (across - size[1 - self.AXIS]) // 2, "end": across - size[1 - self.AXIS]}[align]
+            offsets.append((position, cross) if self.AXIS == 0 else (cross, position))
+            position += size[self.AXIS] + gap
+        return offsets
+
+class Row(Flow):
+    AXIS = 0
+
+class Column(Flow):
+    AXIS = 1
+
+class ItemList(Column):
+    """One copy of "item" per entry of the model list named by "items", up to "max"."""
+    def __init__(self, spec: dict):
+        super().__init__(spec, children=[])
+
+    def update_children(self, model: dict) -> bool:
+        items = (model.get(self.spec["items"]) or [])[:self.spec.get("max")]
+        # Each slot keeps its widgets between frames, so an unchanged entry is not measured again
+        while len(self.children) < len(items):
+            self.children.append(build(self.spec["item"]))
+        changed = False
+        for child, item in zip(self.children, items):
+            changed = child.update({**model, **item}) or changed
+        for child in self.children[len(items):]:
+            changed = changed or child.visible
+            child.visible = False
+            child.inputs = None
+        return changed
+
+    def _shown(self, model: dict) -> bool:
+        return super()._shown(model) and bool(model.get(self.spec["items"]))
+
+WIDGETS = {
+    "text": Text,
+    "icon": Icon,
+    "arrow": Arrow,
+    "box": Box,
+    "row": Row,
+    "column": Column,
+    "list": ItemList,
+}
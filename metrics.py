@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from dotenv import load_dotenv
+from typing import Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Stage timings are written here, as JSON lines if the name ends in .jsonl and in the
+# Prometheus text format otherwise. Nothing is written while it is unset
+METRICS_FILE = os.getenv("METRICS_FILE")
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL_MINUTES", "10")) * 60
+# Percentiles are taken over this many of the latest samples of each stage
+WINDOW = 256
+
+_lock = threading.Lock()
+_samples: Dict[str, Deque[float]] = {}
+_counts: Dict[str, int] = {}
+_totals: Dict[str, float] = {}
+_last_write = time.monotonic()
+
+@contextmanager
+def span(name: str):
+    """Times the block as one sample of the named stage, also when it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+def timed(name: str):
+    """Decorator timing every call of the function as the named stage."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record(name: str, seconds: float):
+    with _lock:
+        if name not in _samples:
+            _samples[name] = deque(maxlen=WINDOW)
+            _counts[name] = 0
+            _totals[name] = 0.0
+        _samples[name].append(seconds)
+        _counts[name] += 1
+        _totals[name] += seconds
+
+def summary() -> Dict[str, dict]:
+    """p50, p95 and max over the rolling window, with the count and sum since startup, per stage."""
+    with _lock:
+        stages = {name: (sorted(samples), _counts[name], _totals[name]) for name, samples in _samples.items()}
+    return {
+        name: {
+            "count": count,
+            "sum": total,
+            "p50": _percentile(samples, 0.5),
+            "p95": _percentile(samples, 0.95),
+            "max": samples[-1],
+        }
+        for name, (samples, count, total) in sorted(stages.items())
+    }
+
+def maybe_write():
+    """Writes the summary to METRICS_FILE once METRICS_INTERVAL has passed since the last write."""
+    global _last_write
+    if not METRICS_FILE or time.monotonic() - _last_write < METRICS_INTERVAL:
+        return
+    _last_write = time.monotonic()
+    write(METRICS_FILE)
+
+def write(path: str):
+    stages = summary()
+    try:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if path.endswith(".jsonl"):
+            with open(path, "a") as f:
+                f.write(json.dumps({"time": time.time(), "stages": stages}) + "\n")
+        else:
+            # Scrapers may read at any moment, so the file is replaced in one go
+            tmp_file = path + ".tmp"
+            with open(tmp_file, "w") as f:
+                f.write(_prometheus(stages))
+            os.replace(tmp_file, path)
+    except Exception as e:
+        logger.warning(f"Could not write metrics: {e}")
+
+def _percentile(samples: list, q: float) -> Optional[float]:
+    # Nearest rank, samples are sorted
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else None
+
+def _prometheus(stages: Dict[str, dict]) -> str:
+    lines = [
+        "# HELP dashboard_stage_seconds Time spent in each stage of the display update.",
+        "# TYPE dashboard_stage_seconds summary",
+    ]
+    for name, stage in stages.items():
+        lines.append(f'dashboard_stage_seconds{{stage="{name}",quantile="0.5"}} {stage["p50"]}')
+        lines.append(f'dashboard_stage_seconds{{stage="{name}",quantile="0.95"}} {stage["p95"]}')
+        lines.append(f'dashboard_stage_seconds_sum{{stage="{name}"}} {stage["sum"]}')
+        lines.append(f'dashboard_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+    lines.append("# HELP dashboard_stage_max_seconds Longest recent time spent in each stage.")
+    lines.append("# TYPE dashboard_stage_max_seconds gauge")
+    for name, stage in stages.items():
+        lines.append(f'dashboard_stage_max_seconds{{stage="{name}"}} {stage["max"]}')
+    return "\n".join(lines) + "\n"
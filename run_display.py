@@ -5,8 +5,13 @@ import logging
 from PIL import Image
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from display import get_screen, DisplayState
-from typing import List, Tuple
+from calendars import get_next_boundary
+from display import get_snapshot, render, local_now, DisplayState, Snapshot
+from fetch import FetchError
+import metrics
+from metrics import span, timed
+from scheduler import Reason, Scheduler, needs_fetch
+from typing import List, Optional, Tuple
 
 logging.basicConfig(
     format='%(asctime)s %(levelname)-8s %(message)s',
@@ -14,6 +19,7 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S')
 logger = logging.getLogger(__name__)
 
+from waveshare_epd import epdbuffer
 try:
     from waveshare_epd import epd7in5_V2
 except OSError as e:
@@ -26,14 +32,36 @@ except OSError as e:
 load_dotenv()
 timezone = pytz.timezone(os.getenv("TIMEZONE"))
 off_hours = [int(hour_str) for hour_str in os.getenv("DOWN_HOURS").split(",")]
+full_refresh_interval = int(os.getenv("FULL_REFRESH_INTERVAL", "10"))
+# How soon to try again when a data source could not be reached
+fetch_retry_delay = timedelta(minutes=1)
+# How long after an event starts or ends its boundary is drawn, calendar_values compares strictly
+boundary_delay = timedelta(seconds=1)
+partial_refreshes = 0
+
+class Frame:
+    """A screen rendered for a given time, packed for the panel and diffed against the frame it replaces."""
+    def __init__(self, time: datetime, snapshot: Snapshot, base: Optional[bytes], state: DisplayState, img: Image.Image, buf: bytearray, regions: Optional[List[Tuple[int, int, int, int]]]):
+        self.time = time
+        self.snapshot = snapshot
+        # Digest of the frame the regions were diffed against
+        self.base = base
+        self.state = state
+        self.img = img
+        self.buf = buf
+        self.digest = epdbuffer.digest(buf)
+        self.regions = regions
 
 def start_updating(epd: epd7in5_V2.EPD):
-    state = None
+    shown = None
+    snapshot = None
+    scheduler = Scheduler()
+    refetch = True
+    frame = None
 
     while True:
-        state, update_times = update_once(epd, state)
-        update_times.sort()
-        update_times = list(filter(lambda time: time > timezone.localize(datetime.now()), update_times))
+        shown, snapshot = update_once(epd, shown, snapshot, scheduler, refetch, frame)
+        metrics.maybe_write()
 
         current_hour = datetime.now().hour
         if current_hour in off_hours:
@@ -44,37 +72,94 @@ def start_updating(epd: epd7in5_V2.EPD):
                 epd.sleep()
             except IOError as e:
                 logger.error(e)
+            shown = None
             sleep_until = current_hour
             while (sleep_until % 24) not in off_hours:
                 sleep_until = sleep_until + 1
-            update_times = [timezone.localize(datetime.now()) + timedelta(hours=sleep_until - current_hour),]
+            scheduler.clear()
+            scheduler.schedule(Reason.REFRESH, [timezone.localize(datetime.now()) + timedelta(hours=sleep_until - current_hour),])
+
+        wake_at, reasons = scheduler.next_wakeup()
+        refetch = needs_fetch(reasons)
+        # Nothing but the time changes before a boundary, so its frame is ready when it passes
+        frame = prepare_frame(epd, snapshot, wake_at, shown) if not refetch and snapshot else None
+        logger.info(f"Waiting until {wake_at} for {', '.join(sorted(reason.value for reason in reasons))}")
+        pause.until(wake_at)
 
-        logger.info(f"Waiting until {update_times[0]}")
-        pause.until(update_times[0])
 
+@timed("update")
+def update_once(epd: epd7in5_V2.EPD, shown: Optional[Frame], prev_snapshot: Optional[Snapshot], scheduler: Scheduler, refetch: bool = True, frame: Optional[Frame] = None) -> Tuple[Optional[Frame], Optional[Snapshot]]:
+    """Draws the screen and refreshes the panel if the frame differs from the one shown.
 
-def update_once(epd: epd7in5_V2.EPD, prev_state: DisplayState) -> Tuple[DisplayState, List[datetime]]:
+    Returns the frame now on the panel and the snapshot it was drawn from.
+    """
     logger.info("Attempting to update state.")
-    update_times = [timezone.localize(datetime.now()) + timedelta(minutes=int(os.getenv("UPDATE_INTERVAL"))),]
-    state, img = get_screen()
+    now = local_now()
+    snapshot = prev_snapshot
+    if refetch or snapshot is None:
+        try:
+            snapshot = get_snapshot()
+        except FetchError as e:
+            logger.error(f"Could not fetch data, keeping the current screen: {e}")
+            scheduler.schedule(Reason.RETRY, [now + fetch_retry_delay,])
+            return (shown, prev_snapshot)
+        scheduler.schedule(Reason.REFRESH, [now + timedelta(minutes=int(os.getenv("UPDATE_INTERVAL"))),])
+        scheduler.schedule(Reason.RETRY, [])
+    else:
+        logger.info(f"Redrawing from the data fetched at {snapshot.fetched_at}.")
 
-    if state and state.events_graphed:
-        for event in state.events_graphed:
-            update_times.append(event.start + timedelta(seconds=15))
-            update_times.append(event.end + timedelta(seconds=15))
+    if frame is not None and frame.snapshot is snapshot and frame.base == (shown.digest if shown else None):
+        logger.info(f"Using the frame rendered ahead for {frame.time}.")
+    else:
+        frame = prepare_frame(epd, snapshot, local_now(), shown)
+
+    # Crossing an event boundary or midnight changes the picture but not the data, those wakeups only redraw.
+    # Each of them schedules the one after, so only the next boundary is needed
+    boundaries = [timezone.localize(datetime.combine(now.date() + timedelta(1), datetime.min.time())),]
+    boundary = get_next_boundary(snapshot.calendar, now)
+    if boundary is not None:
+        boundaries.append(boundary + boundary_delay)
+    scheduler.schedule(Reason.BOUNDARY, {time for time in boundaries if time > now})
     
-    if not prev_state or state != prev_state:
-        logger.info("New state differs from previous, updating display.")
-        update_display(epd, img)
-    return (state, update_times)
+    # The packed buffer is exactly what the panel would show, so it decides, not the drawn state
+    if shown is None or frame.digest != shown.digest:
+        logger.info("New frame differs from the one shown, updating display.")
+        update_display(epd, frame.img, frame.regions, frame.buf)
+    return (frame, snapshot)
+
+def prepare_frame(epd: epd7in5_V2.EPD, snapshot: Snapshot, time: datetime, base: Optional[Frame]) -> Frame:
+    state, img = render(snapshot, time)
+    with span("epd.getbuffer"):
+        # Without a panel the image is packed the same way, only not inverted, for the comparison
+        buf = epd.getbuffer(img) if epd else epdbuffer.pack_1bit(img, img.width, img.height)
+    with span("diff"):
+        regions = epdbuffer.changed_regions(base.buf, buf, epd.width if epd else img.width) if base else None
+    return Frame(time, snapshot, base.digest if base else None, state, img, buf, regions)
     
 
-def update_display(epd: epd7in5_V2.EPD, img: Image.Image):
+def update_display(epd: epd7in5_V2.EPD, img: Image.Image, regions: Optional[List[Tuple[int, int, int, int]]] = None, buf: Optional[bytearray] = None):
+    global partial_refreshes
     logger.info("Updating display now.")
     if epd:
-        epd.init()
-        epd.display(epd.getbuffer(img))
-        epd.sleep()
+        if buf is None:
+            with span("epd.getbuffer"):
+                buf = epd.getbuffer(img)
+        if regions is not None and len(regions) == 0:
+            logger.info("Frame is pixel-identical, skipping refresh.")
+        elif regions is not None and partial_refreshes < full_refresh_interval:
+            logger.info(f"Partially refreshing {len(regions)} region(s).")
+            with span("epd.display_partial"):
+                epd.init_part()
+                for region in regions:
+                    epd.display_Partial(buf, *region)
+                epd.sleep()
+            partial_refreshes = partial_refreshes + 1
+        else:
+            with span("epd.display"):
+                epd.init()
+                epd.display(buf)
+                epd.sleep()
+            partial_refreshes = 0
     else:
         img.save("output.png", "PNG")
 
@@ -82,6 +167,10 @@ def init_display() -> epd7in5_V2.EPD:
     try:
         logger.info("Initializing EPD")
         epd = epd7in5_V2.EPD()
+        # Most of a refresh is spent waiting on BUSY, timed apart from the SPI transfers around it
+        epd.ReadBusy = timed("epd.busy")(epd.ReadBusy)
+        # SPI and GPIO stay set up for the life of the process, refreshes only wake the panel
+        epd7in5_V2.epdconfig.open_session()
         epd.init()
         epd.Clear()
         epd.sleep()
@@ -103,4 +192,4 @@ if __name__ == "__main__":
             epd.init()
             epd.Clear()
             epd.sleep()
-            epd7in5_V2.epdconfig.module_exit()
+            epd7in5_V2.epdconfig.close_session()
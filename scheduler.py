@@ -0,0 +1,56 @@
+import heapq
+import itertools
+import logging
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Iterable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+class Reason(Enum):
+    REFRESH = "refresh"
+    RETRY = "retry"
+    BOUNDARY = "boundary"
+
+# Wakeups for these need new data, the others only draw the cached data again
+FETCH_REASONS = {Reason.REFRESH, Reason.RETRY}
+
+# Wakeups this close to the earliest one are handled by a single update
+COALESCE_WINDOW = timedelta(seconds=60)
+
+class Scheduler:
+    """Priority queue of upcoming wakeups and what each of them is for."""
+    def __init__(self, coalesce_window: timedelta = COALESCE_WINDOW):
+        self.coalesce_window = coalesce_window
+        self._queue: List[Tuple[datetime, int, Reason]] = []
+        # Breaks ties between equal times, Reason itself has no order
+        self._counter = itertools.count()
+
+    def schedule(self, reason: Reason, times: Iterable[datetime]):
+        """Replaces every pending wakeup for reason with the given times."""
+        self._queue = [entry for entry in self._queue if entry[2] is not reason]
+        self._queue.extend((time, next(self._counter), reason) for time in times)
+        heapq.heapify(self._queue)
+
+    def clear(self):
+        self._queue = []
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def next_wakeup(self) -> Tuple[datetime, Set[Reason]]:
+        """Pops the earliest wakeup along with every other one inside the coalescing window.
+
+        The merged wakeup is at the latest of their times, so no event boundary is drawn early.
+        """
+        time, _, reason = heapq.heappop(self._queue)
+        wake_at = time
+        reasons = {reason}
+        while self._queue and self._queue[0][0] <= time + self.coalesce_window:
+            later, _, reason = heapq.heappop(self._queue)
+            wake_at = max(wake_at, later)
+            reasons.add(reason)
+        return (wake_at, reasons)
+
+def needs_fetch(reasons: Set[Reason]) -> bool:
+    return bool(reasons & FETCH_REASONS)
@@ -0,0 +1,93 @@
+import datetime
+import calendars
+from icalendar import Calendar
+from pytz import timezone
+from calendars import _unfold
+
+def test_unfold_skips_empty_lines_inside_a_fold():
+    lines = [b"BEGIN:VEVENT", b"SUMMARY:split", b"", b"  across", b"", b"  two", b"END:VEVENT"]
+    assert list(_unfold(lines)) == ["BEGIN:VEVENT", "SUMMARY:split across two", "END:VEVENT"]
+
+def test_get_calendar_without_urls_is_empty(monkeypatch, tmp_path):
+    monkeypatch.setenv("ICS_CALENDARS", "")
+    monkeypatch.setattr(calendars, "CALENDAR_CACHE_FILE", str(tmp_path / "calendars.pickle"))
+    calendar = calendars.get_calendar()
+    assert calendar.walk("VEVENT") == []
+
+ICS = b"""BEGIN:VCALENDAR
+VERSION:2.0
+BEGIN:VEVENT
+UID:standup
+SUMMARY:Standup
+DTSTART;TZID=America/New_York:20240304T093000
+DTEND;TZID=America/New_York:20240304T094500
+RRULE:FREQ=DAILY;BYDAY=MO,TU,WE,TH,FR
+EXDATE;TZID=America/New_York:20240312T093000
+END:VEVENT
+BEGIN:VEVENT
+UID:standup
+RECURRENCE-ID;TZID=America/New_York:20240313T093000
+SUMMARY:Standup (moved)
+DTSTART;TZID=America/New_York:20240313T110000
+DTEND;TZID=America/New_York:20240313T111500
+END:VEVENT
+BEGIN:VEVENT
+UID:standup
+RECURRENCE-ID;TZID=America/New_York:20240314T093000
+SUMMARY:Standup
+STATUS:CANCELLED
+DTSTART;TZID=America/New_York:20240314T093000
+DTEND;TZID=America/New_York:20240314T094500
+END:VEVENT
+BEGIN:VEVENT
+UID:offsite
+SUMMARY:Offsite
+DTSTART;VALUE=DATE:20240311
+DTEND;VALUE=DATE:20240313
+END:VEVENT
+BEGIN:VEVENT
+UID:lunch
+SUMMARY:Lunch
+DTSTART;TZID=America/New_York:20240311T120000
+DTEND;TZID=America/New_York:20240311T130000
+END:VEVENT
+END:VCALENDAR
+""".replace(b"\n", b"\r\n")
+
+TZ = timezone("US/Eastern")
+
+def at(day, hour=0, minute=0):
+    return TZ.localize(datetime.datetime(2024, 3, day, hour, minute))
+
+def index():
+    return calendars.EventIndex(Calendar.from_ical(ICS), TZ, at(11), at(18))
+
+def names(events):
+    return [(event.event_name, event.dt_start) for event in events]
+
+def test_starting_expands_recurring_and_all_day_events():
+    assert names(index().starting(at(11), at(12))) == [
+        ("Offsite", at(11)),
+        ("Standup", at(11, 9, 30)),
+        ("Lunch", at(11, 12)),
+    ]
+
+def test_starting_leaves_out_exdates_and_cancelled_occurrences():
+    events = index()
+    assert names(events.starting(at(12), at(13))) == []
+    assert names(events.starting(at(14), at(15))) == []
+    assert names(events.starting(at(15), at(16))) == [("Standup", at(15, 9, 30))]
+
+def test_starting_moves_overridden_occurrences():
+    assert names(index().starting(at(13), at(14))) == [("Standup (moved)", at(13, 11))]
+
+def test_next_boundary():
+    events = index()
+    assert events.next_boundary(at(11)) == at(11, 9, 30)
+    assert events.next_boundary(at(11, 9, 30)) == at(11, 9, 45)
+    assert events.next_boundary(at(11, 12, 30)) == at(11, 13)
+    # Nothing left on the 12th, the 13th's occurrence was moved to 11:00
+    assert events.next_boundary(at(12, 13)) == at(13, 11)
+    # All day events run until the end of their DTEND date
+    assert events.next_boundary(at(13, 11, 15)) == TZ.localize(datetime.datetime(2024, 3, 13, 23, 59, 59))
+    assert events.next_boundary(at(18)) is None
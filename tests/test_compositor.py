@@ -0,0 +1,38 @@
+import random
+import datetime
+import display
+from compositor import Compositor
+from benchmarks import fixtures
+from calendars import read_calendar, PAST_MARGIN
+from PIL import ImageChops
+from pytz import timezone
+
+def fresh_render(monkeypatch, snapshot: display.Snapshot, now: datetime.datetime):
+    # A new layout and compositor, so nothing is reused from earlier frames
+    with monkeypatch.context() as m:
+        m.setattr(display, "_layout", None)
+        m.setattr(display, "_compositor", Compositor())
+        return display.render(snapshot, now)[1]
+
+def test_incremental_frames_match_fresh_renders(monkeypatch):
+    monkeypatch.setenv("TIMEZONE", fixtures.TIMEZONE)
+    tz = timezone(fixtures.TIMEZONE)
+    since = fixtures.NOW.date() - PAST_MARGIN
+    calendars = [read_calendar(fixtures.calendar(name).splitlines(), since) for name in ("10", "1k")]
+    weather = fixtures.weather()
+    rng = random.Random(0)
+
+    previous = None
+    changed = 0
+    for _ in range(40):
+        now = tz.localize(fixtures.NOW.replace(hour=rng.randrange(24), minute=rng.randrange(60)) + datetime.timedelta(days=rng.randrange(2)))
+        current = dict(weather["current"], feels_like=rng.choice((40, 55.6)), wind_deg=rng.randrange(360))
+        snapshot = display.Snapshot(dict(weather, current=current), rng.choice(calendars), now)
+
+        _, img = display.render(snapshot, now)
+        assert ImageChops.difference(img, fresh_render(monkeypatch, snapshot, now)).getbbox() is None
+        if previous is not None and ImageChops.difference(img, previous).getbbox():
+            changed += 1
+        previous = img
+    # The frames differ from each other, so the cached tiles were really reused and replaced
+    assert changed > 30
@@ -0,0 +1,28 @@
+from fonts import Style, get_font, text_width, wrap_text
+from layout import build
+
+FONT = get_font(Style.BOLD, 30)
+TITLE = "Quarterly business review with customers and partners"
+
+def test_wrap_text_fits_every_line():
+    lines = wrap_text(TITLE, FONT, 300)
+    assert len(lines) > 1
+    assert " ".join(lines) == TITLE
+    assert all(text_width(line, FONT) <= 300 for line in lines)
+
+def test_wrap_text_cuts_the_last_line():
+    lines = wrap_text(TITLE, FONT, 300, max_lines=2)
+    assert len(lines) == 2
+    assert lines[-1].endswith("...")
+    assert FONT.getlength(lines[-1]) <= 300
+
+def test_wrap_text_without_lines():
+    assert wrap_text(TITLE, FONT, 300, max_lines=0) == []
+
+def test_text_widget_wraps_with_max_lines():
+    text = build({"type": "text", "text": "{name}", "max_width": 300, "max_lines": 2})
+    text.update({"name": TITLE})
+    assert text.lines == wrap_text(TITLE, FONT, 300, max_lines=2)
+    assert text.extent[0] <= 300
+    # The second line sits one line height below the first
+    assert text.extent[1] == FONT.getbbox(text.lines[-1])[3] + text.line_height
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+from scheduler import COALESCE_WINDOW, Reason, Scheduler, needs_fetch
+
+NOW = datetime(2024, 3, 11, 10, 0)
+
+def test_coalesced_burst_wakes_at_the_latest_time():
+    scheduler = Scheduler()
+    scheduler.schedule(Reason.BOUNDARY, [NOW, NOW + timedelta(seconds=30), NOW + timedelta(hours=1)])
+    scheduler.schedule(Reason.REFRESH, [NOW + COALESCE_WINDOW])
+    assert scheduler.next_wakeup() == (NOW + COALESCE_WINDOW, {Reason.BOUNDARY, Reason.REFRESH})
+    assert scheduler.next_wakeup() == (NOW + timedelta(hours=1), {Reason.BOUNDARY})
+    assert len(scheduler) == 0
+
+def test_wakeups_outside_the_window_stay_apart():
+    scheduler = Scheduler()
+    scheduler.schedule(Reason.BOUNDARY, [NOW, NOW + COALESCE_WINDOW + timedelta(seconds=1)])
+    assert scheduler.next_wakeup() == (NOW, {Reason.BOUNDARY})
+    assert len(scheduler) == 1
+
+def test_schedule_replaces_only_its_own_reason():
+    scheduler = Scheduler()
+    scheduler.schedule(Reason.REFRESH, [NOW + timedelta(minutes=10)])
+    scheduler.schedule(Reason.BOUNDARY, [NOW + timedelta(minutes=5), NOW + timedelta(minutes=20)])
+    scheduler.schedule(Reason.BOUNDARY, [NOW + timedelta(minutes=30)])
+    assert scheduler.next_wakeup() == (NOW + timedelta(minutes=10), {Reason.REFRESH})
+    assert scheduler.next_wakeup() == (NOW + timedelta(minutes=30), {Reason.BOUNDARY})
+
+def test_empty_retry_schedule_cancels_the_retry():
+    scheduler = Scheduler()
+    scheduler.schedule(Reason.RETRY, [NOW + timedelta(minutes=1)])
+    scheduler.schedule(Reason.REFRESH, [NOW + timedelta(minutes=10)])
+    scheduler.schedule(Reason.RETRY, [])
+    assert len(scheduler) == 1
+    assert scheduler.next_wakeup() == (NOW + timedelta(minutes=10), {Reason.REFRESH})
+
+def test_needs_fetch_only_for_refresh_and_retry():
+    assert needs_fetch({Reason.REFRESH})
+    assert needs_fetch({Reason.RETRY, Reason.BOUNDARY})
+    assert not needs_fetch({Reason.BOUNDARY})
+    assert not needs_fetch(set())
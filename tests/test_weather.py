@@ -0,0 +1,26 @@
+import pytest
+import weather
+from fetch import FetchError
+
+def test_get_json_backs_off_with_nothing_cached(monkeypatch, tmp_path):
+    calls = []
+    def fail(url, timeout):
+        calls.append(url)
+        raise FetchError(url, "HTTP 503 Service Unavailable", 503)
+    monkeypatch.setattr(weather, "fetch_json", fail)
+    monkeypatch.setattr(weather, "WEATHER_CACHE_FILE", str(tmp_path / "weather.json"))
+    monkeypatch.setattr(weather, "_cached_weather", None)
+    monkeypatch.setattr(weather, "_backoff", 0)
+    monkeypatch.setattr(weather, "_retry_at", 0.0)
+
+    with pytest.raises(FetchError):
+        weather.get_json()
+    # Later calls inside the backoff fail without going to the API again
+    with pytest.raises(FetchError):
+        weather.get_json()
+    assert len(calls) == 1
+
+    monkeypatch.setattr(weather, "_retry_at", 0.0)
+    with pytest.raises(FetchError):
+        weather.get_json()
+    assert len(calls) == 2
@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 80
@@ -110,15 +111,12 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
         
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        busy =not(busy & 0x01)
-        while(busy):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
-            busy =not(busy & 0x01)
+        epdconfig.wait_busy(self.busy_pin, 0, poke=lambda: self.send_command(0x71))
         epdconfig.delay_ms(800)
         logger.debug("e-Paper busy release")        
 
@@ -128,22 +126,14 @@ class EPD:
         self.ReadBusy()
 
     def SetFulltReg(self):
-        self.send_command(0x23)
-        for count in range(0, 42):
-            self.send_data(self.lut_w1[count]) 
+        self.send_command_with_data(0x23, self.lut_w1[:42])
         
-        self.send_command(0x24)
-        for count in range(0, 42):
-            self.send_data(self.lut_b1[count])     
+        self.send_command_with_data(0x24, self.lut_b1[:42])
 
     def SetPartReg(self):
-        self.send_command(0x23)
-        for count in range(0, 42):
-            self.send_data(self.lut_w[count]) 
+        self.send_command_with_data(0x23, self.lut_w[:42])
         
-        self.send_command(0x24)
-        for count in range(0, 42):
-            self.send_data(self.lut_b[count])     
+        self.send_command_with_data(0x24, self.lut_b[:42])
 
     def Init(self):
         if (epdconfig.module_init() != 0):
@@ -151,43 +141,36 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0xD2)			
-        self.send_data(0x3F)
+        self.send_command_with_data(0xD2, [0x3F])
 
-        self.send_command(0x00)  			
-        self.send_data (0x6F)  #from outside
+        self.send_command_with_data(0x00, [
+            0x6F,  #from outside
+        ])
 
-        self.send_command(0x01)  #power setting
-        self.send_data (0x03)	    
-        self.send_data (0x00)
-        self.send_data (0x2b)		
-        self.send_data (0x2b) 
+        self.send_command_with_data(0x01, [0x03, 0x00, 0x2b, 0x2b])  #power setting
 
-        self.send_command(0x06)  #Configuring the charge pump
-        self.send_data(0x3f)
+        self.send_command_with_data(0x06, [0x3f])  #Configuring the charge pump
 
-        self.send_command(0x2A)  #Setting XON and the options of LUT
-        self.send_data(0x00) 
-        self.send_data(0x00) 
+        self.send_command_with_data(0x2A, [0x00, 0x00])  #Setting XON and the options of LUT
 
-        self.send_command(0x30)  #Set the clock frequency
-        self.send_data(0x17) #50Hz
+        self.send_command_with_data(0x30, [  #Set the clock frequency
+            0x17,  #50Hz
+        ])
 
-        self.send_command(0x50)  #Set VCOM and data output interval
-        self.send_data(0x57)			
+        self.send_command_with_data(0x50, [0x57])  #Set VCOM and data output interval
 
-        self.send_command(0x60)  #Set The non-overlapping period of Gate and Source.
-        self.send_data(0x22)
+        self.send_command_with_data(0x60, [0x22])  #Set The non-overlapping period of Gate and Source.
 
-        self.send_command(0x61)  #resolution setting
-        self.send_data (0x50)    #source 128 	 
-        self.send_data (0x80)       
+        self.send_command_with_data(0x61, [  #resolution setting
+            0x50,  #source 128
+            0x80,
+        ])
 
-        self.send_command(0x82)  #sets VCOM_DC value
-        self.send_data(0x12)  #-1v
+        self.send_command_with_data(0x82, [  #sets VCOM_DC value
+            0x12,  #-1v
+        ])
 
-        self.send_command(0xe3)#Set POWER SAVING
-        self.send_data(0x33)
+        self.send_command_with_data(0xe3, [0x33])#Set POWER SAVING
         self.SetFulltReg()	
         self.send_command(0x04)     		#power on
         self.ReadBusy()
@@ -197,39 +180,29 @@ class EPD:
     def Partial_Init(self):
         self.reset()
         
-        self.send_command(0xD2)
-        self.send_data(0x3F)
+        self.send_command_with_data(0xD2, [0x3F])
 
-        self.send_command(0x00)
-        self.send_data (0x6F)  #from outside
+        self.send_command_with_data(0x00, [
+            0x6F,  #from outside
+        ])
 
-        self.send_command(0x01)  #power setting
-        self.send_data (0x03)
-        self.send_data (0x00)
-        self.send_data (0x2b)
-        self.send_data (0x2b)
+        self.send_command_with_data(0x01, [0x03, 0x00, 0x2b, 0x2b])  #power setting
 
-        self.send_command(0x06)  #Configuring the charge pump
-        self.send_data(0x3f)
+        self.send_command_with_data(0x06, [0x3f])  #Configuring the charge pump
 
-        self.send_command(0x2A)  #Setting XON and the options of LUT
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send_command_with_data(0x2A, [0x00, 0x00])  #Setting XON and the options of LUT
 
-        self.send_command(0x30)  #Set the clock frequency
-        self.send_data(0x17)
+        self.send_command_with_data(0x30, [0x17])  #Set the clock frequency
 
-        self.send_command(0x50)  #Set VCOM and data output interval
-        self.send_data(0xf2)
+        self.send_command_with_data(0x50, [0xf2])  #Set VCOM and data output interval
 
-        self.send_command(0x60)  #Set The non-overlapping period of Gate and Source.
-        self.send_data(0x22)
+        self.send_command_with_data(0x60, [0x22])  #Set The non-overlapping period of Gate and Source.
 
-        self.send_command(0x82)  #Set VCOM_DC value
-        self.send_data(0x12)#-1v
+        self.send_command_with_data(0x82, [  #Set VCOM_DC value
+            0x12,  #-1v
+        ])
 
-        self.send_command(0xe3)#Set POWER SAVING
-        self.send_data(0x33)
+        self.send_command_with_data(0xe3, [0x33])#Set POWER SAVING
 
         self.SetPartReg()	
 
@@ -239,26 +212,7 @@ class EPD:
         return 0
     
     def getbuffer(self, image):
-        buf = [0xFF] * (int(self.width / 8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height)
 
     def Display(self, image):
         if (image == None):
@@ -304,9 +258,10 @@ class EPD:
 
         # Set partial Windows */
         self.send_command(0x91)		#This command makes the display enter partial mode
-        self.send_command(0x90)		#resolution setting
-        self.send_data(0)           #x-start
-        self.send_data(79)       #x-end
+        self.send_command_with_data(0x90, [		#resolution setting
+            0,  #x-start
+            79,  #x-end
+        ])
 
         self.send_data(0)
         self.send_data(127)  #y-end
@@ -334,12 +289,10 @@ class EPD:
         self.TurnOnDisplay()
 
     def Sleep(self):
-        self.send_command(0x50)
-        self.send_data(0xf7)
+        self.send_command_with_data(0x50, [0xf7])
         self.send_command(0x02)
         self.ReadBusy()
-        self.send_command(0x07)
-        self.send_data(0xA5)
+        self.send_command_with_data(0x07, [0xA5])
         epdconfig.delay_ms(200)
 
         epdconfig.delay_ms(2000)
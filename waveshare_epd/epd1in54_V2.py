@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 200
@@ -112,65 +113,48 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
         
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):
-            epdconfig.delay_ms(20)
+        epdconfig.wait_busy(self.busy_pin, 1)
         logger.debug("e-Paper busy release")
 
     def TurnOnDisplay(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0xc7)
+        self.send_command_with_data(0x22, [0xc7]) # DISPLAY_UPDATE_CONTROL_2
         self.send_command(0x20) # MASTER_ACTIVATION
         self.ReadBusy()
     
     def TurnOnDisplayPart(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0xcF)
+        self.send_command_with_data(0x22, [0xcF]) # DISPLAY_UPDATE_CONTROL_2
         self.send_command(0x20) # MASTER_ACTIVATION
         self.ReadBusy()
 
     def lut(self, lut):
-        self.send_command(0x32) # WRITE_LUT_REGISTER
-        for i in range(0, len(lut)):
-            self.send_data(lut[i])
+        self.send_command_with_data(0x32, lut) # WRITE_LUT_REGISTER
             
     def set_lut(self, lut):
         self.lut(lut)
         
-        self.send_command(0x3f)
-        self.send_data(lut[153])
+        self.send_command_with_data(0x3f, [lut[153]])
         
-        self.send_command(0x03)
-        self.send_data(lut[154])
+        self.send_command_with_data(0x03, [lut[154]])
         
-        self.send_command(0x04)
-        self.send_data(lut[155])
-        self.send_data(lut[156])
-        self.send_data(lut[157])
+        self.send_command_with_data(0x04, [lut[155], lut[156], lut[157]])
         
-        self.send_command(0x2c)
-        self.send_data(lut[158])
+        self.send_command_with_data(0x2c, [lut[158]])
       
     def SetWindows(self, Xstart, Ystart, Xend, Yend):
-        self.send_command(0x44); # SET_RAM_X_ADDRESS_START_END_POSITION
-        self.send_data((Xstart>>3) & 0xFF);
-        self.send_data((Xend>>3) & 0xFF);
+        self.send_command_with_data(0x44, [(Xstart>>3) & 0xFF, (Xend>>3) & 0xFF]) # SET_RAM_X_ADDRESS_START_END_POSITION
         
-        self.send_command(0x45); # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(Ystart & 0xFF);
-        self.send_data((Ystart >> 8) & 0xFF);
-        self.send_data(Yend & 0xFF);
-        self.send_data((Yend >> 8) & 0xFF);
+        self.send_command_with_data(0x45, [Ystart & 0xFF, (Ystart >> 8) & 0xFF, Yend & 0xFF, (Yend >> 8) & 0xFF]) # SET_RAM_Y_ADDRESS_START_END_POSITION
     
 
     def SetCursor(self, Xstart, Ystart):
-        self.send_command(0x4E); # SET_RAM_X_ADDRESS_COUNTER
-        self.send_data(Xstart & 0xFF);
+        self.send_command_with_data(0x4E, [Xstart & 0xFF]) # SET_RAM_X_ADDRESS_COUNTER
 
-        self.send_command(0x4F); # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(Ystart & 0xFF);
-        self.send_data((Ystart >> 8) & 0xFF);
+        self.send_command_with_data(0x4F, [Ystart & 0xFF, (Ystart >> 8) & 0xFF]) # SET_RAM_Y_ADDRESS_COUNTER
 
     def init(self, isPartial):
         if (epdconfig.module_init() != 0):
@@ -183,23 +167,11 @@ class EPD:
             
             self.set_lut(self.WF_PARTIAL_1IN54_0)
             
-            self.send_command(0x37)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x40)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
+            self.send_command_with_data(0x37, [0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00])
             
-            self.send_command(0x3c)  # BorderWavefrom
-            self.send_data(0x80)
+            self.send_command_with_data(0x3c, [0x80])  # BorderWavefrom
             
-            self.send_command(0x22)
-            self.send_data(0xc0)
+            self.send_command_with_data(0x22, [0xc0])
             self.send_command(0x20)
             self.ReadBusy()
         
@@ -212,24 +184,21 @@ class EPD:
             self.send_command(0x12) # SWRESET (software reset)
             self.ReadBusy()
             
-            self.send_command(0x01) # DRIVER_OUTPUT_CONTROL
-            self.send_data(0xC7) # (EPD_HEIGHT - 1) & 0xFF
-            self.send_data(0x00) # ((EPD_HEIGHT - 1) >> 8) & 0xFF
-            self.send_data(0x01) # GD = 0 SM = 0 TB = 0
+            self.send_command_with_data(0x01, [ # DRIVER_OUTPUT_CONTROL
+                0xC7,  # (EPD_HEIGHT - 1) & 0xFF
+                0x00,  # ((EPD_HEIGHT - 1) >> 8) & 0xFF
+                0x01,  # GD = 0 SM = 0 TB = 0
+            ])
             
-            self.send_command(0x11) # data entry mode
-            self.send_data(0x01)
+            self.send_command_with_data(0x11, [0x01]) # data entry mode
                       
             self.SetWindows(0, self.height-1, self.width-1, 0) # Set Windows
     
-            self.send_command(0x3C) # BorderWavefrom
-            self.send_data(0x01)
+            self.send_command_with_data(0x3C, [0x01]) # BorderWavefrom
 
-            self.send_command(0x18)
-            self.send_data(0x80)
+            self.send_command_with_data(0x18, [0x80])
 
-            self.send_command(0x22) # #Load Temperature and waveform setting.
-            self.send_data(0XB1)
+            self.send_command_with_data(0x22, [0XB1]) # #Load Temperature and waveform setting.
             self.send_command(0x20)
 
             self.SetCursor(0, self.height-1) # Set Cursor
@@ -247,26 +216,7 @@ class EPD:
         self.TurnOnDisplay()
         
     def getbuffer(self, image):
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height)
 
     def display(self, image):
         if (image == None):
@@ -306,8 +256,7 @@ class EPD:
         self.TurnOnDisplayPart()
         
     def sleep(self):
-        self.send_command(0x10) # DEEP_SLEEP_MODE
-        self.send_data(0x01)
+        self.send_command_with_data(0x10, [0x01]) # DEEP_SLEEP_MODE
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -28,6 +28,7 @@
 #
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 152
@@ -65,10 +66,12 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
         
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      #  0: idle, 1: busy
-            epdconfig.delay_ms(200)                
+        epdconfig.wait_busy(self.busy_pin, 0)      #  0: busy, 1: idle
         logger.debug("e-Paper busy release")
      
     def init(self):
@@ -77,47 +80,22 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x06) # boost soft start
-        self.send_data(0x17)
-        self.send_data(0x17)
-        self.send_data(0x17)
+        self.send_command_with_data(0x06, [0x17, 0x17, 0x17]) # boost soft start
         self.send_command(0x04) # power on
         
         self.ReadBusy()
         
-        self.send_command(0x00) # panel setting
-        self.send_data(0x0f) # LUT from OTP,160x296
-        self.send_data(0x0d) # VCOM to 0V fast
+        self.send_command_with_data(0x00, [ # panel setting
+            0x0f,  # LUT from OTP,160x296
+            0x0d,  # VCOM to 0V fast
+        ])
         
-        self.send_command(0x61) # resolution setting
-        self.send_data(0x98)
-        self.send_data(0x00)
-        self.send_data(0x98)
+        self.send_command_with_data(0x61, [0x98, 0x00, 0x98]) # resolution setting
         
-        self.send_command(0x50)
-        self.send_data(0x77)
+        self.send_command_with_data(0x50, [0x77])
 
     def getbuffer(self, image):
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    #  Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height)
 
     def display(self, blackimage, yellowimage):
         self.send_command(0x10)
@@ -133,12 +111,8 @@ class EPD:
         self.ReadBusy()
         
     def Clear(self):
-        self.send_command(0x10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xFF)            
-        self.send_command(0x13)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xFF)
+        self.send_command_with_data(0x10, [0xFF] * int(self.width * self.height / 8))
+        self.send_command_with_data(0x13, [0xFF] * int(self.width * self.height / 8))
             
         self.send_command(0x12)
         self.ReadBusy()
@@ -147,8 +121,7 @@ class EPD:
     def sleep(self):
         self.send_command(0X02)  #  power off
         self.ReadBusy() 
-        self.send_command(0X07)  #  deep sleep
-        self.send_data(0xA5)
+        self.send_command_with_data(0X07, [0xA5])  #  deep sleep
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 import numpy as np
 
 # Display resolution
@@ -124,6 +125,9 @@ class EPD:
         epdconfig.digital_write(self.cs_pin, 0)
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
+
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
     
     '''
     function :Wait until the busy_pin goes LOW
@@ -131,8 +135,7 @@ class EPD:
     '''
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(10)  
+        epdconfig.wait_busy(self.busy_pin, 1)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
     '''
@@ -140,8 +143,7 @@ class EPD:
     parameter:
     '''
     def TurnOnDisplay(self):
-        self.send_command(0x22) # Display Update Control
-        self.send_data(0xC7)
+        self.send_command_with_data(0x22, [0xC7]) # Display Update Control
         self.send_command(0x20) # Activate Display Update Sequence
         self.ReadBusy()
     
@@ -150,8 +152,9 @@ class EPD:
     parameter:
     '''
     def TurnOnDisplayPart(self):
-        self.send_command(0x22) # Display Update Control
-        self.send_data(0x0f)    # fast:0x0c, quality:0x0f, 0xcf
+        self.send_command_with_data(0x22, [ # Display Update Control
+            0x0f,  # fast:0x0c, quality:0x0f, 0xcf
+        ])
         self.send_command(0x20) # Activate Display Update Sequence
         self.ReadBusy()
     
@@ -161,9 +164,7 @@ class EPD:
         lut : lut data
     '''    
     def Lut(self, lut):
-        self.send_command(0x32)
-        for i in range(0, 153):
-            self.send_data(lut[i])
+        self.send_command_with_data(0x32, lut[:153])
         self.ReadBusy()
     
     '''
@@ -173,16 +174,14 @@ class EPD:
     '''
     def SetLut(self, lut):
         self.Lut(lut)
-        self.send_command(0x3f)
-        self.send_data(lut[153])
-        self.send_command(0x03)     # gate voltage
-        self.send_data(lut[154])
-        self.send_command(0x04)     # source voltage
-        self.send_data(lut[155])    # VSH
-        self.send_data(lut[156])    # VSH2
-        self.send_data(lut[157])    # VSL
-        self.send_command(0x2c)     # VCOM
-        self.send_data(lut[158])
+        self.send_command_with_data(0x3f, [lut[153]])
+        self.send_command_with_data(0x03, [lut[154]])     # gate voltage
+        self.send_command_with_data(0x04, [     # source voltage
+            lut[155],  # VSH
+            lut[156],  # VSH2
+            lut[157],  # VSL
+        ])
+        self.send_command_with_data(0x2c, [lut[158]])     # VCOM
     
     '''
     function : Setting the display window
@@ -198,11 +197,7 @@ class EPD:
         self.send_data((x_start>>3) & 0xFF)
         self.send_data((x_end>>3) & 0xFF)
         
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(y_start & 0xFF)
-        self.send_data((y_start >> 8) & 0xFF)
-        self.send_data(y_end & 0xFF)
-        self.send_data((y_end >> 8) & 0xFF)
+        self.send_command_with_data(0x45, [y_start & 0xFF, (y_start >> 8) & 0xFF, y_end & 0xFF, (y_end >> 8) & 0xFF]) # SET_RAM_Y_ADDRESS_START_END_POSITION
 
     '''
     function : Set Cursor
@@ -215,9 +210,7 @@ class EPD:
         # x point must be the multiple of 8 or the last 3 bits will be ignored
         self.send_data(x & 0xFF)
         
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(y & 0xFF)
-        self.send_data((y >> 8) & 0xFF)
+        self.send_command_with_data(0x4F, [y & 0xFF, (y >> 8) & 0xFF]) # SET_RAM_Y_ADDRESS_COUNTER
     
     '''
     function : Initialize the e-Paper register
@@ -233,26 +226,18 @@ class EPD:
         self.send_command(0x12)  #SWRESET
         self.ReadBusy() 
 
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0xf9)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send_command_with_data(0x01, [0xf9, 0x00, 0x00]) #Driver output control
     
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
+        self.send_command_with_data(0x11, [0x03]) #data entry mode
 
         self.SetWindow(0, 0, self.width-1, self.height-1)
         self.SetCursor(0, 0)
         
-        self.send_command(0x3c)
-        self.send_data(0x05)
+        self.send_command_with_data(0x3c, [0x05])
 
-        self.send_command(0x21) #  Display update control
-        self.send_data(0x00)
-        self.send_data(0x80)
+        self.send_command_with_data(0x21, [0x00, 0x80]) #  Display update control
     
-        self.send_command(0x18)
-        self.send_data(0x80)
+        self.send_command_with_data(0x18, [0x80])
         
         self.ReadBusy()
         
@@ -265,20 +250,7 @@ class EPD:
         image : Image data
     '''
     def getbuffer(self, image):
-        img = image
-        imwidth, imheight = img.size
-        if(imwidth == self.width and imheight == self.height):
-            img = img.convert('1')
-        elif(imwidth == self.height and imheight == self.width):
-            # image has correct dimensions, but needs to be rotated
-            img = img.rotate(90, expand=True).convert('1')
-        else:
-            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
-            # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
-
-        buf = bytearray(img.tobytes('raw'))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height, fill=0x00)
         
     '''
     function : Sends the image buffer in RAM to e-Paper and displays
@@ -313,23 +285,11 @@ class EPD:
         epdconfig.digital_write(self.reset_pin, 1)  
         
         self.SetLut(self.lut_partial_update)
-        self.send_command(0x37)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x40)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)  
-        self.send_data(0x00)
+        self.send_command_with_data(0x37, [0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00])
 
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x80)
+        self.send_command_with_data(0x3C, [0x80]) #BorderWavefrom
 
-        self.send_command(0x22) 
-        self.send_data(0xC0)
+        self.send_command_with_data(0x22, [0xC0])
         self.send_command(0x20)
         self.ReadBusy()
 
@@ -387,8 +347,7 @@ class EPD:
     parameter:
     '''
     def sleep(self):
-        self.send_command(0x10) #enter deep sleep
-        self.send_data(0x01)
+        self.send_command_with_data(0x10, [0x01]) #enter deep sleep
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
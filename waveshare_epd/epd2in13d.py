@@ -30,8 +30,8 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 from PIL import Image
-import RPi.GPIO as GPIO
 
 # Display resolution
 EPD_WIDTH       = 104
@@ -171,11 +171,12 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
         
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            self.send_command(0x71)
-            epdconfig.delay_ms(100)  
+        epdconfig.wait_busy(self.busy_pin, 0, poke=lambda: self.send_command(0x71))      # 0: busy, 1: idle
         logger.debug("e-Paper busy release")
         
     def TurnOnDisplay(self):
@@ -189,117 +190,62 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x01)	# POWER SETTING
-        self.send_data(0x03)
-        self.send_data(0x00)
-        self.send_data(0x2b)
-        self.send_data(0x2b)
-        self.send_data(0x03)
+        self.send_command_with_data(0x01, [0x03, 0x00, 0x2b, 0x2b, 0x03])	# POWER SETTING
 
-        self.send_command(0x06)	# boost soft start
-        self.send_data(0x17) # A
-        self.send_data(0x17) # B
-        self.send_data(0x17) # C
+        self.send_command_with_data(0x06, [	# boost soft start
+            0x17,  # A
+            0x17,  # B
+            0x17,  # C
+        ])
 
         self.send_command(0x04)
         self.ReadBusy()
 
-        self.send_command(0x00)	# panel setting
-        self.send_data(0xbf) # LUT from OTP,128x296
-        self.send_data(0x0d) # VCOM to 0V fast
+        self.send_command_with_data(0x00, [	# panel setting
+            0xbf,  # LUT from OTP,128x296
+            0x0d,  # VCOM to 0V fast
+        ])
 
-        self.send_command(0x30)	# PLL setting
-        self.send_data(0x3a) # 3a 100HZ   29 150Hz 39 200HZ	31 171HZ
+        self.send_command_with_data(0x30, [	# PLL setting
+            0x3a,  # 3a 100HZ   29 150Hz 39 200HZ	31 171HZ
+        ])
 
-        self.send_command(0x61)	# resolution setting
-        self.send_data(self.width)
-        self.send_data((self.height >> 8) & 0xff)
-        self.send_data(self.height& 0xff)
+        self.send_command_with_data(0x61, [self.width, (self.height >> 8) & 0xff, self.height& 0xff])	# resolution setting
 
-        self.send_command(0x82)	# vcom_DC setting
-        self.send_data(0x28)
+        self.send_command_with_data(0x82, [0x28])	# vcom_DC setting
         return 0
         
     def SetFullReg(self):
-        self.send_command(0x82)
-        self.send_data(0x00)
-        self.send_command(0X50)
-        self.send_data(0x97)
+        self.send_command_with_data(0x82, [0x00])
+        self.send_command_with_data(0X50, [0x97])
         
-        self.send_command(0x20) # vcom
-        for count in range(0, 44):
-            self.send_data(self.lut_vcomDC[count])
-        self.send_command(0x21) # ww --
-        for count in range(0, 42):
-            self.send_data(self.lut_ww[count])
-        self.send_command(0x22) # bw r
-        for count in range(0, 42):
-            self.send_data(self.lut_bw[count])
-        self.send_command(0x23) # wb w
-        for count in range(0, 42):
-            self.send_data(self.lut_wb[count])
-        self.send_command(0x24) # bb b
-        for count in range(0, 42):
-            self.send_data(self.lut_bb[count])
+        self.send_command_with_data(0x20, self.lut_vcomDC[:44]) # vcom
+        self.send_command_with_data(0x21, self.lut_ww[:42]) # ww --
+        self.send_command_with_data(0x22, self.lut_bw[:42]) # bw r
+        self.send_command_with_data(0x23, self.lut_wb[:42]) # wb w
+        self.send_command_with_data(0x24, self.lut_bb[:42]) # bb b
     
     def SetPartReg(self):
-        self.send_command(0x82)
-        self.send_data(0x03)
-        self.send_command(0X50)
-        self.send_data(0x47)
+        self.send_command_with_data(0x82, [0x03])
+        self.send_command_with_data(0X50, [0x47])
         
-        self.send_command(0x20) # vcom
-        for count in range(0, 44):
-            self.send_data(self.lut_vcom1[count])
-        self.send_command(0x21) # ww --
-        for count in range(0, 42):
-            self.send_data(self.lut_ww1[count])
-        self.send_command(0x22) # bw r
-        for count in range(0, 42):
-            self.send_data(self.lut_bw1[count])
-        self.send_command(0x23) # wb w
-        for count in range(0, 42):
-            self.send_data(self.lut_wb1[count])
-        self.send_command(0x24) # bb b
-        for count in range(0, 42):
-            self.send_data(self.lut_bb1[count])
+        self.send_command_with_data(0x20, self.lut_vcom1[:44]) # vcom
+        self.send_command_with_data(0x21, self.lut_ww1[:42]) # ww --
+        self.send_command_with_data(0x22, self.lut_bw1[:42]) # bw r
+        self.send_command_with_data(0x23, self.lut_wb1[:42]) # wb w
+        self.send_command_with_data(0x24, self.lut_bb1[:42]) # bb b
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height)
 
     def display(self, image):
         if (Image == None):
             return
             
-        self.send_command(0x10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0x00)
+        self.send_command_with_data(0x10, [0x00] * int(self.width * self.height / 8))
         epdconfig.delay_ms(10)
         
-        self.send_command(0x13)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(image[i])
+        self.send_command_with_data(0x13, image[:int(self.width * self.height / 8)])
         epdconfig.delay_ms(10)
         
         self.SetFullReg()
@@ -310,9 +256,7 @@ class EPD:
             return
             
         self.send_command(0x91)
-        self.send_command(0x90)
-        self.send_data(0)
-        self.send_data(self.width - 1)
+        self.send_command_with_data(0x90, [0, self.width - 1])
 
         self.send_data(0)
         self.send_data(0)
@@ -320,9 +264,7 @@ class EPD:
         self.send_data(self.height % 256 - 1)
         self.send_data(0x28)
             
-        self.send_command(0x10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(image[i])
+        self.send_command_with_data(0x10, image[:int(self.width * self.height / 8)])
         epdconfig.delay_ms(10)
         
         self.send_command(0x13)
@@ -334,25 +276,19 @@ class EPD:
         self.TurnOnDisplay()
         
     def Clear(self, color):
-        self.send_command(0x10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0x00)
+        self.send_command_with_data(0x10, [0x00] * int(self.width * self.height / 8))
         epdconfig.delay_ms(10)
         
-        self.send_command(0x13)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xFF)
+        self.send_command_with_data(0x13, [0xFF] * int(self.width * self.height / 8))
         epdconfig.delay_ms(10)
         
         self.SetFullReg()
         self.TurnOnDisplay()
 
     def sleep(self):
-        self.send_command(0X50)
-        self.send_data(0xf7)
+        self.send_command_with_data(0X50, [0xf7])
         self.send_command(0X02) # power off
-        self.send_command(0X07) # deep sleep  
-        self.send_data(0xA5)
+        self.send_command_with_data(0X07, [0xA5]) # deep sleep
 
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 152
@@ -88,11 +89,12 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
 
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(200) 
+        epdconfig.wait_busy(self.busy_pin, 1)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release") 
 
 
@@ -106,40 +108,20 @@ class EPD:
         epdconfig.delay_ms(300)
         self.ReadBusy()
 
-        self.send_command(0x11) # setting gaet number
-        self.send_data(0x03)
-        self.send_command(0x44) # set gate voltage
-        self.send_data(0x01)
-        self.send_data(0x13)
-        self.send_command(0x45) # set source voltage
-        self.send_data(0x0)
-        self.send_data(0x0)
-        self.send_data(0x28)
-        self.send_data(0x01)
+        self.send_command_with_data(0x11, [0x03]) # setting gaet number
+        self.send_command_with_data(0x44, [0x01, 0x13]) # set gate voltage
+        self.send_command_with_data(0x45, [0x0, 0x0, 0x28, 0x01]) # set source voltage
     
         if(mode == 0):      #full
-            self.send_command(0x3C)
-            self.send_data(0x01)
+            self.send_command_with_data(0x3C, [0x01])
             
         elif(mode == 1):        #partial
             self.load_lut(self.WF_PARTIAL)
-            self.send_command(0x37) # set display option, these setting turn on previous function
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)  
-            self.send_data(0x40)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)  
-
-            self.send_command(0x3C)
-            self.send_data(0x80)
-
-            self.send_command(0x22)
-            self.send_data(0xcf)
+            self.send_command_with_data(0x37, [0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00]) # set display option, these setting turn on previous function
+
+            self.send_command_with_data(0x3C, [0x80])
+
+            self.send_command_with_data(0x22, [0xcf])
             
             self.send_command(0x20)
             self.ReadBusy()
@@ -151,9 +133,7 @@ class EPD:
 
 
     def load_lut(self, lut):
-        self.send_command(0x32)
-        for i in range(0, 153):
-            self.send_data(lut[i])
+        self.send_command_with_data(0x32, lut[:153])
 
 
     def turnon_display(self):
@@ -161,39 +141,15 @@ class EPD:
         self.ReadBusy()
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height)
 
 
     def display(self, image):
         if (image == None):
             return            
 
-        self.send_command(0x4E)
-        self.send_data(0x01)
-        self.send_command(0x4F)
-        self.send_data(0x27)
-        self.send_data(0x01)
+        self.send_command_with_data(0x4E, [0x01])
+        self.send_command_with_data(0x4F, [0x27, 0x01])
 
         self.send_command(0x24)
         for j in range(0, self.height):
@@ -204,11 +160,8 @@ class EPD:
         
 
     def Clear(self):
-        self.send_command(0x4E)
-        self.send_data(0x01)
-        self.send_command(0x4F)
-        self.send_data(0x27)
-        self.send_data(0x01)
+        self.send_command_with_data(0x4E, [0x01])
+        self.send_command_with_data(0x4F, [0x27, 0x01])
 
         self.send_command(0x24)
         for j in range(0, self.height):
@@ -224,8 +177,7 @@ class EPD:
 
 
     def sleep(self):
-        self.send_command(0X10) # DEEP_SLEEP_MODE
-        self.send_data(0x01)
+        self.send_command_with_data(0X10, [0x01]) # DEEP_SLEEP_MODE
 
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
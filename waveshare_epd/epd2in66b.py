@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 152
@@ -68,11 +69,12 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
 
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(20) 
+        epdconfig.wait_busy(self.busy_pin, 1)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release") 
 
 
@@ -86,14 +88,11 @@ class EPD:
         epdconfig.delay_ms(30)
         self.ReadBusy()
 
-        self.send_command(0x11) # setting gaet number
-        self.send_data(0x03)
+        self.send_command_with_data(0x11, [0x03]) # setting gaet number
         
         self.setWindows(0, 0, self.width-1, self.height-1)
         
-        self.send_command(0x21)
-        self.send_data(0x00)
-        self.send_data(0x80)
+        self.send_command_with_data(0x21, [0x00, 0x80])
         
         self.setCursor(0, 0)
         self.ReadBusy()
@@ -101,51 +100,21 @@ class EPD:
         return 0
 
     def setWindows(self, Xstart, Ystart, Xend, Yend):
-        self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
-        self.send_data((Xstart>>3) & 0x1F)
-        self.send_data((Xend>>3) & 0x1F)
+        self.send_command_with_data(0x44, [(Xstart>>3) & 0x1F, (Xend>>3) & 0x1F]) # SET_RAM_X_ADDRESS_START_END_POSITION
         
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(Ystart & 0xFF)
-        self.send_data((Ystart >> 8) & 0x01)
-        self.send_data(Yend & 0xFF)
-        self.send_data((Yend >> 8) & 0x01)
+        self.send_command_with_data(0x45, [Ystart & 0xFF, (Ystart >> 8) & 0x01, Yend & 0xFF, (Yend >> 8) & 0x01]) # SET_RAM_Y_ADDRESS_START_END_POSITION
 
     def setCursor(self, Xstart, Ystart):
-        self.send_command(0x4E) # SET_RAM_X_ADDRESS_COUNTER
-        self.send_data(Xstart & 0x1F)
+        self.send_command_with_data(0x4E, [Xstart & 0x1F]) # SET_RAM_X_ADDRESS_COUNTER
 
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(Ystart & 0xFF)
-        self.send_data((Ystart >> 8) & 0x01)
+        self.send_command_with_data(0x4F, [Ystart & 0xFF, (Ystart >> 8) & 0x01]) # SET_RAM_Y_ADDRESS_COUNTER
         
     def turnon_display(self):
         self.send_command(0x20)
         self.ReadBusy()
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height)
 
     def display(self, Blackimage, Redimage):
         if (Blackimage == None or Redimage == None):
@@ -178,8 +147,7 @@ class EPD:
 
 
     def sleep(self):
-        self.send_command(0X10) # DEEP_SLEEP_MODE
-        self.send_data(0x01)
+        self.send_command_with_data(0X10, [0x01]) # DEEP_SLEEP_MODE
 
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
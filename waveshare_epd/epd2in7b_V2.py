@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 176
@@ -69,32 +70,25 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
         
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     # Read Busy
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(10)
+        epdconfig.wait_busy(self.busy_pin, 1)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
             
     # Setting the display window
     def SetWindows(self, Xstart, Ystart, Xend, Yend):
-        self.send_command(0x44)
-        self.send_data((Xstart >> 3) & 0xff)
-        self.send_data((Xend >> 3) & 0xff)
+        self.send_command_with_data(0x44, [(Xstart >> 3) & 0xff, (Xend >> 3) & 0xff])
         
-        self.send_command(0x45)
-        self.send_data(Ystart & 0xff)
-        self.send_data((Ystart >> 8) & 0xff)
-        self.send_data(Yend & 0xff)
-        self.send_data((Yend >> 8) & 0xff)
+        self.send_command_with_data(0x45, [Ystart & 0xff, (Ystart >> 8) & 0xff, Yend & 0xff, (Yend >> 8) & 0xff])
     
     # Set Cursor
     def SetCursor(self, Xstart, Ystart):
-        self.send_command(0x4E)
-        self.send_data(Xstart & 0xff)
-        self.send_command(0x4F)
-        self.send_data(Ystart & 0xff)
-        self.send_data((Ystart >> 8) & 0xff)
+        self.send_command_with_data(0x4E, [Xstart & 0xff])
+        self.send_command_with_data(0x4F, [Ystart & 0xff, (Ystart >> 8) & 0xff])
         
     # Initialize the e-Paper register
     def init(self):
@@ -107,50 +101,23 @@ class EPD:
         self.send_command(0x12)      
         self.ReadBusy() 
         
-        self.send_command(0x00)     
-        self.send_data(0x27) 
-        self.send_data(0x01) 
-        self.send_data(0x00) 
+        self.send_command_with_data(0x00, [0x27, 0x01, 0x00])
         
-        self.send_command(0x11)     
-        self.send_data(0x03) 
+        self.send_command_with_data(0x11, [0x03])
         
         self.SetWindows(0, 0, self.width-1, self.height-1)
         self.SetCursor(0, 0)
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height)
     
     # Sends the image buffer in RAM to e-Paper and displays
     def display(self, imageblack, imagered):
         Width = self.width / 8 
         Height = self.height 
 
-        self.send_command(0x24) 
-        for i in range(0, int(Width * Height)):
-            self.send_data(imageblack[i]) 
+        self.send_command_with_data(0x24, imageblack[:int(Width * Height)])
 
         self.send_command(0x26) 
         for i in range(0, int(Width * Height)):
@@ -160,13 +127,9 @@ class EPD:
 
     # Clear the screen
     def Clear(self):
-        self.send_command(0x24)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xff)
+        self.send_command_with_data(0x24, [0xff] * int(self.width * self.height / 8))
 
-        self.send_command(0x26)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0x00)
+        self.send_command_with_data(0x26, [0x00] * int(self.width * self.height / 8))
             
         self.TurnOnDisplay()
         
@@ -177,8 +140,7 @@ class EPD:
 
     # Enter sleep mode
     def sleep(self):
-        self.send_command(0x10)
-        self.send_data(0x01)
+        self.send_command_with_data(0x10, [0x01])
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 128
@@ -67,12 +68,12 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
         
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        self.send_command(0X71)
-        while(epdconfig.digital_read(self.busy_pin) == 0):      #  0: idle, 1: busy
-            self.send_command(0X71)
-            epdconfig.delay_ms(200)                
+        epdconfig.wait_busy(self.busy_pin, 0, poke=lambda: self.send_command(0x71))      #  0: busy, 1: idle
         logger.debug("e-Paper busy release")
         
     def init(self):
@@ -84,66 +85,36 @@ class EPD:
         self.send_command(0x04)  
         self.ReadBusy()#waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0x00)    #panel setting
-        self.send_data(0x0f)   #LUT from OTP,128x296
-        self.send_data(0x89)    #Temperature sensor, boost and other related timing settings
+        self.send_command_with_data(0x00, [    #panel setting
+            0x0f,  #LUT from OTP,128x296
+            0x89,  #Temperature sensor, boost and other related timing settings
+        ])
 
-        self.send_command(0x61)    #resolution setting
-        self.send_data (0x80)  
-        self.send_data (0x01)  
-        self.send_data (0x28)
+        self.send_command_with_data(0x61, [0x80, 0x01, 0x28])    #resolution setting
 
-        self.send_command(0X50)    #VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x77)   #WBmode:VBDF 17|D7 VBDW 97 VBDB 57
+        self.send_command_with_data(0X50, [    #VCOM AND DATA INTERVAL SETTING
+            0x77,  #WBmode:VBDF 17|D7 VBDW 97 VBDB 57
+        ])
                             # WBRmode:VBDF F7 VBDW 77 VBDB 37  VBDR B7
         
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height)
 
     def display(self, blackimage, ryimage): # ryimage: red or yellow image
         if (blackimage != None):
-            self.send_command(0X10)
-            for i in range(0, int(self.width * self.height / 8)):
-                self.send_data(blackimage[i])        
+            self.send_command_with_data(0X10, blackimage[:int(self.width * self.height / 8)])
         if (ryimage != None):
-            self.send_command(0X13)
-            for i in range(0, int(self.width * self.height / 8)):
-                self.send_data(ryimage[i])
+            self.send_command_with_data(0X13, ryimage[:int(self.width * self.height / 8)])
 
         self.send_command(0x12)
         epdconfig.delay_ms(200) 
         self.ReadBusy()
         
     def Clear(self):
-        self.send_command(0X10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xff)
-        self.send_command(0X13)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xff)
+        self.send_command_with_data(0X10, [0xff] * int(self.width * self.height / 8))
+        self.send_command_with_data(0X13, [0xff] * int(self.width * self.height / 8))
 
         self.send_command(0x12)
         epdconfig.delay_ms(200) 
@@ -152,8 +123,7 @@ class EPD:
     def sleep(self):
         self.send_command(0X02) # power off
         self.ReadBusy()
-        self.send_command(0X07) # deep sleep
-        self.send_data(0xA5)
+        self.send_command_with_data(0X07, [0xA5]) # deep sleep
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
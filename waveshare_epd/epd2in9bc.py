@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 128
@@ -67,10 +68,12 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
         
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      #  0: idle, 1: busy
-            epdconfig.delay_ms(200)                
+        epdconfig.wait_busy(self.busy_pin, 0)      #  0: busy, 1: idle
         logger.debug("e-Paper busy release")
         
     def init(self):
@@ -79,69 +82,32 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x06) # boost
-        self.send_data (0x17)
-        self.send_data (0x17)
-        self.send_data (0x17)
+        self.send_command_with_data(0x06, [0x17, 0x17, 0x17]) # boost
         self.send_command(0x04) # POWER_ON
         self.ReadBusy()
-        self.send_command(0X00) # PANEL_SETTING
-        self.send_data(0x8F)
-        self.send_command(0X50) # VCOM_AND_DATA_INTERVAL_SETTING
-        self.send_data(0x77)
-        self.send_command(0x61) # TCON_RESOLUTION
-        self.send_data (0x80)
-        self.send_data (0x01)
-        self.send_data (0x28)
+        self.send_command_with_data(0X00, [0x8F]) # PANEL_SETTING
+        self.send_command_with_data(0X50, [0x77]) # VCOM_AND_DATA_INTERVAL_SETTING
+        self.send_command_with_data(0x61, [0x80, 0x01, 0x28]) # TCON_RESOLUTION
         # self.send_command(VCM_DC_SETTING_REGISTER)
         # self.send_data (0x0A)
         
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height)
 
     def display(self, blackimage, ryimage): # ryimage: red or yellow image
         if (blackimage != None):
-            self.send_command(0X10)
-            for i in range(0, int(self.width * self.height / 8)):
-                self.send_data(blackimage[i])        
+            self.send_command_with_data(0X10, blackimage[:int(self.width * self.height / 8)])
         if (ryimage != None):
-            self.send_command(0X13)
-            for i in range(0, int(self.width * self.height / 8)):
-                self.send_data(ryimage[i])
+            self.send_command_with_data(0X13, ryimage[:int(self.width * self.height / 8)])
 
         self.send_command(0x12)
         self.ReadBusy()
         
     def Clear(self):
-        self.send_command(0X10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xff)
-        self.send_command(0X13)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xff)
+        self.send_command_with_data(0X10, [0xff] * int(self.width * self.height / 8))
+        self.send_command_with_data(0X13, [0xff] * int(self.width * self.height / 8))
 
         self.send_command(0x12)
         self.ReadBusy()
@@ -149,8 +115,7 @@ class EPD:
     def sleep(self):
         self.send_command(0X02) # power off
         self.ReadBusy()
-        self.send_command(0X07) # deep sleep
-        self.send_data(0xA5)
+        self.send_command_with_data(0X07, [0xA5]) # deep sleep
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -32,8 +32,8 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 from PIL import Image
-import RPi.GPIO as GPIO
 
 # Display resolution
 EPD_WIDTH       = 128
@@ -130,11 +130,12 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
         
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            self.send_command(0x71)
-            epdconfig.delay_ms(10)  
+        epdconfig.wait_busy(self.busy_pin, 0, poke=lambda: self.send_command(0x71))      # 0: busy, 1: idle
         logger.debug("e-Paper busy release")
         
     def TurnOnDisplay(self):
@@ -151,102 +152,59 @@ class EPD:
         self.send_command(0x04)
         self.ReadBusy() #waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0x00)     #panel setting
-        self.send_data(0x1f)        # LUT from OTP，KW-BF   KWR-AF    BWROTP 0f   BWOTP 1f
+        self.send_command_with_data(0x00, [     #panel setting
+            0x1f,  # LUT from OTP，KW-BF   KWR-AF    BWROTP 0f   BWOTP 1f
+        ])
 
-        self.send_command(0x61)     #resolution setting
-        self.send_data (0x80)       
-        self.send_data (0x01)   
-        self.send_data (0x28)   
+        self.send_command_with_data(0x61, [0x80, 0x01, 0x28])     #resolution setting
 
-        self.send_command(0X50) #VCOM AND DATA INTERVAL SETTING     
-        self.send_data(0x97)        #WBmode:VBDF 17|D7 VBDW 97 VBDB 57  WBRmode:VBDF F7 VBDW 77 VBDB 37  VBDR B7
+        self.send_command_with_data(0X50, [ #VCOM AND DATA INTERVAL SETTING
+            0x97,  #WBmode:VBDF 17|D7 VBDW 97 VBDB 57  WBRmode:VBDF F7 VBDW 77 VBDB 37  VBDR B7
+        ])
 
         return 0
     
     def SetPartReg(self):
 
-        self.send_command(0x01) #POWER SETTING
-        self.send_data(0x03)
-        self.send_data(0x00)
-        self.send_data(0x2b)
-        self.send_data(0x2b)
-        self.send_data(0x03)
+        self.send_command_with_data(0x01, [0x03, 0x00, 0x2b, 0x2b, 0x03]) #POWER SETTING
 
-        self.send_command(0x06) #boost soft start
-        self.send_data(0x17)     #A
-        self.send_data(0x17)     #B
-        self.send_data(0x17)     #C
+        self.send_command_with_data(0x06, [ #boost soft start
+            0x17,  #A
+            0x17,  #B
+            0x17,  #C
+        ])
 
         self.send_command(0x04)
         self.ReadBusy()
 
-        self.send_command(0x00) #panel setting
-        self.send_data(0xbf)     #LUT from OTP，128x296
+        self.send_command_with_data(0x00, [ #panel setting
+            0xbf,  #LUT from OTP，128x296
+        ])
 
-        self.send_command(0x30) #PLL setting
-        self.send_data(0x3a)     # 3a 100HZ   29 150Hz 39 200HZ 31 171HZ
+        self.send_command_with_data(0x30, [ #PLL setting
+            0x3a,  # 3a 100HZ   29 150Hz 39 200HZ 31 171HZ
+        ])
 
-        self.send_command(0x61) #resolution setting
-        self.send_data(self.width)
-        self.send_data((self.height >> 8) & 0xff)
-        self.send_data(self.height & 0xff)
+        self.send_command_with_data(0x61, [self.width, (self.height >> 8) & 0xff, self.height & 0xff]) #resolution setting
 
-        self.send_command(0x82) #vcom_DC setting
-        self.send_data(0x12)
+        self.send_command_with_data(0x82, [0x12]) #vcom_DC setting
 
-        self.send_command(0X50)
-        self.send_data(0x97)
+        self.send_command_with_data(0X50, [0x97])
         
-        self.send_command(0x20)         # vcom
-        for count in range(0, 44):
-            self.send_data(self.lut_vcom1[count])
-        self.send_command(0x21)         # ww --
-        for count in range(0, 42):
-            self.send_data(self.lut_ww1[count])
-        self.send_command(0x22)         # bw r
-        for count in range(0, 42):
-            self.send_data(self.lut_bw1[count])
-        self.send_command(0x23)         # wb w
-        for count in range(0, 42):
-            self.send_data(self.lut_wb1[count])
-        self.send_command(0x24)         # bb b
-        for count in range(0, 42):
-            self.send_data(self.lut_bb1[count])
+        self.send_command_with_data(0x20, self.lut_vcom1[:44])         # vcom
+        self.send_command_with_data(0x21, self.lut_ww1[:42])         # ww --
+        self.send_command_with_data(0x22, self.lut_bw1[:42])         # bw r
+        self.send_command_with_data(0x23, self.lut_wb1[:42])         # wb w
+        self.send_command_with_data(0x24, self.lut_bb1[:42])         # bb b
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height)
 
     def display(self, image):
-        self.send_command(0x10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0x00)
+        self.send_command_with_data(0x10, [0x00] * int(self.width * self.height / 8))
         epdconfig.delay_ms(10)
         
-        self.send_command(0x13)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(image[i])
+        self.send_command_with_data(0x13, image[:int(self.width * self.height / 8)])
         epdconfig.delay_ms(10)
         
         self.TurnOnDisplay()
@@ -254,9 +212,7 @@ class EPD:
     def DisplayPartial(self, image):
         self.SetPartReg()
         self.send_command(0x91)
-        self.send_command(0x90)
-        self.send_data(0)
-        self.send_data(self.width - 1)
+        self.send_command_with_data(0x90, [0, self.width - 1])
 
         self.send_data(0)
         self.send_data(0)
@@ -264,9 +220,7 @@ class EPD:
         self.send_data(self.height % 256 - 1)
         self.send_data(0x28)
             
-        self.send_command(0x10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(image[i])
+        self.send_command_with_data(0x10, image[:int(self.width * self.height / 8)])
         epdconfig.delay_ms(10)
         
         self.send_command(0x13)
@@ -277,24 +231,18 @@ class EPD:
         self.TurnOnDisplay()
         
     def Clear(self, color):
-        self.send_command(0x10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0x00)
+        self.send_command_with_data(0x10, [0x00] * int(self.width * self.height / 8))
         epdconfig.delay_ms(10)
         
-        self.send_command(0x13)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xFF)
+        self.send_command_with_data(0x13, [0xFF] * int(self.width * self.height / 8))
         epdconfig.delay_ms(10)
         
         self.TurnOnDisplay()
 
     def sleep(self):
-        self.send_command(0X50)
-        self.send_data(0xf7)
+        self.send_command_with_data(0X50, [0xf7])
         self.send_command(0X02)         #power off
-        self.send_command(0X07)         #deep sleep  
-        self.send_data(0xA5)
+        self.send_command_with_data(0X07, [0xA5])         #deep sleep
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
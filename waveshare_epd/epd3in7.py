@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 280
@@ -133,11 +134,12 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
 
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(10) 
+        epdconfig.wait_busy(self.busy_pin, 1)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release") 
 
 
@@ -150,167 +152,71 @@ class EPD:
         self.send_command(0x12)
         epdconfig.delay_ms(300)
         
-        self.send_command(0x46)
-        self.send_data(0xF7)
+        self.send_command_with_data(0x46, [0xF7])
         self.ReadBusy()
-        self.send_command(0x47)
-        self.send_data(0xF7)
+        self.send_command_with_data(0x47, [0xF7])
         self.ReadBusy()
         
-        self.send_command(0x01) # setting gaet number
-        self.send_data(0xDF)
-        self.send_data(0x01)
-        self.send_data(0x00)
+        self.send_command_with_data(0x01, [0xDF, 0x01, 0x00]) # setting gaet number
 
-        self.send_command(0x03) # set gate voltage
-        self.send_data(0x00)
+        self.send_command_with_data(0x03, [0x00]) # set gate voltage
 
-        self.send_command(0x04) # set source voltage
-        self.send_data(0x41)
-        self.send_data(0xA8)
-        self.send_data(0x32)
+        self.send_command_with_data(0x04, [0x41, 0xA8, 0x32]) # set source voltage
 
-        self.send_command(0x11) # set data entry sequence
-        self.send_data(0x03)
+        self.send_command_with_data(0x11, [0x03]) # set data entry sequence
 
-        self.send_command(0x3C) # set border 
-        self.send_data(0x03)
+        self.send_command_with_data(0x3C, [0x03]) # set border
         
-        self.send_command(0x0C) # set booster strength
-        self.send_data(0xAE)
-        self.send_data(0xC7)
-        self.send_data(0xC3)
-        self.send_data(0xC0)
-        self.send_data(0xC0)
-
-        self.send_command(0x18) # set internal sensor on
-        self.send_data(0x80)
+        self.send_command_with_data(0x0C, [0xAE, 0xC7, 0xC3, 0xC0, 0xC0]) # set booster strength
+
+        self.send_command_with_data(0x18, [0x80]) # set internal sensor on
          
-        self.send_command(0x2C) # set vcom value
-        self.send_data(0x44)
+        self.send_command_with_data(0x2C, [0x44]) # set vcom value
         
         if(mode == 0):   #4Gray
-            self.send_command(0x37) # set display option, these setting turn on previous function
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)  
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)  
+            self.send_command_with_data(0x37, [0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00]) # set display option, these setting turn on previous function
         elif(mode == 1):      #1Gray
-            self.send_command(0x37) # set display option, these setting turn on previous function
-            self.send_data(0x00)     #can switch 1 gray or 4 gray
-            self.send_data(0xFF)
-            self.send_data(0xFF)
-            self.send_data(0xFF)
-            self.send_data(0xFF)  
-            self.send_data(0x4F)
-            self.send_data(0xFF)
-            self.send_data(0xFF)
-            self.send_data(0xFF)
-            self.send_data(0xFF)
+            self.send_command_with_data(0x37, [ # set display option, these setting turn on previous function
+                0x00,  #can switch 1 gray or 4 gray
+                0xFF,
+                0xFF,
+                0xFF,
+                0xFF,
+                0x4F,
+                0xFF,
+                0xFF,
+                0xFF,
+                0xFF,
+            ])
         else:
             logger.debug("There is no such mode") 
 
-        self.send_command(0x44) # setting X direction start/end position of RAM
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x17)
-        self.send_data(0x01)
+        self.send_command_with_data(0x44, [0x00, 0x00, 0x17, 0x01]) # setting X direction start/end position of RAM
 
-        self.send_command(0x45) # setting Y direction start/end position of RAM
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0xDF)
-        self.send_data(0x01)
+        self.send_command_with_data(0x45, [0x00, 0x00, 0xDF, 0x01]) # setting Y direction start/end position of RAM
 
-        self.send_command(0x22) # Display Update Control 2
-        self.send_data(0xCF)
+        self.send_command_with_data(0x22, [0xCF]) # Display Update Control 2
         return 0
 
 
     def load_lut(self, lut):
-        self.send_command(0x32)
-        for i in range(0, 105):
-            self.send_data(lut[i])
+        self.send_command_with_data(0x32, lut[:105])
 
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height)
 
 
     def getbuffer_4Gray(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i=0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i = i + 1
-                    if(i%4 == 0):
-                        buf[int((x + (y * self.width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
-                        
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = imwidth - x - 1
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i = i + 1
-                    if(i%4 == 0):
-                        buf[int((newx + (newy * self.width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6) 
-        return buf
+        return epdbuffer.pack_4gray(image, self.width, self.height)
 
 
     def display_4Gray(self, image):
         if (image == None):
             return            
 
-        self.send_command(0x4E)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_command(0x4F)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send_command_with_data(0x4E, [0x00, 0x00])
+        self.send_command_with_data(0x4F, [0x00, 0x00])
 
         self.send_command(0x24)
         for i in range(0, (int)(self.height*(self.width/8))):
@@ -343,12 +249,8 @@ class EPD:
                     temp1 <<= 2
             self.send_data(temp3)
 
-        self.send_command(0x4E)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_command(0x4F)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send_command_with_data(0x4E, [0x00, 0x00])
+        self.send_command_with_data(0x4F, [0x00, 0x00])
 
         self.send_command(0x26)
         for i in range(0, (int)(self.height*(self.width/8))):
@@ -382,8 +284,7 @@ class EPD:
             self.send_data(temp3)
 
         self.load_lut(self.lut_4Gray_GC)
-        self.send_command(0x22)
-        self.send_data(0xC7)
+        self.send_command_with_data(0x22, [0xC7])
         self.send_command(0x20)
         self.ReadBusy()   
 
@@ -392,12 +293,8 @@ class EPD:
         if (image == None):
             return            
 
-        self.send_command(0x4E)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_command(0x4F)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send_command_with_data(0x4E, [0x00, 0x00])
+        self.send_command_with_data(0x4F, [0x00, 0x00])
 
         self.send_command(0x24)
         for j in range(0, self.height):
@@ -410,12 +307,8 @@ class EPD:
         
 
     def Clear(self, color, mode):
-        self.send_command(0x4E)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_command(0x4F)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send_command_with_data(0x4E, [0x00, 0x00])
+        self.send_command_with_data(0x4F, [0x00, 0x00])
 
         self.send_command(0x24)
         for j in range(0, self.height):
@@ -428,8 +321,7 @@ class EPD:
                 for i in range(0, int(self.width / 8)):
                     self.send_data(0xff) 
             self.load_lut(self.lut_4Gray_GC)
-            self.send_command(0x22)
-            self.send_data(0xC7)
+            self.send_command_with_data(0x22, [0xC7])
         elif(mode == 1):            #1Gray
             self.load_lut(self.lut_1Gray_DU)
         else:
@@ -440,11 +332,9 @@ class EPD:
 
 
     def sleep(self):
-        self.send_command(0X50) # DEEP_SLEEP_MODE
-        self.send_data(0xf7)
+        self.send_command_with_data(0X50, [0xf7]) # DEEP_SLEEP_MODE
         self.send_command(0X02) #power off
-        self.send_command(0X07) #deep sleep
-        self.send_data(0xA5)
+        self.send_command_with_data(0X07, [0xA5]) #deep sleep
 
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
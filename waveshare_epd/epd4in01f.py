@@ -31,6 +31,8 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
+import numpy as np
 
 # Display resolution
 EPD_WIDTH       = 640
@@ -39,6 +41,12 @@ EPD_HEIGHT      = 400
 logger = logging.getLogger(__name__)
 
 class EPD:
+    # RGB value of each panel color, indexed by its 4 bit code
+    PALETTE = [
+        (0, 0, 0), (255, 255, 255), (0, 255, 0), (0, 0, 255),
+        (255, 0, 0), (255, 255, 0), (255, 128, 0),
+    ]
+
     def __init__(self):
         self.reset_pin = epdconfig.RST_PIN
         self.dc_pin = epdconfig.DC_PIN
@@ -76,16 +84,17 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
         
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def ReadBusyHigh(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            epdconfig.delay_ms(10)
+        epdconfig.wait_busy(self.busy_pin, 0)      # 0: busy, 1: idle
         logger.debug("e-Paper busy release")
         
     def ReadBusyLow(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(10)    
+        epdconfig.wait_busy(self.busy_pin, 1)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
         
     def init(self):
@@ -95,99 +104,31 @@ class EPD:
         self.reset()
         
         self.ReadBusyHigh()
-        self.send_command(0x00);
-        self.send_data(0x2f);
-        self.send_data(0x00);
-        self.send_command(0x01);
-        self.send_data(0x37);
-        self.send_data(0x00);
-        self.send_data(0x05);
-        self.send_data(0x05);
-        self.send_command(0x03);
-        self.send_data(0x00);
-        self.send_command(0x06);
-        self.send_data(0xC7);
-        self.send_data(0xC7);
-        self.send_data(0x1D);
-        self.send_command(0x41);
-        self.send_data(0x00);
-        self.send_command(0x50);
-        self.send_data(0x37);
-        self.send_command(0x60);
-        self.send_data(0x22);
-        self.send_command(0x61);
-        self.send_data(0x02);
-        self.send_data(0x80);
-        self.send_data(0x01);
-        self.send_data(0x90);
-        self.send_command(0xE3);
-        self.send_data(0xAA);
+        self.send_command_with_data(0x00, [0x2f, 0x00])
+        self.send_command_with_data(0x01, [0x37, 0x00, 0x05, 0x05])
+        self.send_command_with_data(0x03, [0x00])
+        self.send_command_with_data(0x06, [0xC7, 0xC7, 0x1D])
+        self.send_command_with_data(0x41, [0x00])
+        self.send_command_with_data(0x50, [0x37])
+        self.send_command_with_data(0x60, [0x22])
+        self.send_command_with_data(0x61, [0x02, 0x80, 0x01, 0x90])
+        self.send_command_with_data(0xE3, [0xAA])
         
         # EPD hardware init end
         return 0
 
     def getbuffer(self, image):
-        buf = [0x00] * int(self.width * self.height / 2)
-        image_monocolor = image.convert('RGB')#Picture mode conversion
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        logger.debug('imwidth = %d  imheight =  %d ',imwidth, imheight)
-        if(imwidth == self.width and imheight == self.height):
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    Add = int((x + y * self.width) / 2)
-                    Color = 0;
-                    if (pixels[x, y][0] == 0 and  pixels[x, y][1] == 0 and pixels[x, y][2] == 0):
-                        Color = 0
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 255 and pixels[x, y][2] == 255):
-                        Color = 1
-                    elif (pixels[x, y][0] == 0 and  pixels[x, y][1] == 255 and pixels[x, y][2] == 0):
-                        Color = 2
-                    elif (pixels[x, y][0] == 0 and  pixels[x, y][1] == 0 and pixels[x, y][2] == 255):
-                        Color = 3
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 0 and pixels[x, y][2] == 0):
-                        Color = 4
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 255 and pixels[x, y][2] == 0):
-                        Color = 5
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 128 and pixels[x, y][2] == 0):
-                        Color = 6
-                    
-                    data_t = buf[Add]&(~(0xF0 >> ((x % 2)*4)))
-                    buf[Add] = data_t | ((Color << 4) >> ((x % 2)*4));
-                        
-        elif(imwidth == self.height and imheight == self.width):
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1   
-                    Add = int((newx + newy*self.width) / 2)
-                    Color = 0;
-                    if (pixels[x, y][0] == 0 and  pixels[x, y][1] == 0 and pixels[x, y][2] == 0):
-                        Color = 0
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 255 and pixels[x, y][2] == 255):
-                        Color = 1
-                    elif (pixels[x, y][0] == 0 and  pixels[x, y][1] == 255 and pixels[x, y][2] == 0):
-                        Color = 2
-                    elif (pixels[x, y][0] == 0 and  pixels[x, y][1] == 0 and pixels[x, y][2] == 255):
-                        Color = 3
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 0 and pixels[x, y][2] == 0):
-                        Color = 4
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 255 and pixels[x, y][2] == 0):
-                        Color = 5
-                    elif (pixels[x, y][0] == 255 and  pixels[x, y][1] == 128 and pixels[x, y][2] == 0):
-                        Color = 6
-                    
-                    data_t = buf[Add]&(~(0xF0 >> ((newx % 2)*4)))
-                    buf[Add] = data_t | ((Color << 4) >> ((newx % 2)*4));
-        return buf
+        image_monocolor = epdbuffer.orient(image, self.width, self.height, 'RGB')#Picture mode conversion
+        if image_monocolor is None:
+            return epdbuffer.blank(self.width, self.height, 0x00, bpp=4)
+        pixels = np.asarray(image_monocolor)
+        colors = np.zeros(pixels.shape[:2], dtype=np.uint8)
+        for color, rgb in enumerate(self.PALETTE):
+            colors[np.all(pixels == rgb, axis=2)] = color
+        return epdbuffer.pack_levels(colors, 4)
 
     def display(self,image):
-        self.send_command(0x61)#Set Resolution setting
-        self.send_data(0x02)
-        self.send_data(0x80)
-        self.send_data(0x01)
-        self.send_data(0x90)
+        self.send_command_with_data(0x61, [0x02, 0x80, 0x01, 0x90])#Set Resolution setting
         self.send_command(0x10)
         for i in range(0, int(EPD_HEIGHT)):
             for j in range(0, int(EPD_WIDTH/2)):
@@ -201,11 +142,7 @@ class EPD:
         # epdconfig.delay_ms(500)
         
     def Clear(self):
-        self.send_command(0x61)#Set Resolution setting
-        self.send_data(0x02)
-        self.send_data(0x80)
-        self.send_data(0x01)
-        self.send_data(0x90)
+        self.send_command_with_data(0x61, [0x02, 0x80, 0x01, 0x90])#Set Resolution setting
         self.send_command(0x10)
         for i in range(0, int(EPD_HEIGHT)):
             for j in range(0, int(EPD_WIDTH/2)):
@@ -228,8 +165,7 @@ class EPD:
 
     def sleep(self):
         # epdconfig.delay_ms(500)
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send_command_with_data(0x07, [0XA5]) # DEEP_SLEEP
 
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()   
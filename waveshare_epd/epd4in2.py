@@ -30,8 +30,8 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 from PIL import Image
-import RPi.GPIO as GPIO
 
 # Display resolution
 EPD_WIDTH       = 400
@@ -242,81 +242,49 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
         
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def ReadBusy(self):
-        self.send_command(0x71)
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            self.send_command(0x71)
-            epdconfig.delay_ms(100)    
+        epdconfig.wait_busy(self.busy_pin, 0, poke=lambda: self.send_command(0x71))      # 0: busy, 1: idle
 
     def set_lut(self):
-        self.send_command(0x20)               # vcom
-        for count in range(0, 36):
-            self.send_data(self.lut_vcom0[count])
+        self.send_command_with_data(0x20, self.lut_vcom0[:36])               # vcom
             
-        self.send_command(0x21)         # ww --
-        for count in range(0, 36):
-            self.send_data(self.lut_ww[count])
+        self.send_command_with_data(0x21, self.lut_ww[:36])         # ww --
             
-        self.send_command(0x22)         # bw r
-        for count in range(0, 36):
-            self.send_data(self.lut_bw[count])
+        self.send_command_with_data(0x22, self.lut_bw[:36])         # bw r
             
-        self.send_command(0x23)         # wb w
-        for count in range(0, 36):
-            self.send_data(self.lut_bb[count])
+        self.send_command_with_data(0x23, self.lut_bb[:36])         # wb w
             
-        self.send_command(0x24)         # bb b
-        for count in range(0, 36):
-            self.send_data(self.lut_wb[count])
+        self.send_command_with_data(0x24, self.lut_wb[:36])         # bb b
 
 
     def Partial_SetLut(self):
-        self.send_command(0x20);
-        for count in range(0, 44):      
-            self.send_data(self.EPD_4IN2_Partial_lut_vcom1[count])
+        self.send_command_with_data(0x20, self.EPD_4IN2_Partial_lut_vcom1[:44])
 
-        self.send_command(0x21);
-        for count in range(0, 42):      
-            self.send_data(self.EPD_4IN2_Partial_lut_ww1[count])
+        self.send_command_with_data(0x21, self.EPD_4IN2_Partial_lut_ww1[:42])
         
-        self.send_command(0x22);
-        for count in range(0, 42):     
-            self.send_data(self.EPD_4IN2_Partial_lut_bw1[count])
+        self.send_command_with_data(0x22, self.EPD_4IN2_Partial_lut_bw1[:42])
 
-        self.send_command(0x23);
-        for count in range(0, 42):      
-            self.send_data(self.EPD_4IN2_Partial_lut_wb1[count])
+        self.send_command_with_data(0x23, self.EPD_4IN2_Partial_lut_wb1[:42])
 
-        self.send_command(0x24);
-        for count in range(0, 42):      
-            self.send_data(self.EPD_4IN2_Partial_lut_bb1[count])
+        self.send_command_with_data(0x24, self.EPD_4IN2_Partial_lut_bb1[:42])
 
 
        
     def Gray_SetLut(self):
-        self.send_command(0x20)      #vcom
-        for count in range(0, 42):
-            self.send_data(self.EPD_4IN2_4Gray_lut_vcom[count]) 
+        self.send_command_with_data(0x20, self.EPD_4IN2_4Gray_lut_vcom[:42])      #vcom
 
-        self.send_command(0x21)      #red not use
-        for count in range(0, 42):
-            self.send_data(self.EPD_4IN2_4Gray_lut_ww[count]) 
+        self.send_command_with_data(0x21, self.EPD_4IN2_4Gray_lut_ww[:42])      #red not use
 
-        self.send_command(0x22)       #bw r
-        for count in range(0, 42):
-            self.send_data(self.EPD_4IN2_4Gray_lut_bw[count]) 
+        self.send_command_with_data(0x22, self.EPD_4IN2_4Gray_lut_bw[:42])       #bw r
 
-        self.send_command(0x23)       #wb w
-        for count in range(0, 42):
-            self.send_data(self.EPD_4IN2_4Gray_lut_wb[count]) 
+        self.send_command_with_data(0x23, self.EPD_4IN2_4Gray_lut_wb[:42])       #wb w
 
-        self.send_command(0x24)                          #bb b
-        for count in range(0, 42):
-            self.send_data(self.EPD_4IN2_4Gray_lut_bb[count]) 
+        self.send_command_with_data(0x24, self.EPD_4IN2_4Gray_lut_bb[:42])                          #bb b
 
-        self.send_command(0x25)      #vcom
-        for count in range(0, 42):
-            self.send_data(self.EPD_4IN2_4Gray_lut_ww[count])
+        self.send_command_with_data(0x25, self.EPD_4IN2_4Gray_lut_ww[:42])      #vcom
       
     
     def init(self):
@@ -325,37 +293,38 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x01) # POWER SETTING
-        self.send_data(0x03) # VDS_EN, VDG_EN
-        self.send_data(0x00) # VCOM_HV, VGHL_LV[1], VGHL_LV[0]
-        self.send_data(0x2b) # VDH
-        self.send_data(0x2b) # VDL
+        self.send_command_with_data(0x01, [ # POWER SETTING
+            0x03,  # VDS_EN, VDG_EN
+            0x00,  # VCOM_HV, VGHL_LV[1], VGHL_LV[0]
+            0x2b,  # VDH
+            0x2b,  # VDL
+        ])
         
-        self.send_command(0x06) # boost soft start
-        self.send_data(0x17)
-        self.send_data(0x17)
-        self.send_data(0x17)
+        self.send_command_with_data(0x06, [0x17, 0x17, 0x17]) # boost soft start
         
         self.send_command(0x04) # POWER_ON
         self.ReadBusy()
         
-        self.send_command(0x00) # panel setting
-        self.send_data(0xbf) # KW-BF   KWR-AF  BWROTP 0f
+        self.send_command_with_data(0x00, [ # panel setting
+            0xbf,  # KW-BF   KWR-AF  BWROTP 0f
+        ])
         
-        self.send_command(0x30) # PLL setting
-        self.send_data(0x3c) # 3A 100HZ   29 150Hz 39 200HZ  31 171HZ
-
-        self.send_command(0x61) # resolution setting
-        self.send_data(0x01)
-        self.send_data(0x90) # 128
-        self.send_data(0x01)  
-        self.send_data(0x2c)
-
-        self.send_command(0x82) # vcom_DC setting
-        self.send_data(0x12)
-
-        self.send_command(0X50) # VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x97) # 97white border 77black border  VBDF 17|D7 VBDW 97 VBDB 57  VBDF F7 VBDW 77 VBDB 37  VBDR B7
+        self.send_command_with_data(0x30, [ # PLL setting
+            0x3c,  # 3A 100HZ   29 150Hz 39 200HZ  31 171HZ
+        ])
+
+        self.send_command_with_data(0x61, [ # resolution setting
+            0x01,
+            0x90,  # 128
+            0x01,
+            0x2c,
+        ])
+
+        self.send_command_with_data(0x82, [0x12]) # vcom_DC setting
+
+        self.send_command_with_data(0X50, [ # VCOM AND DATA INTERVAL SETTING
+            0x97,  # 97white border 77black border  VBDF 17|D7 VBDW 97 VBDB 57  VBDF F7 VBDW 77 VBDB 37  VBDR B7
+        ])
     
         self.set_lut()
         # EPD hardware init end
@@ -367,37 +336,38 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x01) # POWER SETTING
-        self.send_data(0x03) # VDS_EN, VDG_EN
-        self.send_data(0x00) # VCOM_HV, VGHL_LV[1], VGHL_LV[0]
-        self.send_data(0x2b) # VDH
-        self.send_data(0x2b) # VDL
+        self.send_command_with_data(0x01, [ # POWER SETTING
+            0x03,  # VDS_EN, VDG_EN
+            0x00,  # VCOM_HV, VGHL_LV[1], VGHL_LV[0]
+            0x2b,  # VDH
+            0x2b,  # VDL
+        ])
         
-        self.send_command(0x06) # boost soft start
-        self.send_data(0x17)
-        self.send_data(0x17)
-        self.send_data(0x17)
+        self.send_command_with_data(0x06, [0x17, 0x17, 0x17]) # boost soft start
         
         self.send_command(0x04) # POWER_ON
         self.ReadBusy()
         
-        self.send_command(0x00) # panel setting
-        self.send_data(0xbf) # KW-BF   KWR-AF  BWROTP 0f
+        self.send_command_with_data(0x00, [ # panel setting
+            0xbf,  # KW-BF   KWR-AF  BWROTP 0f
+        ])
         
-        self.send_command(0x30) # PLL setting
-        self.send_data(0x3c) # 3A 100HZ   29 150Hz 39 200HZ  31 171HZ
-
-        self.send_command(0x61) # resolution setting
-        self.send_data(0x01)
-        self.send_data(0x90) # 128
-        self.send_data(0x01)  
-        self.send_data(0x2c)
-
-        self.send_command(0x82) # vcom_DC setting
-        self.send_data(0x12)
-
-        self.send_command(0X50) # VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x07) # 97white border 77black border  VBDF 17|D7 VBDW 97 VBDB 57  VBDF F7 VBDW 77 VBDB 37  VBDR B7
+        self.send_command_with_data(0x30, [ # PLL setting
+            0x3c,  # 3A 100HZ   29 150Hz 39 200HZ  31 171HZ
+        ])
+
+        self.send_command_with_data(0x61, [ # resolution setting
+            0x01,
+            0x90,  # 128
+            0x01,
+            0x2c,
+        ])
+
+        self.send_command_with_data(0x82, [0x12]) # vcom_DC setting
+
+        self.send_command_with_data(0X50, [ # VCOM AND DATA INTERVAL SETTING
+            0x07,  # 97white border 77black border  VBDF 17|D7 VBDW 97 VBDB 57  VBDF F7 VBDW 77 VBDB 37  VBDR B7
+        ])
     
         self.Partial_SetLut();
         # EPD hardware init end
@@ -409,110 +379,54 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x01)   #POWER SETTING
-        self.send_data (0x03)
-        self.send_data (0x00)       #VGH=20V,VGL=-20V
-        self.send_data (0x2b)  #VDH=15V                
-        self.send_data (0x2b)  #VDL=-15V
-        self.send_data (0x13)
-
-        self.send_command(0x06)         #booster soft start
-        self.send_data (0x17)  #A
-        self.send_data (0x17)  #B
-        self.send_data (0x17)  #C 
+        self.send_command_with_data(0x01, [   #POWER SETTING
+            0x03,
+            0x00,  #VGH=20V,VGL=-20V
+            0x2b,  #VDH=15V
+            0x2b,  #VDL=-15V
+            0x13,
+        ])
+
+        self.send_command_with_data(0x06, [         #booster soft start
+            0x17,  #A
+            0x17,  #B
+            0x17,  #C
+        ])
 
         self.send_command(0x04)
         self.ReadBusy()
 
-        self.send_command(0x00)   #panel setting
-        self.send_data(0x3f)  #KW-3f   KWR-2F BWROTP 0f BWOTP 1f
+        self.send_command_with_data(0x00, [   #panel setting
+            0x3f,  #KW-3f   KWR-2F BWROTP 0f BWOTP 1f
+        ])
 
-        self.send_command(0x30)   #PLL setting
-        self.send_data (0x3c)       #100hz 
+        self.send_command_with_data(0x30, [   #PLL setting
+            0x3c,  #100hz
+        ])
 
-        self.send_command(0x61)   #resolution setting
-        self.send_data (0x01)  #400
-        self.send_data (0x90)       
-        self.send_data (0x01)  #300
-        self.send_data (0x2c)
+        self.send_command_with_data(0x61, [   #resolution setting
+            0x01,  #400
+            0x90,
+            0x01,  #300
+            0x2c,
+        ])
 
-        self.send_command(0x82)   #vcom_DC setting
-        self.send_data (0x12)
+        self.send_command_with_data(0x82, [0x12])   #vcom_DC setting
 
-        self.send_command(0X50)   #VCOM AND DATA INTERVAL SETTING   
-        self.send_data(0x97)
+        self.send_command_with_data(0X50, [0x97])   #VCOM AND DATA INTERVAL SETTING
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height)
         
     def getbuffer_4Gray(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i=0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((x + (y * self.width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
-                        
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = x
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((newx + (newy * self.width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6) 
-        
-        return buf
+        return epdbuffer.pack_4gray(image, self.width, self.height, rotation=Image.TRANSPOSE)
 
     def display(self, image):
         self.send_command(0x92); 
         self.set_lut();
-        self.send_command(0x10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xFF)
+        self.send_command_with_data(0x10, [0xFF] * int(self.width * self.height / 8))
             
-        self.send_command(0x13)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(image[i])
+        self.send_command_with_data(0x13, image[:int(self.width * self.height / 8)])
             
         self.send_command(0x12) 
         self.ReadBusy()
@@ -533,9 +447,10 @@ class EPD:
         
         
         self.send_command(0x91);  #This command makes the display enter partial mode
-        self.send_command(0x90);  #resolution setting
-        self.send_data (int(X_start/256));
-        self.send_data (int(X_start%256));   #x-start    
+        self.send_command_with_data(0x90, [  #resolution setting
+            int(X_start/256),
+            int(X_start%256),  #x-start
+        ])
         
         self.send_data (int(X_end /256));  
         self.send_data (int(X_end %256)-1);  #x-end
@@ -639,13 +554,9 @@ class EPD:
         # pass
     
     def Clear(self):
-        self.send_command(0x10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xFF)
+        self.send_command_with_data(0x10, [0xFF] * int(self.width * self.height / 8))
             
-        self.send_command(0x13)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0xFF)
+        self.send_command_with_data(0x13, [0xFF] * int(self.width * self.height / 8))
             
         self.send_command(0x12) 
         self.ReadBusy()
@@ -653,8 +564,7 @@ class EPD:
     def sleep(self):
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send_command_with_data(0x07, [0XA5]) # DEEP_SLEEP
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -31,6 +31,8 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
+import numpy as np
 
 import PIL
 from PIL import Image
@@ -80,6 +82,9 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
 
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def send_data_bulk(self, data):
         epdconfig.digital_write(self.dc_pin, 1)
         epdconfig.digital_write(self.cs_pin, 0)
@@ -88,14 +93,12 @@ class EPD:
 
     def ReadBusyHigh(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)
+        epdconfig.wait_busy(self.busy_pin, 0)      # 0: busy, 1: idle
         logger.debug("e-Paper busy release")
 
     def ReadBusyLow(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)
+        epdconfig.wait_busy(self.busy_pin, 1)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
     def init(self):
@@ -105,39 +108,19 @@ class EPD:
         self.reset()
 
         self.ReadBusyHigh()
-        self.send_command(0x00)
-        self.send_data(0xEF)
-        self.send_data(0x08)
-        self.send_command(0x01)
-        self.send_data(0x37)
-        self.send_data(0x00)
-        self.send_data(0x23)
-        self.send_data(0x23)
-        self.send_command(0x03)
-        self.send_data(0x00)
-        self.send_command(0x06)
-        self.send_data(0xC7)
-        self.send_data(0xC7)
-        self.send_data(0x1D)
-        self.send_command(0x30)
-        self.send_data(0x3c)
-        self.send_command(0x41)
-        self.send_data(0x00)
-        self.send_command(0x50)
-        self.send_data(0x37)
-        self.send_command(0x60)
-        self.send_data(0x22)
-        self.send_command(0x61)
-        self.send_data(0x02)
-        self.send_data(0x58)
-        self.send_data(0x01)
-        self.send_data(0xC0)
-        self.send_command(0xE3)
-        self.send_data(0xAA)
+        self.send_command_with_data(0x00, [0xEF, 0x08])
+        self.send_command_with_data(0x01, [0x37, 0x00, 0x23, 0x23])
+        self.send_command_with_data(0x03, [0x00])
+        self.send_command_with_data(0x06, [0xC7, 0xC7, 0x1D])
+        self.send_command_with_data(0x30, [0x3c])
+        self.send_command_with_data(0x41, [0x00])
+        self.send_command_with_data(0x50, [0x37])
+        self.send_command_with_data(0x60, [0x22])
+        self.send_command_with_data(0x61, [0x02, 0x58, 0x01, 0xC0])
+        self.send_command_with_data(0xE3, [0xAA])
 
         epdconfig.delay_ms(100)
-        self.send_command(0x50)
-        self.send_data(0x37)
+        self.send_command_with_data(0x50, [0x37])
         # EPD hardware init end
         return 0
 
@@ -146,35 +129,19 @@ class EPD:
         pal_image = Image.new("P", (1,1))
         pal_image.putpalette( (0,0,0,  255,255,255,  0,255,0,   0,0,255,  255,0,0,  255,255,0, 255,128,0) + (0,0,0)*249)
 
-        # Check if we need to rotate the image
-        imwidth, imheight = image.size
-        if(imwidth == self.width and imheight == self.height):
-            image_temp = image
-        elif(imwidth == self.height and imheight == self.width):
-            image_temp = image.rotate(90, expand=True)
-        else:
-            logger.warning("Invalid image dimensions: %d x %d, expected %d x %d" % (imwidth, imheight, self.width, self.height))
+        image_temp = epdbuffer.orient(image, self.width, self.height, 'RGB')
+        if image_temp is None:
+            return epdbuffer.blank(self.width, self.height, 0x00, bpp=4)
 
         # Convert the soruce image to the 7 colors, dithering if needed
-        image_7color = image_temp.convert("RGB").quantize(palette=pal_image)
-        buf_7color = bytearray(image_7color.tobytes('raw'))
+        image_7color = image_temp.quantize(palette=pal_image)
 
         # PIL does not support 4 bit color, so pack the 4 bits of color
         # into a single byte to transfer to the panel
-        buf = [0x00] * int(self.width * self.height / 2)
-        idx = 0
-        for i in range(0, len(buf_7color), 2):
-            buf[idx] = (buf_7color[i] << 4) + buf_7color[i+1]
-            idx += 1
-
-        return buf
+        return epdbuffer.pack_levels(np.asarray(image_7color), 4)
 
     def display(self,image):
-        self.send_command(0x61) #Set Resolution setting
-        self.send_data(0x02)
-        self.send_data(0x58)
-        self.send_data(0x01)
-        self.send_data(0xC0)
+        self.send_command_with_data(0x61, [0x02, 0x58, 0x01, 0xC0]) #Set Resolution setting
         self.send_command(0x10)
 
         self.send_data_bulk(image)
@@ -187,11 +154,7 @@ class EPD:
         epdconfig.delay_ms(500)
 
     def Clear(self):
-        self.send_command(0x61) #Set Resolution setting
-        self.send_data(0x02)
-        self.send_data(0x58)
-        self.send_data(0x01)
-        self.send_data(0xC0)
+        self.send_command_with_data(0x61, [0x02, 0x58, 0x01, 0xC0]) #Set Resolution setting
         self.send_command(0x10)
 
         # Set all pixels to white
@@ -208,8 +171,7 @@ class EPD:
 
     def sleep(self):
         epdconfig.delay_ms(500)
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send_command_with_data(0x07, [0XA5]) # DEEP_SLEEP
         epdconfig.digital_write(self.reset_pin, 0)
 
         epdconfig.delay_ms(2000)
@@ -30,6 +30,8 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
+import numpy as np
 
 # Display resolution
 EPD_WIDTH       = 600
@@ -67,10 +69,12 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
         
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)    
+        epdconfig.wait_busy(self.busy_pin, 0)      # 0: busy, 1: idle
         logger.debug("e-Paper busy release")
         
     def init(self):
@@ -79,79 +83,46 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x01) # POWER_SETTING
-        self.send_data(0x37)
-        self.send_data(0x00)
+        self.send_command_with_data(0x01, [0x37, 0x00]) # POWER_SETTING
         
-        self.send_command(0x00) # PANEL_SETTING
-        self.send_data(0xCF)
-        self.send_data(0x08)
+        self.send_command_with_data(0x00, [0xCF, 0x08]) # PANEL_SETTING
         
-        self.send_command(0x06) # BOOSTER_SOFT_START
-        self.send_data(0xc7)
-        self.send_data(0xcc)
-        self.send_data(0x28)
+        self.send_command_with_data(0x06, [0xc7, 0xcc, 0x28]) # BOOSTER_SOFT_START
         
         self.send_command(0x04) # POWER_ON
         self.ReadBusy()
         
-        self.send_command(0x30) # PLL_CONTROL
-        self.send_data(0x3c)
+        self.send_command_with_data(0x30, [0x3c]) # PLL_CONTROL
         
-        self.send_command(0x41) # TEMPERATURE_CALIBRATION
-        self.send_data(0x00)
+        self.send_command_with_data(0x41, [0x00]) # TEMPERATURE_CALIBRATION
         
-        self.send_command(0x50) # VCOM_AND_DATA_INTERVAL_SETTING
-        self.send_data(0x77)
+        self.send_command_with_data(0x50, [0x77]) # VCOM_AND_DATA_INTERVAL_SETTING
         
-        self.send_command(0x60) # TCON_SETTING
-        self.send_data(0x22)
+        self.send_command_with_data(0x60, [0x22]) # TCON_SETTING
         
-        self.send_command(0x61) # TCON_RESOLUTION
-        self.send_data(0x02) # source 600
-        self.send_data(0x58)
-        self.send_data(0x01) # gate 448
-        self.send_data(0xC0)
+        self.send_command_with_data(0x61, [ # TCON_RESOLUTION
+            0x02,  # source 600
+            0x58,
+            0x01,  # gate 448
+            0xC0,
+        ])
         
-        self.send_command(0x82) # VCM_DC_SETTING
-        self.send_data(0x1E) # decide by LUT file
+        self.send_command_with_data(0x82, [ # VCM_DC_SETTING
+            0x1E,  # decide by LUT file
+        ])
         
-        self.send_command(0xe5) # FLASH MODE
-        self.send_data(0x03)
+        self.send_command_with_data(0xe5, [0x03]) # FLASH MODE
         
         # EPD hardware init end
         return 0
 
     def getbuffer(self, image):
-        buf = [0x00] * int(self.width * self.height / 4)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        logger.debug('imwidth = %d  imheight =  %d ',imwidth, imheight)
-        if(imwidth == self.width and imheight == self.height):
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] < 64:           # black
-                        buf[int((x + y * self.width) / 4)] &= ~(0xC0 >> (x % 4 * 2))
-                    elif pixels[x, y] < 192:     # convert gray to red
-                        buf[int((x + y * self.width) / 4)] &= ~(0xC0 >> (x % 4 * 2))
-                        buf[int((x + y * self.width) / 4)] |= 0x40 >> (x % 4 * 2)
-                    else:                           # white
-                        buf[int((x + y * self.width) / 4)] |= 0xC0 >> (x % 4 * 2)
-        elif(imwidth == self.height and imheight == self.width):
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1                    
-                    if pixels[x, y] < 64:           # black
-                        buf[int((newx + newy*self.width) / 4)] &= ~(0xC0 >> (y % 4 * 2))
-                    elif pixels[x, y] < 192:     # convert gray to red
-                        buf[int((newx + newy*self.width) / 4)] &= ~(0xC0 >> (y % 4 * 2))
-                        buf[int((newx + newy*self.width) / 4)] |= 0x40 >> (y % 4 * 2)
-                    else:                           # white
-                        buf[int((newx + newy*self.width) / 4)] |= 0xC0 >> (y % 4 * 2)
-        return buf
+        image_monocolor = epdbuffer.orient(image, self.width, self.height)
+        if image_monocolor is None:
+            return epdbuffer.blank(self.width, self.height, 0x00, bpp=2)
+        # black is 00 and white is 11, the 1 bit image has no gray left to turn red
+        levels = np.where(np.asarray(image_monocolor), 0x03, 0x00)
+        return epdbuffer.pack_levels(levels, 2)
 
     def display(self, image):
         self.send_command(0x10)
@@ -193,8 +164,7 @@ class EPD:
     def sleep(self):
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send_command_with_data(0x07, [0XA5]) # DEEP_SLEEP
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 648
@@ -66,10 +67,12 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
         
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      
-            epdconfig.delay_ms(20)    
+        epdconfig.wait_busy(self.busy_pin, 0)
         logger.debug("e-Paper busy release")
         
     def TurnOnDisplay(self):
@@ -83,85 +86,56 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x01)    #POWER SETTING
-        self.send_data (0x07)
-        self.send_data (0x07)  #VGH=20V,VGL=-20V
-        self.send_data (0x3f)  #VDH=15V
-        self.send_data (0x3f)  #VDL=-15V
+        self.send_command_with_data(0x01, [    #POWER SETTING
+            0x07,
+            0x07,  #VGH=20V,VGL=-20V
+            0x3f,  #VDH=15V
+            0x3f,  #VDL=-15V
+        ])
 
         self.send_command(0x04)    #POWER ON
         epdconfig.delay_ms(100) 
         self.ReadBusy()   #waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0X00)    #PANNEL SETTING
-        self.send_data(0x1F)   #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
+        self.send_command_with_data(0X00, [    #PANNEL SETTING
+            0x1F,  #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
+        ])
 
-        self.send_command(0x61)    #tres
-        self.send_data (0x02)		#source 648
-        self.send_data (0x88)
-        self.send_data (0x01)		#gate 480
-        self.send_data (0xE0)
+        self.send_command_with_data(0x61, [    #tres
+            0x02,  #source 648
+            0x88,
+            0x01,  #gate 480
+            0xE0,
+        ])
 
-        self.send_command(0X15)		
-        self.send_data(0x00)		
+        self.send_command_with_data(0X15, [0x00])
 
-        self.send_command(0X50)			#VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x10)
-        self.send_data(0x07)
+        self.send_command_with_data(0X50, [0x10, 0x07])			#VCOM AND DATA INTERVAL SETTING
 
-        self.send_command(0X60)			#TCON SETTING
-        self.send_data(0x22)
+        self.send_command_with_data(0X60, [0x22])			#TCON SETTING
             
         # EPD hardware init end
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height)
         
     def display(self, image):
-        self.send_command(0x10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0x00)
+        self.send_command_with_data(0x10, [0x00] * int(self.width * self.height / 8))
         self.send_command(0x13)
         for i in range(0, int(self.width * self.height / 8)):
             self.send_data(~image[i])
         self.TurnOnDisplay()
         
     def Clear(self):
-        self.send_command(0x10)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0x00)
-        self.send_command(0x13)
-        for i in range(0, int(self.width * self.height / 8)):
-            self.send_data(0x00)
+        self.send_command_with_data(0x10, [0x00] * int(self.width * self.height / 8))
+        self.send_command_with_data(0x13, [0x00] * int(self.width * self.height / 8))
         self.TurnOnDisplay()
 
     def sleep(self):
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send_command_with_data(0x07, [0XA5]) # DEEP_SLEEP
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
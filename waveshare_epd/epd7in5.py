@@ -30,6 +30,8 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
+import numpy as np
 
 # Display resolution
 EPD_WIDTH       = 640
@@ -67,6 +69,9 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
         
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def send_data2(self, data):
         epdconfig.digital_write(self.dc_pin, 1)
         epdconfig.digital_write(self.cs_pin, 0)
@@ -75,8 +80,7 @@ class EPD:
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)    
+        epdconfig.wait_busy(self.busy_pin, 0)      # 0: busy, 1: idle
         logger.debug("e-Paper busy release")
         
     def init(self):
@@ -85,78 +89,46 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x01) # POWER_SETTING
-        self.send_data2([0x37, 0x00])
+        self.send_command_with_data(0x01, [0x37, 0x00]) # POWER_SETTING
         
-        self.send_command(0x00) # PANEL_SETTING
-        self.send_data2([0xCF, 0x08])
+        self.send_command_with_data(0x00, [0xCF, 0x08]) # PANEL_SETTING
         
-        self.send_command(0x06) # BOOSTER_SOFT_START
-        self.send_data2([0xc7, 0xcc, 0x28])
+        self.send_command_with_data(0x06, [0xc7, 0xcc, 0x28]) # BOOSTER_SOFT_START
         
         self.send_command(0x04) # POWER_ON
         self.ReadBusy()
         
-        self.send_command(0x30) # PLL_CONTROL
-        self.send_data(0x3c)
+        self.send_command_with_data(0x30, [0x3c]) # PLL_CONTROL
         
-        self.send_command(0x41) # TEMPERATURE_CALIBRATION
-        self.send_data(0x00)
+        self.send_command_with_data(0x41, [0x00]) # TEMPERATURE_CALIBRATION
         
-        self.send_command(0x50) # VCOM_AND_DATA_INTERVAL_SETTING
-        self.send_data(0x77)
+        self.send_command_with_data(0x50, [0x77]) # VCOM_AND_DATA_INTERVAL_SETTING
         
-        self.send_command(0x60) # TCON_SETTING
-        self.send_data(0x22)
+        self.send_command_with_data(0x60, [0x22]) # TCON_SETTING
         
-        self.send_command(0x61) # TCON_RESOLUTION
-        self.send_data(EPD_WIDTH >> 8)     #source 640
-        self.send_data(EPD_WIDTH & 0xff)
-        self.send_data(EPD_HEIGHT >> 8)     #gate 384
-        self.send_data(EPD_HEIGHT & 0xff)
+        self.send_command_with_data(0x61, [ # TCON_RESOLUTION
+            EPD_WIDTH >> 8,  #source 640
+            EPD_WIDTH & 0xff,
+            EPD_HEIGHT >> 8,  #gate 384
+            EPD_HEIGHT & 0xff,
+        ])
         
-        self.send_command(0x82) # VCM_DC_SETTING
-        self.send_data(0x1E) # decide by LUT file
+        self.send_command_with_data(0x82, [ # VCM_DC_SETTING
+            0x1E,  # decide by LUT file
+        ])
         
-        self.send_command(0xe5) # FLASH MODE
-        self.send_data(0x03)
+        self.send_command_with_data(0xe5, [0x03]) # FLASH MODE
         
         # EPD hardware init end
         return 0
 
     def getbuffer(self, image):
-        img = image
-        imwidth, imheight = img.size
-        halfwidth = int(self.width / 2)
-        buf = [0x33] * halfwidth * self.height
-        
-        if(imwidth == self.width and imheight == self.height):
-            img = img.convert('1')
-        elif(imwidth == self.height and imheight == self.width):
-            img = img.rotate(90, expand=True).convert('1')
-            imwidth, imheight = img.size
-        else:
-            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
+        img = epdbuffer.orient(image, self.width, self.height)
+        if img is None:
             # return a blank buffer
-            return buf
-        
-        pixels = img.load()
-
-        for y in range(imheight):
-            offset = y * halfwidth
-            for x in range(1, imwidth, 2):
-                i = offset + x // 2
-                if(pixels[x-1, y] > 191):
-                    if(pixels[x, y] > 191):
-                        buf[i] = 0x33
-                    else:
-                        buf[i] = 0x30
-                else:
-                    if(pixels[x, y] > 191):
-                        buf[i] = 0x03
-                    else:
-                        buf[i] = 0x00
-        return buf
+            return epdbuffer.blank(self.width, self.height, 0x33, bpp=4)
+        levels = np.where(np.asarray(img), 0x03, 0x00)
+        return epdbuffer.pack_levels(levels, 4)
         
     def display(self, image):
         self.send_command(0x10)
@@ -176,8 +148,7 @@ class EPD:
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
         
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send_command_with_data(0x07, [0XA5]) # DEEP_SLEEP
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
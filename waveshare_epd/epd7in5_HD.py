@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 880
@@ -67,6 +68,9 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
         
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def send_data2(self, data):
         epdconfig.digital_write(self.dc_pin, 1)
         epdconfig.digital_write(self.cs_pin, 0)
@@ -75,9 +79,7 @@ class EPD:
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 1):
-            busy = epdconfig.digital_read(self.busy_pin)
+        epdconfig.wait_busy(self.busy_pin, 1)
         epdconfig.delay_ms(200)
         
     def init(self):
@@ -90,91 +92,75 @@ class EPD:
         self.send_command(0x12);  #SWRESET
         self.ReadBusy();
 
-        self.send_command(0x46);  # Auto Write Red RAM
-        self.send_data(0xf7);
+        self.send_command_with_data(0x46, [0xf7])  # Auto Write Red RAM
         self.ReadBusy();
-        self.send_command(0x47);  # Auto Write  B/W RAM
-        self.send_data(0xf7);
+        self.send_command_with_data(0x47, [0xf7])  # Auto Write  B/W RAM
         self.ReadBusy();
 
-        self.send_command(0x0C);  # Soft start setting
-        self.send_data2([0xAE, 0xC7, 0xC3, 0xC0, 0x40])
+        self.send_command_with_data(0x0C, [0xAE, 0xC7, 0xC3, 0xC0, 0x40])  # Soft start setting
 
-        self.send_command(0x01);  # Set MUX as 527
-        self.send_data2([0xAF, 0x02, 0x01])
+        self.send_command_with_data(0x01, [0xAF, 0x02, 0x01])  # Set MUX as 527
 
-        self.send_command(0x11);  # Data entry mode      
-        self.send_data(0x01);
+        self.send_command_with_data(0x11, [0x01])  # Data entry mode
 
-        self.send_command(0x44); 
-        self.send_data2([0x00, 0x00, 0x6F, 0x03]) # RAM x address start at 0
-        self.send_command(0x45); 
-        self.send_data2([0xAF, 0x02, 0x00, 0x00])
+        self.send_command_with_data(0x44, [
+            0x00,
+            0x00,
+            0x6F,
+            0x03,  # RAM x address start at 0
+        ])
+        self.send_command_with_data(0x45, [0xAF, 0x02, 0x00, 0x00])
 
-        self.send_command(0x3C); # VBD
-        self.send_data(0x05); # LUT1, for white
+        self.send_command_with_data(0x3C, [ # VBD
+            0x05,  # LUT1, for white
+        ])
 
-        self.send_command(0x18);
-        self.send_data(0X80);
+        self.send_command_with_data(0x18, [0X80])
 
 
-        self.send_command(0x22);
-        self.send_data(0XB1); #Load Temperature and waveform setting.
+        self.send_command_with_data(0x22, [
+            0XB1,  #Load Temperature and waveform setting.
+        ])
         self.send_command(0x20);
         self.ReadBusy();
 
-        self.send_command(0x4E); # set RAM x address count to 0;
-        self.send_data2([0x00, 0x00])
-        self.send_command(0x4F); 
-        self.send_data2([0x00, 0x00])
+        self.send_command_with_data(0x4E, [0x00, 0x00]) # set RAM x address count to 0;
+        self.send_command_with_data(0x4F, [0x00, 0x00])
         # EPD hardware init end
         return 0
 
     def getbuffer(self, image):
-        img = image
-        imwidth, imheight = img.size
-        if(imwidth == self.width and imheight == self.height):
-            img = img.convert('1')
-        elif(imwidth == self.height and imheight == self.width):
-            img = img.rotate(90, expand=True).convert('1')
-        else:
-            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
-            # return a blank buffer
-            return [0xff] * int(self.width * self.height / 8)
-
-        buf = bytearray(img.tobytes('raw'))
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height)
         
     def display(self, image):
-        self.send_command(0x4F); 
-        self.send_data2([0x00, 0x00])
+        self.send_command_with_data(0x4F, [0x00, 0x00])
         self.send_command(0x24);
         self.send_data2(image)
-        self.send_command(0x22);
-        self.send_data(0xF7);#Load LUT from MCU(0x32)
+        self.send_command_with_data(0x22, [
+            0xF7,  #Load LUT from MCU(0x32)
+        ])
         self.send_command(0x20);
         epdconfig.delay_ms(10);
         self.ReadBusy();
         
     def Clear(self):
         buf = [0xff] * int(self.width * self.height / 8)
-        self.send_command(0x4F); 
-        self.send_data2([0x00, 0x00])
+        self.send_command_with_data(0x4F, [0x00, 0x00])
         self.send_command(0x24)
         self.send_data2(buf)
             
         self.send_command(0x26)
         self.send_data2(buf)
                 
-        self.send_command(0x22);
-        self.send_data(0xF7);#Load LUT from MCU(0x32)
+        self.send_command_with_data(0x22, [
+            0xF7,  #Load LUT from MCU(0x32)
+        ])
         self.send_command(0x20);
         epdconfig.delay_ms(10);
         self.ReadBusy();
 
     def sleep(self):
-        self.send_command(0x10);
-        self.send_data(0x01);
+        self.send_command_with_data(0x10, [0x01])
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 800
@@ -45,6 +46,8 @@ class EPD:
         self.cs_pin = epdconfig.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        # What the panel is showing, the old data for partial refreshes
+        self.DATA = epdbuffer.blank(self.width, self.height, 0x00)
     
     Voltage_Frame_7IN5_V2 = [
 	0x6, 0x3F, 0x3F, 0x11, 0x24, 0x7, 0x17,
@@ -121,6 +124,9 @@ class EPD:
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
 
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
+
     def send_data2(self, data):
         epdconfig.digital_write(self.dc_pin, 1)
         epdconfig.digital_write(self.cs_pin, 0)
@@ -129,34 +135,20 @@ class EPD:
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 0):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
+        epdconfig.wait_busy(self.busy_pin, 0, poke=lambda: self.send_command(0x71))
         epdconfig.delay_ms(20)
         logger.debug("e-Paper busy release")
         
     def SetLut(self, lut_vcom, lut_ww, lut_bw, lut_wb, lut_bb):
-        self.send_command(0x20)
-        for count in range(0, 42):
-            self.send_data(lut_vcom[count])
+        self.send_command_with_data(0x20, lut_vcom[:42])
 
-        self.send_command(0x21)
-        for count in range(0, 42):
-            self.send_data(lut_ww[count])
+        self.send_command_with_data(0x21, lut_ww[:42])
 
-        self.send_command(0x22)
-        for count in range(0, 42):
-            self.send_data(lut_bw[count])
+        self.send_command_with_data(0x22, lut_bw[:42])
 
-        self.send_command(0x23)
-        for count in range(0, 42):
-            self.send_data(lut_wb[count])
+        self.send_command_with_data(0x23, lut_wb[:42])
 
-        self.send_command(0x24)
-        for count in range(0, 42):
-            self.send_data(lut_bb[count])
+        self.send_command_with_data(0x24, lut_bb[:42])
 
     def init(self):
         if (epdconfig.module_init() != 0):
@@ -176,92 +168,138 @@ class EPD:
         # self.send_data(0x3f)		#VDH=15V
         # self.send_data(0x3f)		#VDL=-15V
 
-        self.send_command(0x01);  # power setting
-        self.send_data(0x17);  # 1-0=11: internal power
-        self.send_data(self.Voltage_Frame_7IN5_V2[6]);  # VGH&VGL
-        self.send_data(self.Voltage_Frame_7IN5_V2[1]);  # VSH
-        self.send_data(self.Voltage_Frame_7IN5_V2[2]);  #  VSL
-        self.send_data(self.Voltage_Frame_7IN5_V2[3]);  #  VSHR
+        self.send_command_with_data(0x01, [  # power setting
+            0x17,  # 1-0=11: internal power
+            self.Voltage_Frame_7IN5_V2[6],  # VGH&VGL
+            self.Voltage_Frame_7IN5_V2[1],  # VSH
+            self.Voltage_Frame_7IN5_V2[2],  #  VSL
+            self.Voltage_Frame_7IN5_V2[3],  #  VSHR
+        ])
         
-        self.send_command(0x82); # VCOM DC Setting
-        self.send_data(self.Voltage_Frame_7IN5_V2[4]);  # VCOM
-
-        self.send_command(0x06);  # Booster Setting
-        self.send_data(0x27);
-        self.send_data(0x27);
-        self.send_data(0x2F);
-        self.send_data(0x17);
+        self.send_command_with_data(0x82, [ # VCOM DC Setting
+            self.Voltage_Frame_7IN5_V2[4],  # VCOM
+        ])
+
+        self.send_command_with_data(0x06, [0x27, 0x27, 0x2F, 0x17])  # Booster Setting
         
-        self.send_command(0x30);   # OSC Setting
-        self.send_data(self.Voltage_Frame_7IN5_V2[0]);  # 2-0=100: N=4  ; 5-3=111: M=7  ;  3C=50Hz     3A=100HZ
+        self.send_command_with_data(0x30, [   # OSC Setting
+            self.Voltage_Frame_7IN5_V2[0],  # 2-0=100: N=4  ; 5-3=111: M=7  ;  3C=50Hz     3A=100HZ
+        ])
 
         self.send_command(0x04) #POWER ON
         epdconfig.delay_ms(100)
         self.ReadBusy()
 
-        self.send_command(0X00)			#PANNEL SETTING
-        self.send_data(0x3F)   #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
+        self.send_command_with_data(0X00, [			#PANNEL SETTING
+            0x3F,  #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
+        ])
 
-        self.send_command(0x61)        	#tres
-        self.send_data(0x03)		#source 800
-        self.send_data(0x20)
-        self.send_data(0x01)		#gate 480
-        self.send_data(0xE0)
+        self.send_command_with_data(0x61, [        	#tres
+            0x03,  #source 800
+            0x20,
+            0x01,  #gate 480
+            0xE0,
+        ])
 
-        self.send_command(0X15)
-        self.send_data(0x00)
+        self.send_command_with_data(0X15, [0x00])
 
-        self.send_command(0X50)			#VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x10)
-        self.send_data(0x07)
+        self.send_command_with_data(0X50, [0x10, 0x07])			#VCOM AND DATA INTERVAL SETTING
 
-        self.send_command(0X60)			#TCON SETTING
-        self.send_data(0x22)
+        self.send_command_with_data(0X60, [0x22])			#TCON SETTING
 
-        self.send_command(0x65);  # Resolution setting
-        self.send_data(0x00);
-        self.send_data(0x00); # 800*480
-        self.send_data(0x00);
-        self.send_data(0x00);
+        self.send_command_with_data(0x65, [  # Resolution setting
+            0x00,
+            0x00,  # 800*480
+            0x00,
+            0x00,
+        ])
 
         self.SetLut(self.LUT_VCOM_7IN5_V2, self.LUT_WW_7IN5_V2, self.LUT_BW_7IN5_V2, self.LUT_WB_7IN5_V2, self.LUT_BB_7IN5_V2)
         # EPD hardware init end
         return 0
 
+    def init_part(self):
+        if (epdconfig.module_init() != 0):
+            return -1
+        # EPD hardware init start
+        self.reset()
+
+        self.send_command_with_data(0X00, [			#PANNEL SETTING
+            0x1F,  #LUT from OTP, KW mode
+        ])
+
+        self.send_command_with_data(0x61, [        	#tres
+            0x03,  #source 800
+            0x20,
+            0x01,  #gate 480
+            0xE0,
+        ])
+
+        self.send_command(0x04) #POWER ON
+        epdconfig.delay_ms(100)
+        self.ReadBusy()
+
+        self.send_command_with_data(0xE0, [0x02])     # Cascade setting, use the forced temperature
+        self.send_command_with_data(0xE5, [0x6E])     # Force temperature, selects the fast OTP waveform
+        # EPD hardware init end
+        return 0
+
     def getbuffer(self, image):
-        img = image
-        imwidth, imheight = img.size
-        if(imwidth == self.width and imheight == self.height):
-            img = img.convert('1')
-        elif(imwidth == self.height and imheight == self.width):
-            # image has correct dimensions, but needs to be rotated
-            img = img.rotate(90, expand=True).convert('1')
-        else:
-            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
-            # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
-
-        buf = bytearray(img.tobytes('raw'))
         # The bytes need to be inverted, because in the PIL world 0=black and 1=white, but
         # in the e-paper world 0=white and 1=black.
-        for i in range(len(buf)):
-            buf[i] ^= 0xFF
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height, invert=True, fill=0x00)
 
     def display(self, image):
         self.send_command(0x13)
         self.send_data2(image)
+        self.DATA = bytearray(image)
 
         self.send_command(0x12)
         epdconfig.delay_ms(100)
         self.ReadBusy()
 
+    # Refreshes the window (Xstart, Ystart)-(Xend, Yend) of the full frame buffer, needs init_part
+    def display_Partial(self, image, Xstart, Ystart, Xend, Yend):
+        # The window is addressed in whole bytes horizontally
+        Xstart = Xstart // 8 * 8
+        Xend = (Xend + 7) // 8 * 8
+
+        self.send_command_with_data(0X50, [0xA9, 0x07])			#VCOM AND DATA INTERVAL SETTING
+
+        self.send_command(0x91)     #This command makes the display enter partial mode
+        self.send_command_with_data(0x90, [     #resolution setting
+            Xstart // 256,
+            Xstart % 256,  #x-start
+            (Xend - 1) // 256,
+            (Xend - 1) % 256,  #x-end
+            Ystart // 256,
+            Ystart % 256,  #y-start
+            (Yend - 1) // 256,
+            (Yend - 1) % 256,  #y-end
+            0x01,  #gates scan inside and outside the window
+        ])
+
+        # RAM does not survive deep sleep, so the old data is resent every time
+        old = epdbuffer.window(self.DATA, self.width, Xstart, Ystart, Xend, Yend)
+        new = epdbuffer.window(image, self.width, Xstart, Ystart, Xend, Yend)
+        self.send_command(0x10)     #writes Old data to SRAM for programming
+        self.send_data2(old.tobytes())
+        self.send_command(0x13)     #writes New data to SRAM.
+        self.send_data2(new.tobytes())
+        old[:] = new
+
+        self.send_command(0x12)     #DISPLAY REFRESH
+        epdconfig.delay_ms(100)
+        self.ReadBusy()
+        self.send_command(0x92)     #leave partial mode
+
     def Clear(self):
         buf = [0x00] * (int(self.width/8) * self.height)
         self.send_command(0x10)
         self.send_data2(buf)
         self.send_command(0x13)
         self.send_data2(buf)
+        self.DATA = bytearray(buf)
         self.send_command(0x12)
         epdconfig.delay_ms(100)
         self.ReadBusy()
@@ -270,10 +308,10 @@ class EPD:
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
         
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
-        
-        epdconfig.delay_ms(2000)
+        self.send_command_with_data(0x07, [0XA5]) # DEEP_SLEEP
+
+        # POWER_OFF has finished once BUSY released, so there is nothing left to wait for
+        # before the host lets go of the pins, and inside a session it keeps them anyway
         epdconfig.module_exit()
 ### END OF FILE ###
 
@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 800
@@ -66,6 +67,9 @@ class EPD:
         epdconfig.digital_write(self.cs_pin, 0)
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
+
+    def send_command_with_data(self, command, data):
+        epdconfig.send_command_with_data(command, data)
     
     def send_data2(self, data): #faster
         epdconfig.digital_write(self.dc_pin, 1)
@@ -75,11 +79,7 @@ class EPD:
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 0):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
+        epdconfig.wait_busy(self.busy_pin, 0, poke=lambda: self.send_command(0x71))
         epdconfig.delay_ms(200)
         logger.debug("e-Paper busy release")
         
@@ -95,62 +95,42 @@ class EPD:
         # self.send_data(0x38)        # If an exception is displayed, try using 0x38
         # self.send_data(0x17)
 
-        self.send_command(0x01);			#POWER SETTING
-        self.send_data(0x07);
-        self.send_data(0x07);    #VGH=20V,VGL=-20V
-        self.send_data(0x3f);		#VDH=15V
-        self.send_data(0x3f);		#VDL=-15V
+        self.send_command_with_data(0x01, [			#POWER SETTING
+            0x07,
+            0x07,  #VGH=20V,VGL=-20V
+            0x3f,  #VDH=15V
+            0x3f,  #VDL=-15V
+        ])
 
         self.send_command(0x04); #POWER ON
         epdconfig.delay_ms(100);
         self.ReadBusy();
 
-        self.send_command(0X00);			#PANNEL SETTING
-        self.send_data(0x0F);   #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
+        self.send_command_with_data(0X00, [			#PANNEL SETTING
+            0x0F,  #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
+        ])
 
-        self.send_command(0x61);        	#tres
-        self.send_data(0x03);		#source 800
-        self.send_data(0x20);
-        self.send_data(0x01);		#gate 480
-        self.send_data(0xE0);
+        self.send_command_with_data(0x61, [        	#tres
+            0x03,  #source 800
+            0x20,
+            0x01,  #gate 480
+            0xE0,
+        ])
 
-        self.send_command(0X15);
-        self.send_data(0x00);
+        self.send_command_with_data(0X15, [0x00])
 
-        self.send_command(0X50);			#VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x11);
-        self.send_data(0x07);
+        self.send_command_with_data(0X50, [0x11, 0x07])			#VCOM AND DATA INTERVAL SETTING
 
-        self.send_command(0X60);			#TCON SETTING
-        self.send_data(0x22);
+        self.send_command_with_data(0X60, [0x22])			#TCON SETTING
 
-        self.send_command(0x65);
-        self.send_data(0x00);
-        self.send_data(0x00);
-        self.send_data(0x00);
-        self.send_data(0x00);
+        self.send_command_with_data(0x65, [0x00, 0x00, 0x00, 0x00])
     
         return 0
 
     def getbuffer(self, image):
-        img = image
-        imwidth, imheight = img.size
-        if(imwidth == self.width and imheight == self.height):
-            img = img.convert('1')
-        elif(imwidth == self.height and imheight == self.width):
-            # image has correct dimensions, but needs to be rotated
-            img = img.rotate(90, expand=True).convert('1')
-        else:
-            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
-            # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
-
-        buf = bytearray(img.tobytes('raw'))
         # The bytes need to be inverted, because in the PIL world 0=black and 1=white, but
         # in the e-paper world 0=white and 1=black.
-        for i in range(len(buf)):
-            buf[i] ^= 0xFF
-        return buf
+        return epdbuffer.pack_1bit(image, self.width, self.height, invert=True, fill=0x00)
 
     def display(self, imageblack, imagered):
         self.send_command(0x10)
@@ -183,8 +163,7 @@ class EPD:
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
         
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send_command_with_data(0x07, [0XA5]) # DEEP_SLEEP
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Shared frame packing for the drivers. Everything here works on whole numpy
+# arrays so no driver has to touch individual pixels from Python.
+
+
+def orient(image, width, height, mode='1', rotation=Image.ROTATE_90):
+    """Converts the image to mode and turns portrait frames into the panel's width x height.
+
+    Returns None if the image matches neither orientation.
+    """
+    imwidth, imheight = image.size
+    if(imwidth == width and imheight == height):
+        logger.debug("Horizontal")
+        return image.convert(mode)
+    elif(imwidth == height and imheight == width):
+        logger.debug("Vertical")
+        return image.convert(mode).transpose(rotation)
+    logger.warning("Wrong image dimensions: must be " + str(width) + "x" + str(height))
+    return None
+
+
+def line_bytes(width, bpp=1):
+    return (width * bpp + 7) // 8
+
+
+def blank(width, height, value, bpp=1):
+    return bytearray([value]) * (line_bytes(width, bpp) * height)
+
+
+def pack_bits(bits, fill=True):
+    """Packs a 2-D boolean array MSB first, padding every row to whole bytes with fill."""
+    pad = -bits.shape[1] % 8
+    if pad:
+        bits = np.pad(bits, ((0, 0), (0, pad)), constant_values=fill)
+    return bytearray(np.packbits(bits, axis=1))
+
+
+def pack_levels(levels, bpp):
+    """Packs 2-D per-pixel levels of bpp bits each, leftmost pixel in the high bits."""
+    per_byte = 8 // bpp
+    shifts = np.arange(8 - bpp, -1, -bpp, dtype=np.uint8)
+    grouped = levels.astype(np.uint8).reshape(-1, per_byte) << shifts
+    return bytearray(np.bitwise_or.reduce(grouped, axis=1).astype(np.uint8))
+
+
+def pack_1bit(image, width, height, invert=False, fill=0xFF):
+    """Returns the 1 bit frame buffer, 1=white unless invert is set.
+
+    fill is the byte returned across the whole buffer if the image has the wrong size.
+    """
+    img = orient(image, width, height)
+    if img is None:
+        return blank(width, height, fill)
+    bits = np.asarray(img)
+    if invert:
+        bits = ~bits
+    return pack_bits(bits, fill=not invert)
+
+
+def pack_4gray(image, width, height, rotation=Image.ROTATE_90, fill=0xFF):
+    """Returns the 2 bit grayscale buffer used by the 4Gray modes."""
+    img = orient(image, width, height, 'L', rotation)
+    if img is None:
+        return blank(width, height, fill, bpp=2)
+    pixels = np.asarray(img)
+    # 0xC0 and 0x80 are shifted down a level to match the panel's gray LUTs
+    pixels = np.where(pixels == 0xC0, 0x80, np.where(pixels == 0x80, 0x40, pixels))
+    return pack_levels(pixels >> 6, 2)
+
+
+def digest(buf):
+    """Short hash of a frame buffer, so frames can be compared without keeping the old one around."""
+    return hashlib.blake2b(buf, digest_size=16).digest()
+
+
+def changed_regions(old, new, width, merge_rows=16):
+    """Bounding boxes (x0, y0, x1, y1) of the bytes that differ between two 1 bit buffers.
+
+    Boxes are whole bytes wide. Changed rows closer than merge_rows apart share a box, so an
+    edit in the header and one further down come back as separate boxes.
+    """
+    stride = line_bytes(width)
+    diff = np.frombuffer(old, dtype=np.uint8).reshape(-1, stride) != np.frombuffer(new, dtype=np.uint8).reshape(-1, stride)
+    rows = np.flatnonzero(diff.any(axis=1))
+    if rows.size == 0:
+        return []
+
+    gaps = np.flatnonzero(np.diff(rows) > merge_rows)
+    starts = np.concatenate(([rows[0]], rows[gaps + 1]))
+    ends = np.concatenate((rows[gaps], [rows[-1]]))
+
+    regions = []
+    for y_start, y_end in zip(starts, ends):
+        cols = np.flatnonzero(diff[y_start:y_end + 1].any(axis=0))
+        regions.append((int(cols[0]) * 8, int(y_start), min(width, (int(cols[-1]) + 1) * 8), int(y_end) + 1))
+    return regions
+
+
+def window(buf, width, Xstart, Ystart, Xend, Yend):
+    """Returns a 2-D view of the 1 bit buffer rows Ystart..Yend, bytes Xstart/8..Xend/8."""
+    rows = np.frombuffer(buf, dtype=np.uint8).reshape(-1, line_bytes(width))
+    return rows[Ystart:Yend, Xstart // 8:(Xend + 7) // 8]
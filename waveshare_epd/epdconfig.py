@@ -35,7 +35,100 @@ import time
 logger = logging.getLogger(__name__)
 
 
-class RaspberryPi:
+# Behaviour shared by the supported boards
+class Board:
+    # Longest a refresh may hold BUSY before giving up, the 7 color panels take ~30s
+    BUSY_TIMEOUT_MS = 60000
+    # Edge waits are sliced so a missed edge, or a driver that polls the controller
+    # status, costs at most one slice. Slices double up to the max.
+    BUSY_POLL_MIN_MS = 10
+    BUSY_POLL_MAX_MS = 200
+
+    _edge_wait_failed = False
+    _session = False
+    _host_ready = False
+
+    def module_init(self):
+        if self._host_ready:
+            return 0
+        if self._host_init() != 0:
+            return -1
+        self._host_ready = True
+        return 0
+
+    def module_exit(self):
+        if self._session or not self._host_ready:
+            return
+        self._host_exit()
+        self._host_ready = False
+
+    def open_session(self):
+        """Sets up SPI and GPIO once and keeps them until close_session.
+
+        While a session is open the module_init/module_exit every driver runs around a
+        refresh are no-ops, so a refresh only pays for waking the controller.
+        """
+        self._session = True
+        return self.module_init()
+
+    def close_session(self):
+        self._session = False
+        self.module_exit()
+
+    def wait_busy(self, pin, busy_level, timeout_ms=None, poke=None):
+        """Sleeps until pin leaves busy_level, returns False on timeout.
+
+        poke is called before every read, for controllers that refresh BUSY on a status command.
+        """
+        if timeout_ms is None:
+            timeout_ms = self.BUSY_TIMEOUT_MS
+        deadline = self._monotonic() + timeout_ms / 1000.0
+        interval = self.BUSY_POLL_MIN_MS
+        edge = self.GPIO.RISING if busy_level == 0 else self.GPIO.FALLING
+
+        while True:
+            if poke:
+                poke()
+            if self.digital_read(pin) != busy_level:
+                return True
+
+            remaining_ms = (deadline - self._monotonic()) * 1000
+            if remaining_ms <= 0:
+                logger.warning("e-Paper still busy after %d ms", timeout_ms)
+                return False
+
+            wait_ms = max(1, int(min(interval, remaining_ms)))
+            if not self._wait_edge(pin, edge, wait_ms):
+                self.delay_ms(wait_ms)
+            interval = min(interval * 2, self.BUSY_POLL_MAX_MS)
+
+    def send_command_with_data(self, command, data=None):
+        """Sends a command and its parameters under one chip select, switching DC once."""
+        self.digital_write(self.DC_PIN, 0)
+        self.digital_write(self.CS_PIN, 0)
+        self.spi_writebyte([command])
+        if data is not None and len(data):
+            self.digital_write(self.DC_PIN, 1)
+            self.spi_writebyte2(data)
+        self.digital_write(self.CS_PIN, 1)
+
+    def _monotonic(self):
+        return time.monotonic()
+
+    def _wait_edge(self, pin, edge, timeout_ms):
+        if self._edge_wait_failed:
+            return False
+        try:
+            self.GPIO.wait_for_edge(pin, edge, timeout=timeout_ms)
+            return True
+        except (RuntimeError, ValueError) as e:
+            # e.g. edge detection unsupported by the kernel, fall back to polling from now on
+            logger.warning("BUSY edge detection unavailable, polling instead: %s", e)
+            self._edge_wait_failed = True
+            return False
+
+
+class RaspberryPi(Board):
     # Pin definition
     RST_PIN         = 17
     DC_PIN          = 25
@@ -64,7 +157,7 @@ class RaspberryPi:
     def spi_writebyte2(self, data):
         self.SPI.writebytes2(data)
 
-    def module_init(self):
+    def _host_init(self):
         self.GPIO.setmode(self.GPIO.BCM)
         self.GPIO.setwarnings(False)
         self.GPIO.setup(self.RST_PIN, self.GPIO.OUT)
@@ -78,7 +171,7 @@ class RaspberryPi:
         self.SPI.mode = 0b00
         return 0
 
-    def module_exit(self):
+    def _host_exit(self):
         logger.debug("spi end")
         self.SPI.close()
 
@@ -89,7 +182,7 @@ class RaspberryPi:
         self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN])
 
 
-class JetsonNano:
+class JetsonNano(Board):
     # Pin definition
     RST_PIN         = 17
     DC_PIN          = 25
@@ -127,7 +220,11 @@ class JetsonNano:
     def spi_writebyte(self, data):
         self.SPI.SYSFS_software_spi_transfer(data[0])
 
-    def module_init(self):
+    def spi_writebyte2(self, data):
+        for byte in data:
+            self.SPI.SYSFS_software_spi_transfer(byte)
+
+    def _host_init(self):
         self.GPIO.setmode(self.GPIO.BCM)
         self.GPIO.setwarnings(False)
         self.GPIO.setup(self.RST_PIN, self.GPIO.OUT)
@@ -137,7 +234,7 @@ class JetsonNano:
         self.SPI.SYSFS_software_spi_begin()
         return 0
 
-    def module_exit(self):
+    def _host_exit(self):
         logger.debug("spi end")
         self.SPI.SYSFS_software_spi_end()
 
@@ -148,7 +245,304 @@ class JetsonNano:
         self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN])
 
 
-if os.path.exists('/sys/bus/platform/drivers/gpiomem-bcm2835'):
+class SimulatedGPIO:
+    BCM = 11
+    OUT = 0
+    IN = 1
+    RISING = 31
+    FALLING = 32
+
+    def __init__(self, board):
+        self.board = board
+
+    def wait_for_edge(self, pin, edge, timeout=None):
+        return self.board._wait_for_edge(pin, timeout)
+
+
+class SimulatedSPI:
+    def __init__(self, board):
+        self.board = board
+
+    def writebytes(self, data):
+        self.board._transfer(data)
+
+    def writebytes2(self, data):
+        self.board._transfer(data)
+
+
+# Hardware free board for benchmarks and headless runs, selected with EPD_BACKEND=simulated.
+# Records every SPI transfer and GPIO transition, drives BUSY from the panel model on a
+# virtual clock and keeps the RAM planes the controller would hold.
+class Simulated(Board):
+    # Pin definition
+    RST_PIN         = 17
+    DC_PIN          = 25
+    CS_PIN          = 8
+    BUSY_PIN        = 24
+
+    # Per controller family: BUSY level while busy, ms each command holds BUSY (None holds
+    # it until the next reset), the RAM plane commands and the command that shows them.
+    # uc81xx windows partial updates with 0x91/0x90/0x92, ssd16xx with 0x44/0x45/0x4E/0x4F
+    # and picks the Y direction with 0x11.
+    FAMILIES = {
+        'uc81xx': {
+            'busy_level': 0,
+            'busy_ms': {0x04: 100, 0x02: 20},
+            'planes': (0x10, 0x13),
+            'refresh': 0x12,
+        },
+        'ssd16xx': {
+            'busy_level': 1,
+            'busy_ms': {0x12: 10},
+            'planes': (0x24, 0x26),
+            'refresh': 0x20,
+        },
+    }
+
+    # Panel models: family, width, height, bits per pixel in RAM, full refresh ms and
+    # overrides (plane holding the black/white frame, partial_ms for a windowed refresh,
+    # busy_ms entries, invert for 1=black)
+    PANELS = {
+        'epd1in02':     ('uc81xx', 80, 128, 1, 1500, {'plane': 0x13}),
+        'epd1in54':     ('ssd16xx', 200, 200, 1, 2000, {}),
+        'epd1in54_V2':  ('ssd16xx', 200, 200, 1, 2000, {}),
+        'epd1in54b':    ('uc81xx', 200, 200, 1, 15000, {}),
+        'epd1in54b_V2': ('ssd16xx', 200, 200, 1, 15000, {}),
+        'epd1in54c':    ('uc81xx', 152, 152, 1, 15000, {}),
+        'epd2in13':     ('ssd16xx', 122, 250, 1, 2000, {}),
+        'epd2in13_V2':  ('ssd16xx', 122, 250, 1, 2000, {}),
+        'epd2in13_V3':  ('ssd16xx', 122, 250, 1, 2000, {}),
+        'epd2in13b_V3': ('uc81xx', 104, 212, 1, 15000, {}),
+        'epd2in13bc':   ('uc81xx', 104, 212, 1, 15000, {}),
+        'epd2in13d':    ('uc81xx', 104, 212, 1, 2000, {'plane': 0x13}),
+        'epd2in66':     ('ssd16xx', 152, 296, 1, 2000, {}),
+        'epd2in66b':    ('ssd16xx', 152, 296, 1, 15000, {}),
+        'epd2in7':      ('uc81xx', 176, 264, 1, 6000, {'plane': 0x13}),
+        'epd2in7b':     ('uc81xx', 176, 264, 1, 15000, {'invert': True}),
+        'epd2in7b_V2':  ('ssd16xx', 176, 264, 1, 15000, {}),
+        'epd2in9':      ('ssd16xx', 128, 296, 1, 2000, {}),
+        'epd2in9_V2':   ('ssd16xx', 128, 296, 1, 2000, {}),
+        'epd2in9b_V3':  ('uc81xx', 128, 296, 1, 15000, {}),
+        'epd2in9bc':    ('uc81xx', 128, 296, 1, 15000, {}),
+        'epd2in9d':     ('uc81xx', 128, 296, 1, 2000, {'plane': 0x13}),
+        'epd3in7':      ('ssd16xx', 280, 480, 1, 3000, {}),
+        'epd4in01f':    ('uc81xx', 640, 400, 4, 25000, {'busy_ms': {0x02: None}}),
+        'epd4in2':      ('uc81xx', 400, 300, 1, 4000, {'plane': 0x13}),
+        'epd4in2b_V2':  ('uc81xx', 400, 300, 1, 15000, {}),
+        'epd4in2bc':    ('uc81xx', 400, 300, 1, 15000, {}),
+        'epd5in65f':    ('uc81xx', 600, 448, 4, 30000, {'busy_ms': {0x02: None}}),
+        'epd5in83':     ('uc81xx', 600, 448, 4, 5000, {}),
+        'epd5in83_V2':  ('uc81xx', 648, 480, 1, 5000, {'plane': 0x13, 'invert': True}),
+        'epd5in83b_V2': ('uc81xx', 648, 480, 1, 16000, {}),
+        'epd5in83bc':   ('uc81xx', 600, 448, 4, 16000, {}),
+        'epd7in5':      ('uc81xx', 640, 384, 4, 5000, {}),
+        'epd7in5_HD':   ('ssd16xx', 880, 528, 1, 5000, {}),
+        'epd7in5_V2':   ('uc81xx', 800, 480, 1, 5000, {'plane': 0x13, 'partial_ms': 400, 'invert': True}),
+        'epd7in5b_HD':  ('ssd16xx', 880, 528, 1, 22000, {}),
+        'epd7in5b_V2':  ('uc81xx', 800, 480, 1, 16000, {}),
+        'epd7in5bc':    ('uc81xx', 640, 384, 4, 16000, {}),
+    }
+
+    def __init__(self, panel=None, time_scale=None):
+        panel = panel or os.getenv('EPD_SIMULATED_PANEL', 'epd7in5_V2')
+        if panel not in self.PANELS:
+            raise ValueError('Unknown simulated panel ' + panel)
+        family, self.width, self.height, bpp, refresh_ms, extra = self.PANELS[panel]
+        model = self.FAMILIES[family]
+        self.panel = panel
+        # 0 skips the emulated waits entirely, 1 sleeps as long as the real panel would
+        if time_scale is None:
+            time_scale = float(os.getenv('EPD_SIMULATED_TIME_SCALE', '0'))
+        self.time_scale = time_scale
+
+        self._family = family
+        self._busy_level = model['busy_level']
+        self._busy_ms = dict(model['busy_ms'])
+        self._busy_ms[model['refresh']] = refresh_ms
+        self._busy_ms.update(extra.get('busy_ms', {}))
+        self._partial_ms = extra.get('partial_ms', refresh_ms)
+        self._invert = extra.get('invert', False)
+        self._plane = extra.get('plane', model['planes'][0])
+        self._refresh = model['refresh']
+        self._line = (self.width * bpp + 7) // 8
+        self._ram = {cmd: bytearray(self._line * self.height) for cmd in model['planes']}
+        self._shown = {cmd: bytes(plane) for cmd, plane in self._ram.items()}
+        self._pins = {self.RST_PIN: 1, self.DC_PIN: 0, self.CS_PIN: 1}
+
+        self.GPIO = SimulatedGPIO(self)
+        self.SPI = SimulatedSPI(self)
+        self.now_ms = 0.0
+        self.refreshes = 0
+        self.spi_log = []
+        self.gpio_log = []
+        self._busy_until = 0.0
+        self._controller_reset()
+
+    def reset_log(self):
+        del self.spi_log[:]
+        del self.gpio_log[:]
+
+    def frame(self, plane=None):
+        """Returns a RAM plane as of the last refresh, the black/white plane by default."""
+        return self._shown[plane if plane is not None else self._plane]
+
+    def image(self, plane=None):
+        """Returns the shown 1 bit plane as a PIL image, white where the panel is white."""
+        from PIL import Image
+        data = self.frame(plane)
+        if self._invert:
+            data = bytes(b ^ 0xFF for b in data)
+        return Image.frombytes('1', (self._line * 8, self.height), data).crop((0, 0, self.width, self.height))
+
+    def digital_write(self, pin, value):
+        value = 1 if value else 0
+        if self._pins.get(pin) == value:
+            return
+        self._pins[pin] = value
+        self.gpio_log.append((self.now_ms, pin, value))
+        if pin == self.RST_PIN and value == 1:
+            self._controller_reset()
+
+    def digital_read(self, pin):
+        if pin != self.BUSY_PIN:
+            return self._pins.get(pin, 0)
+        if self._busy_until is None or self.now_ms < self._busy_until:
+            return self._busy_level
+        return 1 - self._busy_level
+
+    def delay_ms(self, delaytime):
+        self.now_ms += delaytime
+        if self.time_scale:
+            time.sleep(delaytime * self.time_scale / 1000.0)
+
+    def spi_writebyte(self, data):
+        self._transfer(data)
+
+    def spi_writebyte2(self, data):
+        self._transfer(data)
+
+    def _host_init(self):
+        return 0
+
+    def _host_exit(self):
+        logger.debug("simulated e-Paper: %d refreshes, %.0f ms", self.refreshes, self.now_ms)
+
+    def _monotonic(self):
+        return self.now_ms / 1000.0
+
+    def _wait_for_edge(self, pin, timeout):
+        # Jumps the clock to the end of the busy period if it falls inside the timeout
+        if pin == self.BUSY_PIN and self._busy_until is not None and self._busy_until > self.now_ms:
+            self.delay_ms(min(timeout, self._busy_until - self.now_ms))
+        else:
+            self.delay_ms(timeout)
+        return pin
+
+    def _transfer(self, data):
+        if not isinstance(data, (bytes, bytearray)):
+            data = bytes(b & 0xFF for b in data)
+        dc = self._pins[self.DC_PIN]
+        self.spi_log.append((dc, bytes(data)))
+        if dc == 0:
+            for command in data:
+                self._command(command)
+        elif self._command_id in self._ram:
+            self._write_ram(self._ram[self._command_id], data)
+        else:
+            self._params.extend(data)
+
+    def _controller_reset(self):
+        self._command_id = None
+        self._params = []
+        self._partial = False
+        self._window = (0, 0, self._line - 1, self.height - 1)
+        self._cursor = (0, 0)
+        self._y_step = 1
+        if self._busy_until is None:
+            self._busy_until = self.now_ms
+
+    def _command(self, command):
+        self._apply_params()
+        self._command_id = command
+        self._params = []
+        if command in self._busy_ms:
+            ms = self._partial_ms if command == self._refresh and self._partial else self._busy_ms[command]
+            self._busy_until = None if ms is None else self.now_ms + ms
+        if command == self._refresh:
+            self.refreshes += 1
+            self._shown = {cmd: self._scan(plane) for cmd, plane in self._ram.items()}
+        elif self._family == 'uc81xx':
+            if command in self._ram:
+                self._cursor = self._window[:2]
+            elif command == 0x91:
+                self._partial = True
+            elif command == 0x92:
+                self._partial = False
+                self._window = (0, 0, self._line - 1, self.height - 1)
+
+    def _apply_params(self):
+        # Window and counter commands take effect once all their parameters are in
+        p = self._params
+        if self._family == 'uc81xx':
+            if self._command_id == 0x90 and len(p) >= 9:
+                x0, x1, y0, y1 = p[0] << 8 | p[1], p[2] << 8 | p[3], p[4] << 8 | p[5], p[6] << 8 | p[7]
+                self._set_window(x0 // 8, y0, x1 // 8, y1)
+            elif self._command_id == 0x90 and len(p) >= 7:
+                self._set_window(p[0] // 8, p[2] << 8 | p[3], p[1] // 8, p[4] << 8 | p[5])
+            return
+        x0, y0, x1, y1 = self._window
+        if self._command_id == 0x44 and len(p) >= 4:
+            # 2 byte addresses count pixels, 1 byte addresses count bytes
+            self._set_window((p[1] << 8 | p[0]) // 8, y0, (p[3] << 8 | p[2]) // 8, y1)
+        elif self._command_id == 0x44 and len(p) >= 2:
+            self._set_window(p[0], y0, p[1], y1)
+        elif self._command_id == 0x45 and len(p) >= 4:
+            self._set_window(x0, p[1] << 8 | p[0], x1, p[3] << 8 | p[2])
+        elif self._command_id == 0x4E and len(p) >= 2:
+            self._cursor = ((p[1] << 8 | p[0]) // 8, self._cursor[1])
+        elif self._command_id == 0x4E and p:
+            self._cursor = (p[0], self._cursor[1])
+        elif self._command_id == 0x4F and len(p) >= 2:
+            self._cursor = (self._cursor[0], min(p[1] << 8 | p[0], self.height - 1))
+        elif self._command_id == 0x11 and p:
+            self._y_step = 1 if p[0] & 0x02 else -1
+
+    def _set_window(self, x0, y0, x1, y1):
+        self._window = (min(x0, self._line - 1), min(y0, self.height - 1),
+                        min(x1, self._line - 1), min(y1, self.height - 1))
+
+    def _scan(self, plane):
+        # Drivers write bottom-up exactly when the panel's gates scan bottom-up
+        if self._y_step == 1:
+            return bytes(plane)
+        rows = [plane[y * self._line:(y + 1) * self._line] for y in range(self.height)]
+        return b''.join(reversed(rows))
+
+    def _write_ram(self, plane, data):
+        # Fills the window row by row from the cursor. ssd16xx counters wrap back to the
+        # window start, uc81xx drops anything past the window end.
+        x0, ys, x1, ye = self._window
+        step = self._y_step
+        x, y = self._cursor
+        pos = 0
+        while pos < len(data):
+            if x > x1 or x < x0:
+                x, y = x0, y + step
+            if (y - ye) * step > 0 or (y - ys) * step < 0:
+                if self._family != 'ssd16xx':
+                    break
+                y = ys
+            n = min(x1 - x + 1, len(data) - pos)
+            start = y * self._line + x
+            plane[start:start + n] = data[pos:pos + n]
+            pos += n
+            x += n
+        self._cursor = (x, y)
+
+
+if os.getenv('EPD_BACKEND', '').lower() == 'simulated':
+    implementation = Simulated()
+elif os.path.exists('/sys/bus/platform/drivers/gpiomem-bcm2835'):
     implementation = RaspberryPi()
 else:
     implementation = JetsonNano()
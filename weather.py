@@ -1,14 +1,112 @@
 import os
-import requests
+import time
+import logging
+import threading
 import json
 from dotenv import load_dotenv
+from fetch import FetchError, get as fetch, get_json as fetch_json
+from metrics import timed
+from typing import Optional
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 API_URL = f"https://api.openweathermap.org/data/2.5/onecall?lat={os.getenv('LOCATION_LAT')}&lon={os.getenv('LOCATION_LONG')}&units=imperial&exclude=minutely&appid={os.getenv('WEATHER_API_KEY')}"
 
-def get_json() -> str:
-    return json.loads(requests.get(API_URL).text)
+# Seconds the weather API may take to connect and to send the next chunk
+WEATHER_TIMEOUT = (10, 20)
+
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+WEATHER_CACHE_FILE = os.path.join(CACHE_DIR, "weather.json")
+# Seconds a response is served before it is refreshed
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_MINUTES", "10")) * 60
+# Seconds to wait after a failed refresh, doubling on every failure in a row
+BACKOFF_MIN = 60
+BACKOFF_MAX = 3600
+
+_lock = threading.Lock()
+# Last good response as {"fetched_at": epoch seconds, "data": response}, persisted to WEATHER_CACHE_FILE
+_cached_weather = None
+_refreshing = False
+_backoff = 0
+_retry_at = 0.0
+
+@timed("weather")
+def get_json() -> dict:
+    """Returns the last good weather response, refreshing it in the background once it is older than the TTL.
+
+    Only calls with nothing cached, on disk either, wait for the API, and while the last of them
+    failed they raise FetchError right away until the backoff has passed.
+    """
+    global _cached_weather, _refreshing
+    with _lock:
+        if _cached_weather is None:
+            _cached_weather = _load_cached_weather()
+        cached = _cached_weather
+        now = time.time()
+        if cached is None and now < _retry_at:
+            raise FetchError(API_URL, f"backing off for another {round(_retry_at - now)}s after a failed request", retry_after=_retry_at - now)
+        refresh = cached is None or (now - cached["fetched_at"] >= WEATHER_CACHE_TTL and not _refreshing and now >= _retry_at)
+        if refresh:
+            _refreshing = True
+
+    if cached is None:
+        return _refresh()
+    if refresh:
+        logger.info("Weather is stale, refreshing in the background.")
+        threading.Thread(target=_refresh_in_background, daemon=True).start()
+    return cached["data"]
+
+@timed("weather.fetch")
+def _refresh() -> dict:
+    global _cached_weather, _refreshing, _backoff, _retry_at
+    try:
+        data = fetch_json(API_URL, timeout=WEATHER_TIMEOUT)
+    except FetchError as e:
+        with _lock:
+            # 429 and 5xx tell us to slow down, Retry-After says for how long
+            _backoff = min(max(_backoff * 2, BACKOFF_MIN), BACKOFF_MAX)
+            _retry_at = time.time() + max(_backoff, e.retry_after)
+            _refreshing = False
+        raise
+
+    with _lock:
+        _cached_weather = {"fetched_at": time.time(), "data": data}
+        _backoff = 0
+        _retry_at = 0.0
+        _refreshing = False
+        cached = _cached_weather
+    _save_cached_weather(cached)
+    return data
+
+def _refresh_in_background():
+    try:
+        _refresh()
+    except Exception as e:
+        logger.warning(f"Weather refresh failed, serving the last response for another {round(_retry_at - time.time())}s: {e}")
+
+def _load_cached_weather() -> Optional[dict]:
+    try:
+        with open(WEATHER_CACHE_FILE) as f:
+            cached = json.load(f)
+        return cached if "fetched_at" in cached and "data" in cached else None
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable weather cache: {e}")
+        return None
+
+def _save_cached_weather(cached: dict):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Written next to the cache and renamed over it, so a crash never leaves half a file
+        tmp_file = WEATHER_CACHE_FILE + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(cached, f)
+        os.replace(tmp_file, WEATHER_CACHE_FILE)
+    except Exception as e:
+        logger.warning(f"Could not write the weather cache: {e}")
 
 if __name__ == "__main__":
-    print(requests.get(API_URL).text)
\ No newline at end of file
+    print(fetch(API_URL, timeout=WEATHER_TIMEOUT).text)
@@ -1,4 +1,7 @@
 import os
+from functools import lru_cache
+from PIL import Image
+from typing import Tuple
 
 icon_mapping = {
     "200": "thunderstorm",
@@ -182,6 +185,11 @@ icon_mapping = {
 
 ICONS_PATH = "weather-icons"
 
+# Most icons a dashboard uses at once, plus room for the weather and moon icons to change
+ICON_CACHE_SIZE = 64
+# Wind arrows are drawn in the same 4 degree steps as state.wind_dir
+WIND_DIR_STEP = 4
+
 def get_weather_icon_for_code(code: int, is_day: bool = True) -> str:
     try:
         day_night_str = "day-" if is_day == True else "night-"
@@ -223,6 +231,37 @@ def get_moon_phase_name(phase: float) -> str:
         icon_name = "na"
     return str(icon_name)
 
+def get_icon(path: str, size: int, resample: int = Image.NEAREST, flip: bool = False) -> Tuple[Image.Image, Image.Image]:
+    """Returns the icon thumbnailed to fit size x size as a mode "1" image and its mask.
+
+    Icons are decoded once and shared between callers, so they must not be modified.
+    """
+    return _load_icon(path, size, resample, flip)
+
+def get_wind_arrow(deg: float, size: int = 60) -> Tuple[Image.Image, Image.Image]:
+    """Returns the wind-deg icon pointing deg degrees clockwise, and its mask."""
+    arrows = _wind_arrows(size)
+    return arrows[round(deg / WIND_DIR_STEP) % len(arrows)]
+
+@lru_cache(maxsize=ICON_CACHE_SIZE)
+def _load_icon(path: str, size: int, resample: int, flip: bool) -> Tuple[Image.Image, Image.Image]:
+    return _to_1bit(_thumbnail(path, size, resample, flip))
+
+@lru_cache(maxsize=4)
+def _wind_arrows(size: int) -> Tuple[Tuple[Image.Image, Image.Image], ...]:
+    arrow = _thumbnail(get_weather_icon_for_name("wind-deg"), size, Image.NEAREST, False)
+    return tuple(_to_1bit(arrow.rotate(-deg, Image.NEAREST)) for deg in range(0, 360, WIND_DIR_STEP))
+
+def _thumbnail(path: str, size: int, resample: int, flip: bool) -> Image.Image:
+    with Image.open(path) as icon:
+        icon = icon.convert("RGBA")
+    icon.thumbnail((size, size), resample)
+    return icon.transpose(Image.FLIP_TOP_BOTTOM) if flip else icon
+
+def _to_1bit(icon: Image.Image) -> Tuple[Image.Image, Image.Image]:
+    # Same conversion paste() does when given the RGBA icon, done once instead of per frame
+    return icon.convert("1"), icon.getchannel("A")
+
 if __name__ == "__main__":
     for i in range(0, 28):
         print(f"{i}: {get_moon_phase_name(i / 27)}")
\ No newline at end of file